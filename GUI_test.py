@@ -2,165 +2,256 @@
 
 import pygame
 import sys
-import csv
 import os
 import requests # type: ignore
-import io
 import time
 import threading
 import wave
 import multiprocessing
-from datetime import datetime, time as dt_time # datetime と time をインポート
+import functools
+import argparse
+import metrics
+import service_clock
+from audio_cache import AudioCache
+from daybank import DayBank, daybank_path_for
+from announcement_prefetch import AnnouncementPrefetcher
+from voicevox_client import get_default_client
+from speaker_catalog import SpeakerCatalog, EngineWarmup
+from audio_player import AudioPlayer, AUDIO_END_EVENT
+from announcement_worker import AnnouncementWorker
+from cue_scheduler import CueScheduler, DEFAULT_CUE_OFFSETS, parse_offsets
+from sound_bank import np as numpy_available
+from phrase_assembler import PhraseAssembler, SegmentedAnnouncement, PAUSE_SHORT, PAUSE_LONG
+from streaming_synthesis import StreamingSynthesizer
+from latency_stats import LatencyStats
+from route_model import get_default_route, RouteError
+from connections import ConnectionEngine
+from frame_pacer import FramePacer, DEFAULT_FPS
+from board_renderer import (BoardRenderer, BoardFonts, SCREEN_SIZE, find_font_paths, build_static_layer,
+                            StaticLayerCache, static_layer_key, CACHE_DIR)
+from schedule_index import trip_key
+from timetable_store import TimetableStore, TimetableError, Calendar, read_timetable, load_calendars
+from live_updates import LiveOverlay, DEFAULT_LIVE_PORT, RECEIVED_AT_KEY, start_server as start_live_server
 
 # グローバル変数（表示する行とアナウンス用情報）
 display_rows = []
+display_rows_version = 0 # display_rowsが変わるたびに増える (描画キャッシュの無効化用)
 announcement_info = None
 announcement_lock = threading.Lock() # アナウンス情報更新用のロック
+announcement_changed = threading.Event() # アナウンス対象が変わったことをアナウンススレッドに知らせる
+schedule_reloaded = threading.Event() # 時刻表が再読み込みされたことを描画ループに知らせる
+cache_dir = CACHE_DIR # 起動を速くするためのキャッシュ (フォント・背景レイヤー・話者一覧・合成済み音声) の保存先
+audio_cache = AudioCache() # 合成済み音声のキャッシュ (再起動後も有効)
+daybank = None # build_daybank.py で事前に合成したその日の音声 (あれば最優先で使う。日付やカレンダーが変われば開き直す)
+engine_warmup = None # 起動時のエンジンのウォームアップと初回合成の計測
+audio_player = None # チャイムとアナウンス音声の再生キュー (main()でmixer初期化後に作成)
+announcement_worker = None # アナウンス処理を子プロセスで動かす場合 (--announce-worker)
+cue_scheduler = None # 発車の決まった分数前にアナウンスする場合 (--announce-timing cues)
+prefetcher = None # アナウンス音声の先行合成 (main()で開始)
+phrase_assembler = None # フレーズ連結によるアナウンス組み立て (--announce-mode phrases のとき)
+streaming_synthesizer = None # 文ごとの合成と再生の並行処理 (--announce-mode streaming のとき)
+live_overlay = None # 時刻表に重ねる運行情報 (main()で作成)
+frame_pacer = None # 描画ループの待ち方 (静止画面では眠る。main()で作成)
+# 負荷試験 (load_test.py) 用の計測フック
+frame_listener = None # 毎フレーム (フレーム時間, 表示行が変わったか) で呼ばれる (静止画面で眠った時間は含めない)
+announce_listener = None # アナウンスの再生後に (row, 開始時刻, 音声が鳴り始めた時刻) で呼ばれる (終了アナウンスは row=None)
+announce_mode = "sentence"
+# アナウンスが必要になってから最初の音声を再生できるまでの時間 (方式ごと)
+first_audio_stats = {
+    "prepared": LatencyStats("先頭音声までの時間 (準備済み音声)"),
+    "streaming": LatencyStats("先頭音声までの時間 (ストリーミング)"),
+}
+# 運行情報を受け取ってから、その内容でアナウンスを始めるまでの時間
+update_announcement_stats = LatencyStats("運行情報からアナウンスまで")
+announced_updates = set() # 計測済みの (便のキー, 受信時刻)
+
+END_OF_SERVICE_MESSAGE = "本日のシャトルバスの運行は終了しました。"
+DEFAULT_SPEAKER = 10006
+SYNTHESIS_PARAMS = {
+    "enable_interrogative_upspeak": True
+} # 合成パラメータ (キャッシュやデイバンクのキーにも使う)
+PREFETCH_LOOKAHEAD = 3 # 先行合成しておく便数
+WORKER_POLL_INTERVAL = 0.1 # 静止画面でも子プロセスからの再生指示を確認する間隔 (秒)
+UPDATE_CHECK_INTERVAL = 60 # 表示の切り替わり時刻とは別に表示行を確認し直す間隔 (時計の上での秒)
+CHIME_SOUND = "4point_chime" # アナウンス前のチャイム (sounds フォルダのファイル名)
 
 def load_timetable(filepath):
     """timetable.csvから時刻表データを読み込み、ETDでソートして返す"""
-    timetable = []
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file, skipinitialspace=True)
-            for row in reader:
-                try:
-                    # ETDをtimeオブジェクトに変換して追加
-                    row['ETD_time'] = datetime.strptime(row['ETD'], '%H:%M').time()
-                    timetable.append(row)
-                except ValueError:
-                    print(f"警告: 行 {row} の ETD フォーマット '{row.get('ETD', '')}' が無効です。スキップします。")
-                except KeyError:
-                    print(f"警告: 行 {row} に ETD キーがありません。スキップします。")
-    except FileNotFoundError:
-        print(f"エラー: ファイル '{filepath}' が見つかりません。")
+        timetable = read_timetable(filepath)
+        get_default_route().compile_timetable(timetable) # 停車パターンを作っておく
+        return timetable
+    except (TimetableError, RouteError) as e:
+        print(f"エラー: {e}")
         sys.exit()
-    except Exception as e:
-        print(f"エラー: ファイル '{filepath}' の読み込み中にエラーが発生しました: {e}")
-        sys.exit()
-
-    # ETD時刻でソート
-    timetable.sort(key=lambda x: x.get('ETD_time', dt_time.max)) # ETD_timeがない場合は最後に回す
-    return timetable
-
-def update_display_rows(timetable):
-    """現在時刻に基づいて表示する次の2件の行を更新する"""
-    global display_rows, announcement_info
-    now_time = datetime.now().time()
 
-    # 現在時刻以降の便をフィルタリング
-    future_timetable = [row for row in timetable if row.get('ETD_time', dt_time.min) >= now_time]
+def update_display_rows(schedule, now=None):
+    """現在時刻に基づいて表示する次の2件の行を更新し、次に表示が変わる時刻を返す"""
+    global display_rows, display_rows_version, announcement_info
+    if now is None:
+        now = service_clock.now()
 
-    # フィルタリングされたリストから最大2件を取得
-    new_display_rows = future_timetable[:2]
+    # 現在時刻以降の便を二分探索で最大2件取得
+    new_display_rows = schedule.upcoming(now, 2)
 
     # グローバル変数を更新 (ロックを使用)
+    target_changed = False
     with announcement_lock:
         # アナウンス対象を先にチェック・更新
         if new_display_rows:
-            # announcement_info が None または ETD が異なる場合のみ更新
-            if announcement_info is None or announcement_info['ETD'] != new_display_rows[0]['ETD']:
+            # announcement_info が None または便の内容が異なる場合のみ更新
+            if announcement_info is None or announcement_info != new_display_rows[0]:
                  announcement_info = new_display_rows[0].copy() # 変更があった場合のみ更新
+                 announcement_changed.set()
+                 target_changed = True
                  print(f"アナウンス対象が変更されました: {announcement_info['ETD']}発") # デバッグ用
+                 metrics.event("target_changed", etd=announcement_info['ETD'])
         else:
             # 未来の便がない場合、アナウンス対象をNoneに
             if announcement_info is not None:
                 print("アナウンス対象がなくなりました。") # デバッグ用
+                announcement_changed.set()
+                target_changed = True
             announcement_info = None
+        target = announcement_info
 
         # 表示行を更新
+        if new_display_rows != display_rows:
+            display_rows_version += 1
         display_rows = new_display_rows
 
+    # アナウンス処理が子プロセスにある場合は対象を送る
+    if announcement_worker is not None and target_changed:
+        announcement_worker.set_target(target)
+    return schedule.next_transition(now)
 
-def create_stop_info(row):
-    """停車駅情報から案内文を生成する"""
-    if not row: # rowがNoneや空の場合
-        return "本日のバスは終了しました。"
-
-    stops = []
-    ways = []
-    # 各停車地のキーが存在するか確認してからアクセス
-    if row.get('echizen_takefu') == '1': stops.append("越前たけふ駅")
-    else: ways.append("越前たけふ駅")
-    if row.get('hoyama(1)') == '1': stops.append("帆山町")
-    else: ways.append("帆山町")
-    if row.get('kunitaka(1)') == '1': stops.append("国高")
-    else: ways.append("国高")
-    if row.get('takefu') == '1': stops.append("武生駅")
-    else: ways.append("武生駅")
-    if row.get('kunitaka(2)') == '1': stops.append("国高")
-    else: ways.append("国高")
-    if row.get('hoyama(2)') == '1': stops.append("帆山町")
-    else: ways.append("帆山町")
-    if row.get('jindai') == '0': ways.append("仁愛大学") # 終点が仁愛大学の場合
-
-    destination_text = "終点：仁愛大学" if row.get('destination') == '0' else "終点：武生駅"
-
-    #停車・通過の重複削除
-    ways = list(filter(lambda x: x not in stops, ways))
-    ways = list(dict.fromkeys(ways)) # 重複削除
 
+def set_announcement_target(row):
+    """アナウンス対象を差し替える (子プロセスのアナウンス処理が描画プロセスから受け取ったとき)"""
+    global announcement_info
+    with announcement_lock:
+        announcement_info = row
+    announcement_changed.set()
+
+
+def on_timetable_reloaded(schedule, diff):
+    """時刻表の再読み込み時に呼ばれる (表示行とアナウンス対象をまとめて差し替える)"""
+    if announcement_worker is not None:
+        announcement_worker.set_schedule(schedule)
+    if cue_scheduler is not None:
+        cue_scheduler.set_schedule(schedule) # 発車時刻が変わった便のキューを作り直す
+    if prefetcher is not None:
+        prefetcher.set_schedule(schedule)
+        # 内容が変わった便の準備済み音声だけを破棄する
+        prefetcher.discard(prefetcher.build_text(row) for row in diff.stale_rows())
+    update_display_rows(schedule)
+    schedule_reloaded.set()
+    if frame_pacer is not None:
+        frame_pacer.wake() # 静止画面で眠っている描画ループを起こす
+
+
+def build_announcement_text(row):
+    """便の情報からアナウンス文を生成する (停車駅の案内は読み上げ用に作成済みの文を使う)"""
+    route = get_default_route()
+    pattern = route.pattern(row)
+    time_parts = row['ETD'].split(":")
+    time_text = time_parts[0] + "時" + time_parts[1] + "分"
+    origin_text = route.spoken(route.origin)
+    platform_text = row.get('platform', '未定')
+    delay_text = f"約{row['delay']}分遅れて、" if row.get('delay') else ""
+    return f"次に、{origin_text}から発車します、{time_text}発、無料シャトルバス、{pattern.spoken_destination}行きは、{delay_text}{platform_text}番乗り場から、発車します。乗車位置で、1列に並んで、お待ちください。{pattern.spoken_stop_info}"
+
+def build_announcement_segments(row):
+    """build_announcement_text と同じ内容を、個別に合成できるフレーズに分けて返す
+
+    差し替わる部分 (時・分・行き先・乗り場・駅名) を独立したフレーズにしているので、
+    語彙は時刻表全体でも数十フレーズ程度に収まる。
+    """
+    route = get_default_route()
+    pattern = route.pattern(row)
+    time_parts = row['ETD'].split(":")
+    platform_text = row.get('platform', '未定')
+    segments = [
+        ("次に、" + route.spoken(route.origin) + "から発車します", PAUSE_SHORT),
+        (time_parts[0] + "時", 0),
+        (time_parts[1] + "分発", PAUSE_SHORT),
+        ("無料シャトルバス", PAUSE_SHORT),
+        (pattern.spoken_destination + "行きは", PAUSE_SHORT),
+    ]
+    if row.get('delay'): # 運行情報で遅れている便
+        segments.append(("約" + row['delay'] + "分遅れて", PAUSE_SHORT))
+    segments += [
+        (platform_text + "番乗り場から", PAUSE_SHORT),
+        ("発車します。", PAUSE_LONG),
+        ("乗車位置で、1列に並んで、お待ちください。", PAUSE_LONG),
+    ]
+    stops, ways = pattern.spoken_stops, pattern.spoken_ways
     if stops:
-        stop_info = "停車駅は、" + "、".join(stops) + "、" + destination_text + "です。"
-        if ways:
-             stop_info += "　" + "、".join(ways) + "には停車しません。ご注意ください。"
-    else:
-        stop_info = destination_text + "です。" # 直行便の場合など
+        segments.append(("停車駅は", PAUSE_SHORT))
+        segments.extend((stop, PAUSE_SHORT) for stop in stops)
+    segments.append(("終点：" + pattern.spoken_destination + "です。", PAUSE_LONG))
+    if stops and ways:
+        segments.extend((way, PAUSE_SHORT) for way in ways[:-1])
+        segments.append((ways[-1], 0))
+        segments.append(("には停車しません。ご注意ください。", PAUSE_LONG))
+    return SegmentedAnnouncement(segments)
+
+def assemble_announcement(announcement):
+    """フレーズ単位で合成済みの音声をつないでアナウンス音声を作る"""
+    return phrase_assembler.assemble(announcement)
+
+def voicevox_api_request(text, speaker=DEFAULT_SPEAKER):
+    """Voicevox APIにリクエストを送信し、音声データを取得する (デイバンクやキャッシュがあればそれを返す)"""
+    params_synthesis = SYNTHESIS_PARAMS
+    bank = daybank # 日付が変わって差し替えられても、この合成では同じものを使う
+    if bank is not None:
+        banked = bank.get(text, speaker, params_synthesis)
+        if banked is not None:
+            return bytes(banked) # 必要な1件だけをメモリマップから取り出す
+    cached = audio_cache.get(text, speaker, params_synthesis)
+    if cached is not None:
+        return cached
 
-    return stop_info
-
-def voicevox_api_request(text, speaker=10006):
-    """Voicevox APIにリクエストを送信し、音声データを取得する"""
-    base_url = "http://localhost:50121" #ポート番号を修正
-    params_create_audio_query = {
-        "text": text,
-        "speaker": speaker
-    }
     try:
-        response_create_audio_query = requests.post(
-            f"{base_url}/audio_query",
-            params=params_create_audio_query,
-            timeout=10 # タイムアウト設定
-        )
-        response_create_audio_query.raise_for_status()
-        audio_query = response_create_audio_query.json()
-
-        params_synthesis = {
-            "speaker": speaker,
-            "enable_interrogative_upspeak": True
-        }
-        response_synthesis = requests.post(
-            f"{base_url}/synthesis",
+        # 接続を使い回す共有クライアント経由で合成する (複数エンジンにも振り分け可能)
+        start = time.monotonic()
+        voice_data = get_default_client().synthesize(
+            text, speaker,
             params=params_synthesis,
-            json=audio_query,
-            timeout=30 # 合成は時間がかかる場合があるので長めに
+            query_timeout=10, # タイムアウト設定
+            synthesis_timeout=30 # 合成は時間がかかる場合があるので長めに
         )
-        response_synthesis.raise_for_status()
-        return response_synthesis.content
+        if engine_warmup is not None:
+            engine_warmup.record_synthesis(time.monotonic() - start) # 起動後最初の合成時間を記録
+        audio_cache.put(text, speaker, voice_data, params_synthesis)
+        return voice_data
     except requests.exceptions.RequestException as e:
         print(f"Voicevox APIリクエスト中にエラーが発生しました: {e}")
+        metrics.event("synthesis_failed", text=text[:30], error=str(e))
         return None
     except Exception as e:
         print(f"Voicevox処理中に予期せぬエラーが発生しました: {e}")
         return None
 
 
-def play_voice(voice_data):
-    """音声データを再生する (Soundオブジェクトを使用)"""
+def convert_for_playback(synthesize, text):
+    """合成した音声をサウンドバンクでmixerの形式に変換しておく (再生時には変換しない)"""
+    voice_data = synthesize(text)
+    if voice_data:
+        try:
+            audio_player.voice_sound(text, voice_data)
+        except (pygame.error, wave.Error, EOFError) as e:
+            print(f"音声の変換に失敗しました: {str(text)[:30]}... ({e})")
+    return voice_data
+
+
+def play_voice(voice_data, key=None):
+    """音声データを再生し、終わるまで待つ (keyを指定するとデコード済みの音声を使い回す)"""
     if not voice_data:
         print("音声データがありません。再生をスキップします。")
         return False # 再生失敗を示す
     try:
-        sound = pygame.mixer.Sound(io.BytesIO(voice_data))
-        channel = sound.play()
-        if channel:
-            # 再生終了を待つ
-            while channel.get_busy():
-                pygame.time.Clock().tick(10) # CPU負荷を抑えつつ待機
-            return True # 再生成功
-        else:
-            print("音声再生チャンネルの取得に失敗しました。")
-            return False
+        return audio_player.play([audio_player.voice_sound(key or voice_data, voice_data)])
     except pygame.error as e:
         print(f"音声の読み込みまたは再生中にPygameエラーが発生しました: {e}")
         return False
@@ -169,53 +260,218 @@ def play_voice(voice_data):
         return False
 
 
-def play_announcement(announcement):
-    """アナウンスを再生する"""
-    if not announcement:
+def play_voice_stream(stream):
+    """順番に届く音声データを、前のかたまりの再生中に続けて予約しながら再生する
+
+    チャイムなど先に begin() で積んだ音声の後ろにつなげる。
+    """
+    played = False
+    try:
+        for chunk, voice_data, elapsed in stream:
+            if not voice_data:
+                print(f"音声の合成に失敗したためスキップします: {chunk}")
+                continue
+            if not played:
+                first_audio_stats["streaming"].record(elapsed)
+                metrics.observe("announcement_first_audio_seconds", elapsed, mode="streaming")
+                print(f"最初の音声を予約 (合成依頼から {elapsed:.2f} 秒で準備完了)")
+                played = True
+            audio_player.append(audio_player.voice_sound(chunk, voice_data))
+        return played
+    except pygame.error as e:
+        print(f"音声の読み込みまたは再生中にPygameエラーが発生しました: {e}")
+        return False
+    finally:
+        audio_player.close()
+        audio_player.wait() # 再生終了を待つ
+
+
+def chime_sounds():
+    """アナウンス前に鳴らすチャイム (起動時に読み込み済みのもの) を返す"""
+    chime = audio_player.resident.get(CHIME_SOUND)
+    if chime is None:
+        print(f"警告: チャイムファイルが見つかりません: {CHIME_SOUND}.wav")
+        return []
+    return [chime]
+
+
+def print_announcement_stats():
+    """キャッシュと各種遅延の統計を表示する (デバッグ用)"""
+    stats = audio_cache.stats()
+    print(f"音声キャッシュ: ヒット {stats['memory_hits'] + stats['disk_hits']} / ミス {stats['misses']}")
+    if prefetcher is not None:
+        print(prefetcher.lead_stats.format())
+    if cue_scheduler is not None:
+        print(cue_scheduler.lateness_stats.format())
+    if live_overlay is not None and live_overlay.screen_latency.count:
+        print(live_overlay.screen_latency.format())
+    if update_announcement_stats.count:
+        print(update_announcement_stats.format())
+    for latency_stats in first_audio_stats.values():
+        if latency_stats.count:
+            print(latency_stats.format())
+    if audio_player is not None:
+        print(audio_player.bank.report())
+    if engine_warmup is not None:
+        for latency_stats in (engine_warmup.cold_start_stats, engine_warmup.first_announcement_stats):
+            if latency_stats.count:
+                print(latency_stats.format())
+
+
+def play_announcement(voice_data, key=None):
+    """準備済みのアナウンス音声をチャイムの後に再生する (チャイムとアナウンスを続けて予約する)"""
+    if not voice_data:
         return
     try:
-        # アナウンスを生成
-        print(f"アナウンス生成中: {announcement[:30]}...") # 長いので一部表示
-        voice_data = voicevox_api_request(announcement)
-        if not voice_data:
-             print("アナウンス音声の生成に失敗しました。")
-             return
-
-        # チャイム音を再生 (Soundオブジェクトを使用)
-        try:
-            # チャイムファイルのパスを取得
-            script_dir = os.path.dirname(__file__)
-            chime_path = os.path.join(script_dir, "sounds", "4point_chime.wav")
-            if not os.path.exists(chime_path):
-                print(f"警告: チャイムファイルが見つかりません: {chime_path}")
-            else:
-                chime_sound = pygame.mixer.Sound(chime_path)
-                chime_channel = chime_sound.play() # 再生に使用したチャンネルを取得
-                if chime_channel:
-                    # チャイムの再生終了を待つ
-                    while chime_channel.get_busy():
-                        pygame.time.Clock().tick(10)
-                else:
-                    print("チャイムの再生チャンネルを取得できませんでした。")
-                    pygame.time.wait(1000) # とりあえず1秒待つ
-        except pygame.error as e:
-            print(f"チャイム音の読み込みまたは再生に失敗しました: {e}")
-            pygame.time.wait(1000) # エラーでも少し待つ
-
-        # アナウンスを再生
         print("アナウンス再生中...")
-        play_voice(voice_data)
+        voice = audio_player.voice_sound(key or voice_data, voice_data)
+        audio_player.play(chime_sounds() + [voice]) # 再生完了の通知を待つ
         print("アナウンス再生完了。")
+        print_announcement_stats() # デバッグ用
 
     except Exception as e:
         print(f"アナウンス再生処理全体でエラーが発生しました: {e}")
 
+def play_streaming_announcement(text):
+    """アナウンス文を区切って合成しながら、チャイムの後に順番に再生する"""
+    try:
+        print(f"アナウンス合成開始 (ストリーミング): {text[:30]}...") # 長いので一部表示
+        stream = streaming_synthesizer.stream(text) # チャイムの再生中にも合成を進める
+        audio_player.begin()
+        for chime in chime_sounds():
+            audio_player.append(chime)
+        print("アナウンス再生中...")
+        play_voice_stream(stream)
+        print("アナウンス再生完了。")
+        print_announcement_stats() # デバッグ用
+    except Exception as e:
+        print(f"アナウンス再生処理全体でエラーが発生しました: {e}")
+
+def prepared_announcement(text):
+    """先行合成済みの音声を取得する (未準備なら合成を優先依頼して待つ)"""
+    print(f"アナウンス準備: {str(text)[:30]}...") # 長いので一部表示
+    start = time.monotonic()
+    voice_data = prefetcher.wait_for(text, timeout=40)
+    if voice_data:
+        first_audio_stats["prepared"].record(time.monotonic() - start)
+        metrics.observe("announcement_first_audio_seconds", time.monotonic() - start, mode="prepared")
+    else:
+        metrics.increment("announcement_not_ready_total")
+    if not voice_data:
+        print("アナウンス音声の準備が間に合いませんでした。")
+    return voice_data
+
+def setup_announcer(schedule, mode, daybank_path, cue_offsets=None):
+    """アナウンス処理 (デイバンク・エンジン監視・ウォームアップ・先行合成) を準備し、フレーズの語彙を返す
+
+    描画プロセス内のスレッドで動かす場合も、announcement_worker の子プロセスで動かす場合も使う。
+    cue_offsets (発車の何分前か) を指定すると、60秒ごとではなく決まった時刻にアナウンスする。
+    """
+    global prefetcher, phrase_assembler, streaming_synthesizer, announce_mode, engine_warmup, cue_scheduler
+    announce_mode = mode
+    if cue_offsets:
+        cue_scheduler = CueScheduler(schedule, announce_row, cue_offsets)
+    # 事前合成した音声アーカイブがあれば使う (エンジンへの問い合わせが不要になる)
+    switch_daybank(daybank_path)
+
+    # VOICEVOXエンジンの死活監視を開始 (応答しないエンジンは振り分け対象から外す)
+    get_default_client().start_health_checks()
+
+    # 話者一覧 (ディスクにキャッシュ) で話者IDを確認し、運用開始前にモデルを読み込ませる
+    engine_warmup = EngineWarmup(get_default_client(), SpeakerCatalog(get_default_client(), os.path.join(cache_dir, "speakers.json")))
+
+    # アナウンス音声の先行合成を準備 (再生時には準備済みの音声だけを使う)
+    vocabulary = None
+    if mode == "streaming":
+        # 先行合成はせず、アナウンスのたびに文ごとに合成しながら再生する
+        streaming_synthesizer = StreamingSynthesizer(functools.partial(convert_for_playback, voicevox_api_request))
+    elif mode == "phrases":
+        phrase_assembler = PhraseAssembler(voicevox_api_request)
+        prefetcher = AnnouncementPrefetcher(schedule, build_announcement_segments,
+                                            functools.partial(convert_for_playback, assemble_announcement),
+                                            lookahead=PREFETCH_LOOKAHEAD, end_message=END_OF_SERVICE_MESSAGE)
+        vocabulary = [text for trip in schedule.trips for text, _ in build_announcement_segments(trip.row)]
+    else:
+        prefetcher = AnnouncementPrefetcher(schedule, build_announcement_text,
+                                            functools.partial(convert_for_playback, voicevox_api_request),
+                                            lookahead=PREFETCH_LOOKAHEAD, end_message=END_OF_SERVICE_MESSAGE)
+    return vocabulary
+
+def use_cache_dir(path):
+    """キャッシュの保存先を変える (負荷試験などで本番のキャッシュを使わない・書き換えない場合)"""
+    global cache_dir, audio_cache
+    cache_dir = path
+    audio_cache = AudioCache(os.path.join(path, "audio"))
+
+def switch_daybank(path):
+    """その日のデイバンク (path) に切り替える (開いているファイルのままなら何もしない)"""
+    global daybank
+    old = daybank
+    if old is not None and old.is_current(path):
+        return
+    daybank = DayBank.open_if_exists(path)
+    if old is not None:
+        old.close()
+
+def select_daybank(store, base_path):
+    """時刻表のカレンダーと日付に合ったデイバンクに切り替える (アナウンス処理が子プロセスならそちらで)"""
+    path = daybank_path_for(base_path, store.calendar.path, store.day)
+    if announcement_worker is not None:
+        announcement_worker.set_daybank(path)
+    else:
+        switch_daybank(path)
+
+def start_announcer(started_at, vocabulary=None):
+    """エンジンのウォームアップが済んでからアナウンス処理を開始する (その間も画面表示は続ける)"""
+    if engine_warmup is not None:
+        engine_warmup.warm_up([DEFAULT_SPEAKER])
+    print(f"アナウンスの準備完了 (起動から {time.monotonic() - started_at:.2f}秒)")
+    if prefetcher is not None:
+        prefetcher.start()
+    if phrase_assembler is not None and vocabulary:
+        # 時刻表全体の語彙をバックグラウンドで合成しておく
+        threading.Thread(target=phrase_assembler.prepare, args=(vocabulary,), daemon=True).start()
+    if cue_scheduler is not None:
+        cue_scheduler.run() # 発車の決まった分数前にアナウンスする
+    else:
+        announcement_loop()
+
+def announce_row(row):
+    """便 (Noneなら終了アナウンス) のアナウンスを再生する (再生が終わるまで戻らない)"""
+    if row and row.get(RECEIVED_AT_KEY) is not None:
+        record_update_announced(row)
+    started_at = service_clock.now()
+    if announce_mode == "streaming":
+        play_streaming_announcement(build_announcement_text(row) if row else END_OF_SERVICE_MESSAGE)
+    else:
+        announcement = prefetcher.build_text(row) if row else END_OF_SERVICE_MESSAGE
+        play_announcement(prepared_announcement(announcement), announcement)
+    audio_started_at = getattr(audio_player, "started_at", None)
+    if not audio_started_at or audio_started_at < started_at:
+        audio_started_at = None # 今回のアナウンスでは音が鳴らなかった
+    if metrics.enabled:
+        metrics.increment("announcements_total", mode=announce_mode)
+        metrics.event("announcement", etd=row["ETD"] if row else None, started_at=started_at.isoformat(),
+                      audio_started_at=audio_started_at.isoformat() if audio_started_at else None)
+    if announce_listener is not None:
+        announce_listener(row, started_at, audio_started_at)
+
+def record_update_announced(row):
+    """運行情報を反映したアナウンスを始めるまでの時間を記録する (変更ごとに最初の1回だけ)"""
+    received_at = row[RECEIVED_AT_KEY]
+    key = (trip_key(row), received_at)
+    if key in announced_updates:
+        return
+    announced_updates.add(key)
+    update_announcement_stats.record(time.time() - received_at)
+
 def announcement_loop():
-    """アナウンスをループ再生する (60秒ごとに繰り返し)"""
+    """アナウンスをループ再生する (60秒ごと、またはアナウンス対象が変わったときに再生)"""
     global announcement_info
     announced_end_message = False # 終了アナウンス済みフラグ
 
     while True:
+        announcement_changed.clear()
         current_announcement_info = None
         # ロックを取得して安全にアナウンス情報を読み取る
         with announcement_lock:
@@ -227,31 +483,108 @@ def announcement_loop():
             current_time_str = current_announcement_info['ETD']
             print(f"アナウンス対象: {current_time_str}発 (60秒ごとに再生)") # ログメッセージ変更
 
-            stop_info = create_stop_info(current_announcement_info)
-            time_parts = current_announcement_info['ETD'].split(":")
-            time_text = time_parts[0] + "時" + time_parts[1] + "分"
-            destination_text = "仁愛大学" if current_announcement_info['destination'] == '0' else "武生駅"
-            platform_text = current_announcement_info.get('platform', '未定')
-            announcement = f"次に、仁愛大学から発車します、{time_text}発、無料シャトルバス、{destination_text}行きは、{platform_text}番乗り場から、発車します。乗車位置で、1列に並んで、お待ちください。{stop_info}"
-
-            play_announcement(announcement)
+            announce_row(current_announcement_info)
             announced_end_message = False # アナウンスしたので終了フラグ解除
 
-            # アナウンス後に60秒待つ
-            time.sleep(60)
+            # アナウンス後に60秒待つ (その間に便が切り替われば待たずに次へ)
+            service_clock.wait(announcement_changed, 60)
 
         else:
             # アナウンス対象がない場合（終バス後など）
             if not announced_end_message: # 終了アナウンスを一度だけ行う
                  print("アナウンス対象なし。終了アナウンスを再生します。")
-                 play_announcement("本日のシャトルバスの運行は終了しました。")
+                 announce_row(None)
                  announced_end_message = True
-            # 終バス後も60秒ごとにチェック
-            time.sleep(60)
+            # 終バス後も60秒ごとにチェック (翌日の便が対象になればすぐ起きる)
+            service_clock.wait(announcement_changed, 60)
+
+
+def print_frame_jitter(frame_stats):
+    """描画ループのフレーム時間のばらつきを表示する (アナウンス処理の影響の比較用)"""
+    s = frame_stats.summary()
+    if "mean" in s:
+        print(f"{frame_stats.format()} ジッター (p95-p50) {(s['p95'] - s['p50']) * 1000:.1f}ms")
+
+
+def show_first_frame(screen, static_layer, started_at, source):
+    """時刻表を読み込む前に固定レイアウトだけの画面を表示し、起動からの時間 (秒) を返す"""
+    screen.blit(static_layer, (0, 0))
+    pygame.display.update()
+    pygame.event.pump() # 読み込み中もウィンドウが応答なしにならないように
+    elapsed = time.monotonic() - started_at
+    print(f"最初の画面を表示しました ({source}、起動から {elapsed:.3f}秒)")
+    metrics.set_gauge("startup_first_frame_seconds", elapsed)
+    return elapsed
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析する"""
+    parser = argparse.ArgumentParser(description="シャトルバス発車案内")
+    parser.add_argument("--full-redraw", action="store_true",
+                        help="差分描画を使わず毎フレーム画面全体を更新する")
+    parser.add_argument("--cache-dir", help="フォントの探索結果・背景レイヤー・話者一覧・合成済み音声のキャッシュの保存先 (既定は cache/)")
+    parser.add_argument("--no-startup-cache", action="store_true",
+                        help="フォントの探索結果と背景レイヤーのキャッシュ (cache/) を使わない")
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS,
+                        help="スクロール中のフレームレート (静止画面では次の変化まで描画を休む)")
+    parser.add_argument("--no-idle", action="store_true",
+                        help="静止画面でも描画を休まず、常に --fps で描画する")
+    parser.add_argument("--announce-mode", choices=("sentence", "phrases", "streaming"), default="sentence",
+                        help="sentence: 文章全体を先行合成 / phrases: フレーズ単位の合成音声をつなぐ / "
+                             "streaming: 文ごとに合成しながら再生する")
+    parser.add_argument("--announce-worker", action="store_true",
+                        help="アナウンス処理 (合成・音声の変換) を子プロセスで動かし、描画ループの遅れを防ぐ")
+    parser.add_argument("--announce-timing", choices=("interval", "cues"), default="interval",
+                        help="interval: 60秒ごとに次の便をアナウンス / cues: 発車の決まった分数前にアナウンス")
+    parser.add_argument("--cue-offsets", type=parse_offsets, default=DEFAULT_CUE_OFFSETS,
+                        help="cues のときに発車の何分前にアナウンスするか (カンマ区切り、例: 10,3,1)")
+    parser.add_argument("--daybank", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "daybank.bin"),
+                        help="build_daybank.py で作成した音声アーカイブ (時刻表と日付ごとのファイルがなければ使わない)")
+    parser.add_argument("--timetable", help="calendars.json を使わずにこの時刻表だけを使う")
+    parser.add_argument("--sounds", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "sounds"),
+                        help="チャイムなどの効果音のフォルダ")
+    parser.add_argument("--live-port", type=int, default=DEFAULT_LIVE_PORT,
+                        help="運行情報 (遅延・乗り場変更・運休) を受け付けるポート (127.0.0.1、0で受け付けない)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help=f"計測値を /metrics で公開するポート (127.0.0.1、0で公開しない。例: {metrics.DEFAULT_METRICS_PORT})")
+    parser.add_argument("--metrics-log", help="計測値とイベントを JSON Lines で書き出すログファイル (サイズでローテーション)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global announce_mode, audio_player, announcement_worker, live_overlay, announcement_lock, frame_pacer
+    started_at = time.monotonic()
+    args = parse_args(argv)
+    announce_mode = args.announce_mode
+    if args.metrics_port or args.metrics_log:
+        # 計測するときだけ、取得待ちを記録するロックに差し替える (スレッドを始める前に行う)
+        metrics.enable(args.metrics_log)
+        announcement_lock = metrics.InstrumentedLock("announcement_lock")
+        if args.metrics_port:
+            metrics.start_server(port=args.metrics_port)
+    # 停電後などの再起動で早く画面を出すため、使うサブシステムだけを初期化し、
+    # 固定レイアウトの画面を表示してから時刻表と音声の準備をする
+    pygame.display.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    pygame.display.set_caption("発車案内サンプル")
 
+    # フォント設定 (BOARD_FONTS 環境変数・OSごとの標準の場所・fontconfig の順に日本語フォントを探し、結果を保存しておく)
+    if args.cache_dir:
+        use_cache_dir(args.cache_dir)
+    font_paths = find_font_paths(None if args.no_startup_cache else os.path.join(cache_dir, "fonts.json"))
+    # 前回保存した背景レイヤーがあれば、フォントを読み込む前に表示する
+    layer_cache = None if args.no_startup_cache else StaticLayerCache(os.path.join(cache_dir, "layout"))
+    layer_key = static_layer_key(SCREEN_SIZE, font_paths)
+    static_layer = layer_cache.load(layer_key, screen) if layer_cache is not None else None
+    if static_layer is not None:
+        first_frame_seconds = show_first_frame(screen, static_layer, started_at, "保存済みの背景")
+    pygame.font.init()
+    fonts = BoardFonts.load(*font_paths)
+    if static_layer is None:
+        static_layer = build_static_layer(screen, fonts)
+        first_frame_seconds = show_first_frame(screen, static_layer, started_at, "背景を描画")
+        if layer_cache is not None:
+            layer_cache.save(layer_key, static_layer)
 
-def main():
-    pygame.init()
     # より安定する可能性のあるパラメータでmixerを初期化
     try:
         pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=2048)
@@ -260,310 +593,164 @@ def main():
         print(f"Pygame mixer initialization failed: {e}")
         pygame.quit()
         sys.exit()
+    # チャイムなどの効果音は起動時に一度だけ読み込む
+    audio_player = AudioPlayer(args.sounds)
 
-
-    # ウィンドウサイズ
-    screen_width, screen_height = 1600, 900
-    screen = pygame.display.set_mode((screen_width, screen_height))
-    pygame.display.set_caption("発車案内サンプル")
-
-    # フォント設定 (環境に合わせてパスを修正してください)
-    try:
-        # Windowsの場合の一般的なパス例
-        font_path_bold = "C:/Windows/Fonts/meiryob.ttc" # Meiryo Bold
-        font_path_regular = "C:/Windows/Fonts/meiryo.ttc" # Meiryo Regular
-        # もし上記で見つからない場合、游ゴシックなどを試す
-        # font_path_bold = "C:/Windows/Fonts/YuGothB.ttc" # Yu Gothic Bold
-        # font_path_regular = "C:/Windows/Fonts/YuGothR.ttc" # Yu Gothic Regular
-
-        # フォントが存在するか確認
-        if not os.path.exists(font_path_bold):
-             print(f"警告: フォントファイルが見つかりません: {font_path_bold}")
-             font_path_bold = None # Noneにしてデフォルトフォントを使う
-        if not os.path.exists(font_path_regular):
-             print(f"警告: フォントファイルが見つかりません: {font_path_regular}")
-             font_path_regular = None
-
-        font_title = pygame.font.Font(font_path_bold, 45)
-        font_text = pygame.font.Font(font_path_bold, 48)
-        font_expo = pygame.font.Font(font_path_regular, 28)
-        font_scroll = pygame.font.Font(font_path_regular, 28)
-        print("Fonts loaded successfully.")
-
-    except Exception as e:
-        print(f"フォントの読み込みに失敗しました: {e}")
-        # フォールバックとしてデフォルトフォントを使用
-        font_title = pygame.font.Font(None, 55)
-        font_text = pygame.font.Font(None, 60)
-        font_expo = pygame.font.Font(None, 40)
-        font_scroll = pygame.font.Font(None, 35)
-        print("Using default fonts.")
-
-    # フォントの高さを取得 (スクロール位置計算用)
-    font_expo_height = font_expo.get_height()
-    font_scroll_height = font_scroll.get_height()
-
-    # 背景色
-    background_color = (0, 0, 0)  # 黒
-
-    #タイトル
-    title_surface = font_title.render("シャトルバス発車案内（武生駅・越前たけふ駅・国高・帆山町）", True, (255, 255, 255))  #白
-    title_rect = title_surface.get_rect(center=(screen_width // 2, 43))
-
-    #背景設定
-    bg1 = pygame.Rect(0, 0, screen_width, 130)
-    bg2 = pygame.Rect(0, 80, screen_width, 10)
-    bg3 = pygame.Rect(0, 510, screen_width, 10)
-
-    #図形設定
-    rect1 = pygame.Rect(30, 165, 190, 80)
-    rect2 = pygame.Rect(30, 560, 190, 80)
-
-    #固定テキスト (位置調整)
-    expo_text0_1 = font_expo.render("J-TraIV", True, (255, 255, 255))
-    expo_text0_2 = font_expo.render("発車時刻", True, (255, 255, 255))
-    expo_text0_3 = font_expo.render("行き先", True, (255, 255, 255))
-    expo_text0_4 = font_expo.render("台数", True, (255, 255, 255))
-    expo_text0_5 = font_expo.render("乗り場", True, (255, 255, 255))
-    expo_text1_1 = font_title.render("先発", True, (255, 255, 255))
-    expo_text1_2 = font_expo.render("停車駅", True, (255, 255, 255))
-    expo_text1_3 = font_expo.render("接続列車", True, (255, 255, 255))
-    expo_text2_1 = font_title.render("次発", True, (255, 255, 255))
-    expo_text2_2 = font_expo.render("停車駅", True, (255, 255, 255))
-    expo_text2_3 = font_expo.render("接続列車", True, (255, 255, 255))
-
-    adjust1 = font_expo.render("調整中", True, (255, 255, 255))
-    adjust2 = font_expo.render("調整中", True, (255, 255, 255))
-
-    # --- スクロールテキスト位置計算のための準備 ---
-    # 接続列車エリアのY座標範囲
-    connect_area1_top_y = 355
-    connect_area1_bottom_y = 465
-    connect_area2_top_y = 740
-    connect_area2_bottom_y = 850
-
-    # 「調整中」テキストの描画Y座標 (上端)
-    adjust1_draw_top_y = 415 + (50 - font_expo_height) // 2
-    adjust2_draw_top_y = 800 + (50 - font_expo_height) // 2
-
-    # 接続列車エリアの上線と「調整中」テキストの上端の間のマージン
-    margin_connect1 = adjust1_draw_top_y - connect_area1_bottom_y # 465の線とadjust1の上端の間
-    margin_connect2 = adjust2_draw_top_y - connect_area2_bottom_y # 850の線とadjust2の上端の間 (これは使わない)
-    # 接続列車エリアの下線と「調整中」テキストの上端の間のマージンを使う
-    margin_for_scroll1 = adjust1_draw_top_y - connect_area1_bottom_y
-    margin_for_scroll2 = adjust2_draw_top_y - connect_area2_bottom_y
-
-    # 停車駅スクロールエリアのY座標範囲
-    scroll_area1_top_y = 130 # 仮 (実際はヘッダーの下) -> 描画エリアclip1_rectを使う
-    scroll_area1_bottom_y = 355
-    scroll_area2_top_y = 510 # 仮 -> 描画エリアclip2_rectを使う
-    scroll_area2_bottom_y = 740
-
-    # スクロールテキストの描画Y座標 (上端) を計算
-    # テキストの下端が (scroll_area1_bottom_y - margin_for_scroll1) になるように
-    scroll1_draw_top_y = scroll_area1_bottom_y - margin_for_scroll1 - font_scroll_height
-    # テキストの下端が (scroll_area2_bottom_y - margin_for_scroll2) になるように
-    scroll2_draw_top_y = scroll_area2_bottom_y - margin_for_scroll2 - font_scroll_height
-
-    # --- ここまでスクロール位置計算準備 ---
-
-
-    # 時刻表データの読み込み
+    # 時刻表データの読み込み (calendars.json があれば日付に応じて時刻表を切り替える)
     script_dir = os.path.dirname(__file__) # スクリプトのディレクトリを取得
     timetable_path = os.path.join(script_dir, "timetable.csv")
-    timetable = load_timetable(timetable_path)
+    try:
+        if args.timetable: # 指定された時刻表だけを使う (カレンダーによる切り替えなし)
+            calendars = [Calendar("指定", args.timetable)]
+        else:
+            calendars = load_calendars(os.path.join(script_dir, "calendars.json"), timetable_path)
+        route = get_default_route() # route.json の停車地の定義 (各便の停車パターンを読み込み時に作る)
+        # 鉄道の時刻表があれば、各便の乗り継ぎ列車も読み込み時に探しておく (なければ「調整中」のまま)
+        connections = ConnectionEngine.load_if_exists()
+        timetable_store = TimetableStore(calendars, route=route, connections=connections)
+        timetable_store.load()
+    except (TimetableError, RouteError, OSError, ValueError) as e:
+        print(f"エラー: 時刻表を読み込めません: {e}")
+        sys.exit()
+    schedule = timetable_store.schedule # 発車時刻で二分探索できるインデックス
+    print(f"停車パターン: {route.pattern_count()}種類 ({len(schedule)}便)")
 
     # 最初に表示行を更新
-    update_display_rows(timetable)
-
-    # スクロール関連の変数（先発バス用）
-    scroll1_x = screen_width # 右端からスタート
-    scroll1_speed = 2
-    scroll1_text_width = 0
-    scroll1_text_surface = None
-    clip1_rect = pygame.Rect(250, scroll_area1_bottom_y - font_scroll_height - margin_for_scroll1 - 5, 1300, font_scroll_height + 10) # クリップ領域を計算したY座標に合わせる
-    # scroll1_y = clip1_rect.centery # 中央揃えではなく計算したY座標を使う
-
-    # スクロール関連の変数（次発バス用）
-    scroll2_x = screen_width # 右端からスタート
-    scroll2_speed = 2
-    scroll2_text_width = 0
-    scroll2_text_surface = None
-    clip2_rect = pygame.Rect(250, scroll_area2_bottom_y - font_scroll_height - margin_for_scroll2 - 5, 1300, font_scroll_height + 10) # クリップ領域を計算したY座標に合わせる
-    # scroll2_y = clip2_rect.centery # 中央揃えではなく計算したY座標を使う
-
-    wait_distance = 100 # 追加で待つドット数
-
-    # アナウンスループを別スレッドで開始
-    announcement_thread = threading.Thread(target=announcement_loop, daemon=True)
-    announcement_thread.start()
+    next_transition = update_display_rows(schedule)
+    # デイバンクはその日のカレンダーの時刻表と日付ごとのファイルを使う
+    daybank_path = daybank_path_for(args.daybank, timetable_store.calendar.path, timetable_store.day)
+
+    # アナウンス処理を準備 (子プロセスで動かす場合は音声の合成・変換も子プロセスで行う)
+    cue_offsets = args.cue_offsets if args.announce_timing == "cues" else None
+    if args.announce_worker and numpy_available is None:
+        print("警告: NumPy がないため、アナウンス処理は描画プロセス内で動かします。")
+    elif args.announce_worker:
+        announcement_worker = AnnouncementWorker(audio_player, args.announce_mode, daybank_path, cue_offsets, cache_dir=cache_dir)
+        with announcement_lock:
+            target = announcement_info
+        announcement_worker.start(schedule, target)
+    if announcement_worker is None:
+        vocabulary = setup_announcer(schedule, args.announce_mode, daybank_path, cue_offsets)
+
+    # 静止画面では眠り、時刻表の差し替えやイベントで起きる
+    # (子プロセスのアナウンス処理からの再生指示はイベントで届かないので、眠っていても一定間隔で確認する)
+    frame_pacer = FramePacer(args.fps, poll_interval=WORKER_POLL_INTERVAL if announcement_worker is not None else None)
+
+    # 時刻表ファイルの変更を監視し、変更があれば再起動せずに差し替える
+    # 運行情報 (遅延・乗り場変更・運休) は時刻表に重ねて反映し、どちらの変更も同じ通知で受け取る
+    live_overlay = LiveOverlay(timetable_store)
+    live_overlay.add_listener(on_timetable_reloaded)
+    # 日付やカレンダーが変わったら (夜間に作った) その日のデイバンクを開き直す
+    timetable_store.add_listener(lambda schedule, diff: select_daybank(timetable_store, args.daybank))
+    if args.live_port:
+        start_live_server(live_overlay, port=args.live_port)
+    timetable_store.start()
+
+    # アナウンスループを別スレッドで開始 (ウォームアップ後に先行合成とアナウンスを始める)
+    if announcement_worker is None:
+        announcement_thread = threading.Thread(target=start_announcer, args=(started_at, vocabulary), daemon=True)
+        announcement_thread.start()
+
+    # 固定レイアウトは背景レイヤーに一度だけ描画し、毎フレームはスクロール領域だけを更新する
+    renderer = BoardRenderer(screen, fonts, use_dirty_rects=not args.full_redraw, static_layer=static_layer)
 
     # メインループ
-    clock = pygame.time.Clock()
-    last_update_time = time.monotonic() # 最終更新時刻
-    last_display_rows_count = len(display_rows) # 表示行数が変わったかチェック用
+    last_update_time = service_clock.monotonic() # 最終更新時刻
+    last_display_rows_version = None # 表示行が変わったかチェック用
+    # フレーム時間のばらつき (アナウンス処理を子プロセスにした場合との比較用、スクロール中のフレームだけ)
+    frame_stats = LatencyStats("フレーム時間 (アナウンス: " + ("子プロセス)" if announcement_worker else "同一プロセス)"),
+                               max_samples=1800)
+    last_frame_report = time.monotonic()
+    frame_budget = 1 / args.fps
+    frame_step = None # スクロールを進める時間 (最初のフレームは1フレーム分)
+    first_rows_seconds = None # 起動から時刻表の行を表示するまでの時間
 
     while True:
-        # イベント処理
-        for event in pygame.event.get():
+        # イベント処理 (静止画面で眠っている間に届いたものを含む)
+        for event in frame_pacer.events():
             if event.type == pygame.QUIT:
+                print_frame_jitter(frame_stats)
+                if announcement_worker is not None:
+                    announcement_worker.stop()
                 pygame.quit()
                 sys.exit()
+            elif event.type == pygame.VIDEOEXPOSE:
+                renderer.invalidate() # ウィンドウが再表示されたら全体を描き直す
+            elif event.type == AUDIO_END_EVENT:
+                audio_player.handle_end_event() # 次の音声を予約し、再生完了をアナウンススレッドに知らせる
+        if announcement_worker is not None:
+            announcement_worker.pump() # 子プロセスから届いた音声を再生キューに積む
 
         # --- 時刻表情報の更新 ---
+        # 次の便の切り替わり時刻になったときだけ更新する (時計の補正に備えて60秒ごとにも確認)
         current_time = time.monotonic()
-        if current_time - last_update_time >= 10: # 10秒ごとに更新チェック
-            update_display_rows(timetable)
-            last_update_time = current_time
-
-            # 表示行数が変わったらスクロールテキストをリセット
-            current_display_rows_count = len(display_rows)
-            if current_display_rows_count != last_display_rows_count:
-                print(f"表示行数が変更されました: {last_display_rows_count} -> {current_display_rows_count}")
-                scroll1_text_surface = None
-                scroll2_text_surface = None
-                scroll1_x = screen_width # スクロール位置もリセット
-                scroll2_x = screen_width
-                last_display_rows_count = current_display_rows_count
+        service_time = service_clock.monotonic()
+        if schedule_reloaded.is_set():
+            schedule_reloaded.clear()
+            schedule = live_overlay.schedule
+            next_transition = schedule.next_transition()
+        if (next_transition is not None and service_clock.now() >= next_transition) or service_time - last_update_time >= UPDATE_CHECK_INTERVAL:
+            next_transition = update_display_rows(schedule)
+            last_update_time = service_time
 
 
         # --- 描画処理 ---
-        screen.fill(background_color)
-
-        #背景描画
-        pygame.draw.rect(screen, (38, 38, 38), bg1)
-        pygame.draw.rect(screen, (33, 95, 154), bg2)
-        pygame.draw.rect(screen, (38, 38, 38), bg3)
-
-        #図形描画
-        pygame.draw.rect(screen, (192, 79, 21), rect1, border_radius=10)
-        pygame.draw.rect(screen, (33, 95, 154), rect2, border_radius=10)
-
-        # 線描画 (変更なし)
-        pygame.draw.line(screen, (255, 255, 255), (250, 355), (1550, 355), 1) # 停車駅エリア下線1
-        pygame.draw.line(screen, (255, 255, 255), (250, 465), (1550, 465), 1) # 接続列車エリア下線1
-        pygame.draw.line(screen, (255, 255, 255), (250, 740), (1550, 740), 1) # 停車駅エリア下線2
-        pygame.draw.line(screen, (255, 255, 255), (250, 850), (1550, 850), 1) # 接続列車エリア下線2
-
-        #固定テキスト描画 (位置調整)
-        screen.blit(expo_text0_1, (70, 93))
-        screen.blit(expo_text0_2, (310, 93))
-        screen.blit(expo_text0_3, (750, 93))
-        screen.blit(expo_text0_4, (1130, 93))
-        screen.blit(expo_text0_5, (1350, 93))
-        screen.blit(expo_text1_1, expo_text1_1.get_rect(center=rect1.center)) # 先発 中央揃え
-        # 停車駅テキストのY座標はスクロールテキストの位置に合わせる
-        screen.blit(expo_text1_2, (77, scroll1_draw_top_y + (font_scroll_height - font_expo_height) // 2))
-        screen.blit(expo_text1_3, (65, 415 + (50 - font_expo_height) // 2)) # 接続列車 縦中央揃え (変更なし)
-        screen.blit(expo_text2_1, expo_text2_1.get_rect(center=rect2.center)) # 次発 中央揃え
-        # 停車駅テキストのY座標はスクロールテキストの位置に合わせる
-        screen.blit(expo_text2_2, (77, scroll2_draw_top_y + (font_scroll_height - font_expo_height) // 2))
-        screen.blit(expo_text2_3, (65, 800 + (50 - font_expo_height) // 2)) # 接続列車 縦中央揃え (変更なし)
-
-        screen.blit(adjust1, (840, adjust1_draw_top_y)) # 調整中 縦中央揃え (変更なし)
-        screen.blit(adjust2, (840, adjust2_draw_top_y)) # 調整中 縦中央揃え (変更なし)
-
-        # タイトル描画
-        screen.blit(title_surface, title_rect)
-
-        # --- 時刻表情報の描画 ---
-        current_display_rows_render = []
+        rows_redrawn = False
         with announcement_lock: # display_rowsを読むときもロック
              current_display_rows_render = display_rows[:] # 描画用にコピー
-
-        y_offset = 180
-        # 先発
-        if len(current_display_rows_render) > 0:
-            row = current_display_rows_render[0]
-            time_text = font_text.render(row['ETD'], True, (255, 255, 255))
-            screen.blit(time_text, (310, y_offset))
-            destination_text = "仁愛大学" if row['destination'] == '0' else "武生駅"
-            destination_surface = font_text.render(destination_text, True, (255, 255, 255))
-            screen.blit(destination_surface, (695, y_offset))
-            car_surface = font_text.render(row.get('car', '-'), True, (255, 255, 255)) # carがない場合
-            screen.blit(car_surface, (1150, y_offset))
-            platform_surface = font_text.render(row.get('platform', '-'), True, (255, 255, 255)) # platformがない場合
-            screen.blit(platform_surface, (1380, y_offset))
-
-            # 停車駅スクロール (先発)
-            stop1_info = create_stop_info(row)
-            if scroll1_text_surface is None:
-                scroll1_text_surface = font_scroll.render(stop1_info, True, (255, 255, 255))
-                scroll1_text_width = scroll1_text_surface.get_width()
-                # Y座標計算を再調整 (フォント高さが確定してから)
-                scroll1_draw_top_y = scroll_area1_bottom_y - scroll1_text_surface.get_height()
-                clip1_rect = pygame.Rect(250, scroll1_draw_top_y - 5, 1300, scroll1_text_surface.get_height() + 10) # クリップ領域再設定
-
-
-            scroll1_x -= scroll1_speed
-            if scroll1_x < -scroll1_text_width - wait_distance:
-                scroll1_x = clip1_rect.width # クリップ領域の幅を使う
-
-            screen.set_clip(clip1_rect)
-            # 描画Y座標をscroll1_draw_top_yに設定
-            screen.blit(scroll1_text_surface, (scroll1_x + clip1_rect.x, scroll1_draw_top_y))
-            screen.set_clip(None)
-        else:
-            # 先発がない場合の表示
-            no_bus_text = font_text.render("---", True, (128, 128, 128)) # グレー表示
-            screen.blit(no_bus_text, (310, y_offset))
-            screen.blit(no_bus_text, (695, y_offset))
-            screen.blit(no_bus_text, (1150, y_offset))
-            screen.blit(no_bus_text, (1380, y_offset))
-            no_stop_text = font_scroll.render("本日のバスは終了しました", True, (128, 128, 128))
-            # Y座標を計算した位置に合わせる
-            no_stop_rect = no_stop_text.get_rect(midleft=(clip1_rect.x + 10, scroll1_draw_top_y + font_scroll_height // 2))
-            screen.blit(no_stop_text, no_stop_rect)
-
-
-        y_offset += 385 # 次発のYオフセット (180 + 385 = 565)
-
-        # 次発
-        if len(current_display_rows_render) > 1:
-            row = current_display_rows_render[1]
-            time_text = font_text.render(row['ETD'], True, (255, 255, 255))
-            screen.blit(time_text, (310, y_offset))
-            destination_text = "仁愛大学" if row['destination'] == '0' else "武生駅"
-            destination_surface = font_text.render(destination_text, True, (255, 255, 255))
-            screen.blit(destination_surface, (695, y_offset))
-            car_surface = font_text.render(row.get('car', '-'), True, (255, 255, 255))
-            screen.blit(car_surface, (1150, y_offset))
-            platform_surface = font_text.render(row.get('platform', '-'), True, (255, 255, 255))
-            screen.blit(platform_surface, (1380, y_offset))
-
-            # 停車駅スクロール (次発)
-            stop2_info = create_stop_info(row)
-            if scroll2_text_surface is None:
-                scroll2_text_surface = font_scroll.render(stop2_info, True, (255, 255, 255))
-                scroll2_text_width = scroll2_text_surface.get_width()
-                # Y座標計算を再調整 (フォント高さが確定してから)
-                scroll2_draw_top_y = scroll_area2_bottom_y - scroll2_text_surface.get_height()
-                clip2_rect = pygame.Rect(250, scroll2_draw_top_y - 5, 1300, scroll2_text_surface.get_height() + 10) # クリップ領域再設定
-
-            scroll2_x -= scroll2_speed
-            if scroll2_x < -scroll2_text_width - wait_distance:
-                scroll2_x = clip2_rect.width # クリップ領域の幅を使う
-
-            screen.set_clip(clip2_rect)
-            # 描画Y座標をscroll2_draw_top_yに設定
-            screen.blit(scroll2_text_surface, (scroll2_x + clip2_rect.x, scroll2_draw_top_y))
-            screen.set_clip(None)
-        else:
-             # 次発がない場合の表示
-            no_bus_text = font_text.render("---", True, (128, 128, 128)) # グレー表示
-            screen.blit(no_bus_text, (310, y_offset))
-            screen.blit(no_bus_text, (695, y_offset))
-            screen.blit(no_bus_text, (1150, y_offset))
-            screen.blit(no_bus_text, (1380, y_offset))
-            no_stop_text = font_scroll.render("", True, (128, 128, 128)) # 次発がない場合は停車駅欄は空
-            # Y座標を計算した位置に合わせる
-            no_stop_rect = no_stop_text.get_rect(midleft=(clip2_rect.x + 10, scroll2_draw_top_y + font_scroll_height // 2))
-            screen.blit(no_stop_text, no_stop_rect)
-
-
-        # 画面更新
-        pygame.display.update()
-        clock.tick(30) # FPSを30に設定
+             current_display_rows_version = display_rows_version
+
+        # 表示行が変わったら各欄を描き直す (描画キャッシュは文字列がキーなので、変わった欄だけ描画される)
+        if current_display_rows_version != last_display_rows_version:
+            print(f"表示行が変更されました: {len(current_display_rows_render)}件")
+            renderer.set_rows(current_display_rows_render)
+            last_display_rows_version = current_display_rows_version
+            rows_redrawn = True
+
+        render_started = time.perf_counter()
+        dirty_rects = renderer.render_frame(frame_step)
+
+        # 画面更新 (差分描画時は変化した領域だけを転送する)
+        if dirty_rects is None:
+            pygame.display.update()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+        if rows_redrawn and live_overlay is not None:
+            live_overlay.mark_displayed() # 受け取った運行情報が画面に出るまでの時間を記録する
+        if first_rows_seconds is None:
+            first_rows_seconds = time.monotonic() - started_at
+            print(f"起動時間: 最初の画面 {first_frame_seconds:.3f}秒 / 時刻表の表示 {first_rows_seconds:.3f}秒")
+            metrics.set_gauge("startup_first_rows_seconds", first_rows_seconds)
+        if metrics.enabled:
+            metrics.observe("render_seconds", time.perf_counter() - render_started)
+
+        # スクロール中は --fps で描画し、静止画面では次の切り替わり時刻 (または確認の間隔) かイベントまで眠る
+        animating = args.no_idle or renderer.is_animating()
+        idle_timeout = None
+        if not animating:
+            wake_in = UPDATE_CHECK_INTERVAL - (service_time - last_update_time)
+            if next_transition is not None:
+                wake_in = min(wake_in, (next_transition - service_clock.now()).total_seconds())
+            idle_timeout = service_clock.get_clock().real_seconds(max(wake_in, 0))
+        frame_step = frame_pacer.tick(animating, idle_timeout)
+
+        # フレーム時間 (眠っていた時間は除く) を記録する
+        frame_seconds = frame_pacer.frame_seconds - frame_pacer.idle_seconds
+        if not frame_pacer.idle:
+            frame_stats.record(frame_seconds)
+        if metrics.enabled:
+            if frame_pacer.idle:
+                metrics.increment("idle_frames_total")
+            else:
+                metrics.observe("frame_seconds", frame_seconds)
+                dropped = round(frame_seconds / frame_budget) - 1 # 1フレームの予算を超えた分を取りこぼしとみなす
+                if dropped > 0:
+                    metrics.increment("dropped_frames_total", dropped)
+        if frame_listener is not None:
+            frame_listener(frame_seconds, rows_redrawn)
+        if current_time - last_frame_report >= 60:
+            print_frame_jitter(frame_stats)
+            last_frame_report = current_time
 
 if __name__ == "__main__":
     # multiprocessing を Windows で使う場合に必要な記述
@@ -0,0 +1,158 @@
+# announcement_prefetch.py
+# 次の数便分のアナウンス音声を先に合成しておくバックグラウンド処理
+
+import threading
+import time
+
+import service_clock
+from latency_stats import LatencyStats
+
+
+class PreparedClip:
+    """合成済みのアナウンス音声"""
+    __slots__ = ("text", "data", "ready_at", "used")
+
+    def __init__(self, text, data, ready_at):
+        self.text = text
+        self.data = data
+        self.ready_at = ready_at # 合成が完了した時刻 (time.monotonic)
+        self.used = False        # 一度でも再生に使われたか
+
+
+class AnnouncementPrefetcher:
+    """時刻表インデックスを監視し、次のN便と終了アナウンスの音声を事前に合成する
+
+    build_text(row) でアナウンス文 (文字列、またはフレーズ分割したアナウンス) を作り、
+    synthesize(text) で音声データを得る。
+    再生側は get() / wait_for() で準備済みの音声だけを受け取る。
+    """
+
+    def __init__(self, schedule, build_text, synthesize, lookahead=3, end_message=None,
+                 interval=10):
+        self.build_text = build_text
+        self.synthesize = synthesize
+        self.lookahead = lookahead
+        self.end_message = end_message
+        self.interval = interval # 時刻表を見直す最大間隔 (秒、便の切り替わり時にはすぐ見直す)
+        self.lead_stats = LatencyStats("アナウンス準備の先行時間")
+        self._schedule = schedule
+        self._clips = {}         # text -> PreparedClip
+        self._urgent = []        # すぐに合成してほしいテキスト
+        self._pending = 0        # 今回の見直しで合成待ちになっている数
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """バックグラウンドスレッドを開始する"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def set_schedule(self, schedule):
+        """時刻表インデックスを差し替え、すぐに見直しを行う"""
+        with self._cond:
+            self._schedule = schedule
+            self._cond.notify_all()
+
+    def discard(self, texts):
+        """準備済みの音声を破棄する (時刻表の変更で内容が変わった便など)"""
+        with self._cond:
+            for text in texts:
+                self._clips.pop(text, None)
+            self._cond.notify_all()
+
+    def wanted_texts(self, now=None):
+        """今準備しておくべきアナウンス文を、必要になる順に返す"""
+        if now is None:
+            now = service_clock.now()
+        with self._cond:
+            schedule = self._schedule
+        upcoming = schedule.upcoming(now, self.lookahead + 1)
+        texts = [self.build_text(row) for row in upcoming[:self.lookahead]]
+        if self.end_message and len(upcoming) <= self.lookahead:
+            texts.append(self.end_message) # 終バスが近づいたら終了アナウンスも用意
+        return texts
+
+    def _run(self):
+        while True:
+            with self._cond:
+                urgent = self._urgent[:]
+                self._urgent.clear()
+            try:
+                wanted = urgent + [t for t in self.wanted_texts() if t not in urgent]
+            except Exception as e:
+                print(f"先行合成の対象計算中にエラーが発生しました: {e}")
+                wanted = urgent
+
+            with self._cond:
+                self._pending = sum(1 for text in wanted if text not in self._clips)
+            for text in wanted:
+                with self._cond:
+                    if text in self._clips:
+                        continue
+                data = self.synthesize(text)
+                with self._cond:
+                    self._pending = max(0, self._pending - 1)
+                if not data:
+                    print(f"先行合成に失敗しました: {str(text)[:30]}...")
+                    continue
+                with self._cond:
+                    self._clips[text] = PreparedClip(text, data, time.monotonic())
+                    self._cond.notify_all()
+
+            # 発車済みの便の音声は手放す
+            keep = set(wanted)
+            with self._cond:
+                for text in list(self._clips):
+                    if text not in keep:
+                        del self._clips[text]
+                if not self._urgent:
+                    service_clock.wait(self._cond, self._wait_seconds())
+
+    def queue_depth(self):
+        """合成待ちのアナウンスの数 (負荷試験での確認用)"""
+        with self._cond:
+            return self._pending + len(self._urgent)
+
+    def _wait_seconds(self):
+        """次に見直すまでの秒数 (次の便の切り替わりか interval の早い方)"""
+        now = service_clock.now()
+        transition = self._schedule.next_transition(now)
+        if transition is None:
+            return self.interval
+        return max(0.05, min(self.interval, (transition - now).total_seconds()))
+
+    def _take(self, text):
+        """準備済みの音声を返し、先行時間を記録する (ロック取得済みで呼ぶこと)"""
+        clip = self._clips.get(text)
+        if clip is None:
+            return None
+        if not clip.used: # 先行時間は初回の再生時のみ記録する
+            clip.used = True
+            lead = time.monotonic() - clip.ready_at
+            self.lead_stats.record(lead)
+            print(f"準備済み音声を使用 (必要になる {lead:.1f} 秒前に準備完了): {str(text)[:30]}...")
+        return clip.data
+
+    def get(self, text):
+        """準備済みならその音声を返す。まだならNone"""
+        with self._cond:
+            return self._take(text)
+
+    def wait_for(self, text, timeout=None):
+        """音声の準備を最優先で依頼し、準備ができるまで待つ (タイムアウトでNone)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            data = self._take(text)
+            if data is not None:
+                return data
+            print(f"音声が未準備のため先行合成を依頼します: {str(text)[:30]}...")
+            if text not in self._urgent:
+                self._urgent.append(text)
+            self._cond.notify_all()
+            while text not in self._clips:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._take(text)
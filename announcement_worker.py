@@ -0,0 +1,294 @@
+# announcement_worker.py
+# アナウンス処理 (合成・デコード・アナウンスの順番制御) を子プロセスで動かす
+#
+# 描画プロセスとは2本のキューと共有メモリのリングバッファでやり取りする。
+#   描画 -> 子 : ("target", 行) アナウンス対象 / ("schedule", 行のリスト) 時刻表 / ("daybank", パス) その日のデイバンク
+#               / ("done",) 再生完了 / ("stop",)
+#   子 -> 描画 : ("begin",) / ("resident", 名前) 効果音 / ("pcm", 位置, 長さ) 変換済みの音声 / ("close",)
+#               / ("metrics", 計測値) 合成・デコードの計測値 (描画プロセスで計測を有効にしている場合)
+# 変換済みのPCMはリングバッファに書き、キューには位置と長さだけを送る。
+
+import time
+import queue
+import struct
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+
+import pygame
+
+import metrics
+from sound_bank import SoundBank
+
+RING_HEADER = struct.Struct("<QQ") # 書き込み済みの累計バイト数, 読み出し済みの累計バイト数
+DEFAULT_RING_BYTES = 32 * 1024 * 1024 # 44.1kHzステレオで約3分
+METRICS_FORWARD_INTERVAL = 1.0 # 子プロセスの計測値を描画プロセスに送る間隔 (秒)
+PARENT_CHECK_INTERVAL = 5.0 # 子プロセスが描画プロセスの終了を確認する間隔 (秒)
+
+
+class ParentGoneError(Exception):
+    """描画プロセスが終了している (子プロセスも終了する)"""
+
+
+def parent_alive():
+    """描画プロセスが動いているか (子プロセスでなければ常に True)"""
+    parent = multiprocessing.parent_process()
+    return parent is None or parent.is_alive()
+
+
+class PcmRing:
+    """書き込み側 (子プロセス) と読み出し側 (描画プロセス) が1つずつのリングバッファ
+
+    位置は累計バイト数で表し、それぞれの側が自分の位置だけを書き換えるのでロックは使わない。
+    """
+
+    def __init__(self, capacity=DEFAULT_RING_BYTES, name=None):
+        self.capacity = capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=RING_HEADER.size + capacity)
+            RING_HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+    def _positions(self):
+        return RING_HEADER.unpack_from(self.shm.buf, 0)
+
+    def write(self, data, poll_interval=0.01):
+        """データを書き込み、その位置を返す (空きができるまで待つ)
+
+        待っている間に描画プロセスが終了したら ParentGoneError を送出する (もう読み出されない)。
+        """
+        length = len(data)
+        if length > self.capacity:
+            raise ValueError(f"音声がリングバッファより大きいです: {length}バイト")
+        next_check = time.monotonic() + PARENT_CHECK_INTERVAL
+        while True:
+            written, read = self._positions()
+            if self.capacity - (written - read) >= length:
+                break
+            time.sleep(poll_interval) # 描画プロセスが読み出すのを待つ
+            if time.monotonic() >= next_check:
+                if not parent_alive():
+                    raise ParentGoneError("描画プロセスが終了したため音声を書き込めません")
+                next_check = time.monotonic() + PARENT_CHECK_INTERVAL
+        start = written % self.capacity
+        first = min(length, self.capacity - start)
+        base = RING_HEADER.size
+        self.shm.buf[base + start:base + start + first] = data[:first]
+        if first < length: # 末尾で折り返す
+            self.shm.buf[base:base + length - first] = data[first:]
+        struct.pack_into("<Q", self.shm.buf, 0, written + length)
+        return written
+
+    def read(self, position, length):
+        """位置と長さで指定したデータを取り出し (コピー)、その領域を解放する"""
+        start = position % self.capacity
+        first = min(length, self.capacity - start)
+        base = RING_HEADER.size
+        data = bytes(self.shm.buf[base + start:base + start + first])
+        if first < length:
+            data += bytes(self.shm.buf[base:base + length - first])
+        struct.pack_into("<Q", self.shm.buf, 8, position + length)
+        return data
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class PcmClip:
+    """子プロセス側の変換済み音声 (SoundBank の make_sound に渡す)"""
+    __slots__ = ("pcm",)
+
+    def __init__(self, pcm):
+        self.pcm = pcm
+
+
+class ResidentClip:
+    """描画プロセスが読み込み済みの効果音 (名前だけを送る)"""
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class WorkerAudioPlayer:
+    """子プロセスで AudioPlayer の代わりに使う (再生の指示を描画プロセスに送る)"""
+
+    def __init__(self, ring, events, mixer_format, resident_names):
+        self.ring = ring
+        self.events = events
+        self.bank = SoundBank(mixer_format=mixer_format, make_sound=PcmClip)
+        self.resident = {name: ResidentClip(name) for name in resident_names}
+        self._done = threading.Event()
+        self._done.set()
+
+    def voice_sound(self, key, voice_data):
+        return self.bank.add(key, voice_data)
+
+    def begin(self):
+        self._done.clear()
+        self.events.put(("begin",))
+
+    def append(self, sound):
+        if isinstance(sound, ResidentClip):
+            self.events.put(("resident", sound.name))
+        else:
+            self.events.put(("pcm", self.ring.write(sound.pcm), len(sound.pcm)))
+
+    def close(self):
+        self.events.put(("close",))
+
+    def wait(self):
+        """描画プロセスから再生完了が届くまで待つ (描画プロセスが終了していれば戻る)"""
+        while not self._done.wait(PARENT_CHECK_INTERVAL):
+            if not parent_alive():
+                return False
+        return True
+
+    def play(self, sounds):
+        self.begin()
+        for sound in sounds:
+            self.append(sound)
+        self.close()
+        return self.wait()
+
+    def notify_done(self):
+        self._done.set()
+
+
+def worker_main(control, events, ring_name, ring_bytes, mixer_format, resident_names,
+                announce_mode, daybank_path, cue_offsets, timetable_rows, target, forward_metrics=False, cache_dir=None):
+    """子プロセスの入口: GUI_test のアナウンス処理をそのまま動かす"""
+    import GUI_test as app
+    if cache_dir is not None and cache_dir != app.cache_dir: # 描画プロセスと同じキャッシュを使う
+        app.use_cache_dir(cache_dir)
+    from schedule_index import ScheduleIndex
+    from timetable_store import ScheduleDiff
+
+    if forward_metrics:
+        # 合成・デコードの計測値は描画プロセスの /metrics とログにまとめる
+        metrics.enable_forwarding()
+
+        def send_metrics():
+            while True:
+                time.sleep(METRICS_FORWARD_INTERVAL)
+                records = metrics.drain()
+                if records:
+                    events.put(("metrics", records))
+
+        threading.Thread(target=send_metrics, name="metrics-forward", daemon=True).start()
+
+    ring = PcmRing(ring_bytes, name=ring_name)
+    player = WorkerAudioPlayer(ring, events, mixer_format, resident_names)
+    app.audio_player = player
+    schedule = ScheduleIndex(timetable_rows)
+    vocabulary = app.setup_announcer(schedule, announce_mode, daybank_path, cue_offsets)
+    app.set_announcement_target(target)
+    threading.Thread(target=app.start_announcer, args=(time.monotonic(), vocabulary), daemon=True).start()
+
+    while True:
+        try:
+            message = control.get(timeout=PARENT_CHECK_INTERVAL)
+        except queue.Empty:
+            if not parent_alive(): # 描画プロセスが異常終了して "stop" が届かない場合
+                print("描画プロセスが終了したため、アナウンス処理を終了します。")
+                break
+            continue
+        kind = message[0]
+        if kind == "target":
+            app.set_announcement_target(message[1])
+        elif kind == "schedule":
+            new_schedule = ScheduleIndex(message[1])
+            app.on_timetable_reloaded(new_schedule, ScheduleDiff(schedule, new_schedule))
+            schedule = new_schedule
+        elif kind == "daybank":
+            app.switch_daybank(message[1])
+        elif kind == "done":
+            player.notify_done()
+        elif kind == "stop":
+            break
+    try:
+        ring.close()
+    except BufferError: # 書き込み中のスレッドが残っている場合
+        pass
+
+
+class AnnouncementWorker:
+    """描画プロセス側: 子プロセスを起動し、届いた再生指示を AudioPlayer で実行する
+
+    pump() を描画ループから毎フレーム呼ぶ (キューが空ならすぐ戻る)。
+    """
+
+    def __init__(self, audio_player, announce_mode, daybank_path, cue_offsets=None, ring_bytes=DEFAULT_RING_BYTES,
+                 cache_dir=None):
+        self.audio_player = audio_player
+        self.announce_mode = announce_mode
+        self.daybank_path = daybank_path
+        self.cue_offsets = cue_offsets
+        self.ring_bytes = ring_bytes
+        self.cache_dir = cache_dir
+        self.ring = None
+        self.process = None
+        self._waiting_for_playback = False
+
+    def start(self, schedule, target):
+        context = multiprocessing.get_context("spawn") # 描画プロセスのpygameやスレッドを引き継がない
+        self.control = context.Queue()
+        self.events = context.Queue()
+        self.ring = PcmRing(self.ring_bytes)
+        rows = [trip.row for trip in schedule.trips]
+        self.process = context.Process(
+            target=worker_main, name="announcement-worker", daemon=True,
+            args=(self.control, self.events, self.ring.name, self.ring_bytes, pygame.mixer.get_init(),
+                  list(self.audio_player.resident), self.announce_mode, self.daybank_path, self.cue_offsets, rows, target,
+                  metrics.enabled, self.cache_dir))
+        self.process.start()
+        print(f"アナウンス処理を子プロセスで開始しました (pid {self.process.pid})")
+
+    def set_target(self, row):
+        self.control.put(("target", row))
+
+    def set_schedule(self, schedule):
+        self.control.put(("schedule", [trip.row for trip in schedule.trips]))
+
+    def set_daybank(self, path):
+        self.control.put(("daybank", path))
+
+    def pump(self):
+        """子プロセスからの再生指示を処理し、再生が終わったら知らせる"""
+        while True:
+            try:
+                message = self.events.get_nowait()
+            except queue.Empty:
+                break
+            kind = message[0]
+            if kind == "begin":
+                self.audio_player.begin()
+                self._waiting_for_playback = False
+            elif kind == "resident":
+                sound = self.audio_player.resident.get(message[1])
+                if sound is not None:
+                    self.audio_player.append(sound)
+            elif kind == "pcm":
+                self.audio_player.append(pygame.mixer.Sound(buffer=self.ring.read(message[1], message[2])))
+            elif kind == "close":
+                self.audio_player.close()
+                self._waiting_for_playback = True
+            elif kind == "metrics":
+                metrics.merge(message[1])
+        if self._waiting_for_playback and self.audio_player.finished():
+            self._waiting_for_playback = False
+            self.control.put(("done",))
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.control.put(("stop",))
+            self.process.join(2)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self.ring is not None:
+            self.ring.close(unlink=True)
+            self.ring = None
@@ -0,0 +1,219 @@
+# audio_cache.py
+# 合成済みアナウンス音声のキャッシュ (メモリLRU + ディスク)
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# キャッシュの既定値
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "audio")
+DEFAULT_MEMORY_ITEMS = 64                 # メモリに保持する音声の最大件数
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024    # ディスクキャッシュの上限 (512MB)
+STALE_TMP_SECONDS = 60 * 60               # これより古い書きかけのファイルは起動時に削除する (秒)
+
+
+def make_cache_key(text, speaker, params=None):
+    """テキスト・話者・合成パラメータから内容アドレス (sha256) を作る"""
+    payload = json.dumps(
+        {"text": text, "speaker": speaker, "params": params or {}},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """合成音声を (text, speaker, params) で引けるようにする2段キャッシュ
+
+    1段目はメモリ上のLRU、2段目はディスク上のファイル (キー名.wav)。
+    ディスク側は合計サイズが上限を超えたら最終アクセスが古いものから削除する。
+    ファイルとして残るので再起動後もそのまま使える。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_items=DEFAULT_MEMORY_ITEMS,
+                 max_disk_bytes=DEFAULT_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._disk_bytes = 0
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._remove_stale_tmp()
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+        except OSError as e:
+            print(f"警告: 音声キャッシュディレクトリを作成できません: {self.cache_dir} ({e})")
+            self.cache_dir = None # ディスクキャッシュを無効化
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".wav")
+
+    def _remove_stale_tmp(self):
+        """異常終了で残った書きかけのファイルを削除する (他のプロセスが書き込み中のものは残す)"""
+        limit = time.time() - STALE_TMP_SECONDS
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _scan_disk(self):
+        """ディスク上のキャッシュファイルを (パス, サイズ, 最終アクセス時刻) で列挙する"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".wav"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, st.st_size, max(st.st_atime, st.st_mtime)))
+        return entries
+
+    def _remember(self, key, data):
+        """メモリLRUに登録する (ロック取得済みで呼ぶこと)"""
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, text, speaker, params=None):
+        """キャッシュから音声データを取得する。なければNone"""
+        key = make_cache_key(text, speaker, params)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path, None) # 最終アクセス時刻を更新 (LRU判定用)
+            except OSError:
+                data = None
+            if data:
+                with self._lock:
+                    self._remember(key, data)
+                    self.disk_hits += 1
+                return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, speaker, data, params=None):
+        """音声データをキャッシュに登録する"""
+        if not data:
+            return
+        key = make_cache_key(text, speaker, params)
+        with self._lock:
+            self._remember(key, data)
+
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp_path = None
+        try:
+            # 同じキーを複数のスレッド・プロセスが同時に書いても混ざらないよう、書きかけのファイル名は毎回変える
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=key + ".", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            with self._lock:
+                try:
+                    old_size = os.path.getsize(path) # 上書きする場合は元のファイルの分を差し引く
+                except OSError:
+                    old_size = 0
+                os.replace(tmp_path, path) # 書きかけのファイルを読まないように置き換える
+                tmp_path = None
+                self._disk_bytes += len(data) - old_size
+        except OSError as e:
+            print(f"警告: 音声キャッシュの書き込みに失敗しました: {e}")
+            return
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def get_or_synthesize(self, text, speaker, synthesize, params=None):
+        """キャッシュにあればそれを返し、なければ synthesize() の結果を登録して返す"""
+        data = self.get(text, speaker, params)
+        if data is not None:
+            return data
+        data = synthesize()
+        if data:
+            self.put(text, speaker, data, params)
+        return data
+
+    def discard(self, text, speaker, params=None):
+        """指定した音声をキャッシュから削除する"""
+        key = make_cache_key(text, speaker, params)
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                with self._lock:
+                    self._disk_bytes -= size
+            except OSError:
+                pass
+
+    def _evict_disk(self):
+        """ディスクキャッシュが上限を超えていたら古いものから削除する"""
+        try:
+            entries = self._scan_disk()
+        except OSError:
+            return
+        entries.sort(key=lambda e: e[2]) # 最終アクセスが古い順
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        """ヒット・ミス数などの統計を返す"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
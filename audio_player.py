@@ -0,0 +1,127 @@
+# audio_player.py
+# 予約チャンネルでチャイムとアナウンス音声を続けて再生する (終了はポーリングせずイベントで受け取る)
+
+import os
+import time
+import wave
+import threading
+from collections import deque
+
+import pygame
+
+import service_clock
+from sound_bank import SoundBank
+
+AUDIO_END_EVENT = pygame.USEREVENT + 1 # 予約チャンネルで1つの音声の再生が終わったときのイベント
+
+
+class AudioPlayer:
+    """アナウンス用の再生キュー
+
+    チャイムなどの効果音は起動時に一度だけ読み込んで保持し、アナウンス音声も
+    直近のものはmixerの形式に変換済みの Sound として保持する (60秒ごとの繰り返しで読み直さない)。
+    再生は予約チャンネル1本に順番に積み、チャンネルの終了イベントで次を予約する。
+    描画ループが AUDIO_END_EVENT を handle_end_event() に渡す必要がある。
+    """
+
+    def __init__(self, sounds_dir, channel_id=0, max_voice_sounds=16):
+        pygame.mixer.set_reserved(channel_id + 1) # 通常の Sound.play() にはこのチャンネルを使わせない
+        self.channel = pygame.mixer.Channel(channel_id)
+        self.channel.set_endevent(AUDIO_END_EVENT)
+        self.bank = SoundBank(max_items=max_voice_sounds)
+        self.resident = self._load_resident(sounds_dir)
+        self._lock = threading.Lock()
+        self._pending = deque() # チャンネルの予約枠が空くのを待っている音声
+        self._closed = True # これ以上音声が追加されないか
+        self._done = threading.Event()
+        self._done.set()
+        self._deadline = 0.0 # 積んだ音声が全て鳴り終わる見込みの時刻
+        self.started_at = None # 最後に並びの再生を始めた時刻 (service_clock の時刻、負荷試験用)
+
+    def _load_resident(self, sounds_dir):
+        """sounds フォルダのWAVを全て読み込む (ファイル名から拡張子を除いたものがキー)"""
+        resident = {}
+        try:
+            names = sorted(os.listdir(sounds_dir))
+        except OSError as e:
+            print(f"警告: 効果音フォルダを読み込めません: {e}")
+            return resident
+        for name in names:
+            if not name.lower().endswith(".wav"):
+                continue
+            key = os.path.splitext(name)[0]
+            try:
+                with open(os.path.join(sounds_dir, name), "rb") as f:
+                    resident[key] = self.bank.add(key, f.read(), resident=True)
+            except (OSError, EOFError, wave.Error, pygame.error) as e:
+                print(f"警告: 効果音を読み込めません: {name} ({e})")
+        return resident
+
+    def voice_sound(self, key, voice_data):
+        """アナウンス音声の Sound を返す (同じキーなら変換済みのものを使う)"""
+        return self.bank.add(key, voice_data)
+
+    def begin(self):
+        """新しい再生の並びを始める (前の並びが終わっていなければ止める)"""
+        with self._lock:
+            self._pending.clear()
+            self.channel.stop()
+            self._closed = False
+            self._done.clear()
+            self._deadline = time.monotonic()
+            self.started_at = service_clock.now()
+
+    def append(self, sound):
+        """並びの最後に音声を追加する (何も鳴っていなければすぐに再生される)"""
+        with self._lock:
+            self._deadline = max(self._deadline, time.monotonic()) + sound.get_length()
+            if self._pending or self.channel.get_queue() is not None:
+                self._pending.append(sound)
+            else:
+                self.channel.queue(sound)
+
+    def close(self):
+        """これ以上音声を追加しないことを伝える"""
+        with self._lock:
+            self._closed = True
+            self._check_done()
+
+    def play(self, sounds):
+        """音声を続けて再生し、終わるまで待つ"""
+        self.begin()
+        for sound in sounds:
+            self.append(sound)
+        self.close()
+        return self.wait()
+
+    def finished(self):
+        """最後に始めた並びの再生が終わっているか"""
+        return self._done.is_set()
+
+    def handle_end_event(self):
+        """予約チャンネルの終了イベントを受けて、次の音声を予約する (描画ループから呼ぶ)"""
+        with self._lock:
+            if self._pending and self.channel.get_queue() is None:
+                self.channel.queue(self._pending.popleft())
+            self._check_done()
+
+    def _check_done(self):
+        if (self._closed and not self._pending
+                and self.channel.get_queue() is None and not self.channel.get_busy()):
+            self._done.set()
+
+    def wait(self):
+        """並びの再生完了を待つ
+
+        通常は終了イベントで起こされる。イベントが処理されていない場合に備えて、
+        鳴り終わる見込みの時刻を過ぎたらチャンネルの状態を確認する。
+        """
+        while True:
+            with self._lock:
+                remaining = self._deadline - time.monotonic()
+            if self._done.wait(max(remaining, 0) + 1.0):
+                return True
+            with self._lock:
+                if self._pending and self.channel.get_queue() is None:
+                    self.channel.queue(self._pending.popleft())
+                self._check_done()
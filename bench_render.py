@@ -0,0 +1,193 @@
+# bench_render.py
+# 発車案内の描画のベンチマーク (ウィンドウなしで BoardRenderer を決まった表示状態で動かす)
+#
+# 使い方: python bench_render.py [--frames 900] [--output bench_render.json] [--baseline 前回の結果.json]
+# 表示状態 (2便・1便・運行終了・長い停車駅スクロール・表示行の切り替わり) ごとに、
+# 差分描画と全体描画のそれぞれでフレーム時間のパーセンタイル、1フレームあたりに作った Surface の数、
+# blit した面積を測り、JSON に書き出す。--baseline を指定すると p95 が許容範囲を超えた項目を報告し、終了コード1で終わる。
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # ウィンドウを開かずに描画する
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+from board_renderer import BoardRenderer, BoardFonts, SCREEN_SIZE, find_font_paths
+from route_model import RouteModel, get_default_route
+
+STOP_COLUMNS = ("echizen_takefu", "hoyama(1)", "kunitaka(1)", "takefu", "kunitaka(2)", "hoyama(2)", "jindai")
+
+
+def make_row(etd, stop_flags, platform="1", route=None, **extra):
+    """ベンチマーク用の時刻表の行を作る (stop_flags は停車地の列の値の並び)"""
+    route = route or get_default_route()
+    row = {"order": etd, "ETD": etd, "destination": "1", "car": "1", "platform": platform, "ETA": "23:59"}
+    row.update(zip((column for column, _, _ in route.stops), stop_flags))
+    row.update(extra)
+    route.compile_timetable([row])
+    return row
+
+
+def long_route(stop_count=24):
+    """停車駅の案内が画面幅の数倍になる路線 (長いスクロールの計測用)"""
+    return RouteModel({
+        "origin": "仁愛大学",
+        "stops": [{"column": f"stop{i}", "name": f"市役所前第{i}停留所"} for i in range(stop_count)],
+        "destinations": {},
+        "default_destination": "武生駅",
+    })
+
+
+def scenarios():
+    """(名前, 路線, 表示行の並び) のリストを返す。表示行の並びは順に切り替えながら描画する"""
+    first = make_row("8:15", ("1", "0", "0", "1", "0", "0", "1"))
+    second = make_row("8:35", ("1", "1", "1", "1", "1", "1", "0"), platform="2")
+    delayed = make_row("8:35", ("1", "1", "1", "1", "1", "1", "0"), platform="3",
+                       delay="5", expected_ETD="8:40", scheduled_platform="2")
+    route = long_route()
+    long_rows = [make_row("9:00", ("1",) * len(route.stops), route=route),
+                 make_row("9:20", ("1", "0") * (len(route.stops) // 2), route=route)]
+    return [
+        ("two_rows", None, [[first, second]]),
+        ("one_row", None, [[first]]),
+        ("end_of_service", None, [[]]),
+        ("long_scroll", route, [long_rows]),
+        ("row_change", None, [[first, second], [first, delayed], [second]]),
+    ]
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int((len(sorted_values) - 1) * q))]
+
+
+def distribution(values, scale=1.0):
+    """平均・パーセンタイル・最大を辞書で返す"""
+    values = sorted(v * scale for v in values)
+    return {
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1],
+    }
+
+
+def run_scenario(screen, fonts, route, row_sets, use_dirty_rects, frames, change_every):
+    """1つの表示状態を frames フレーム描画し、計測値を返す"""
+    renderer = BoardRenderer(screen, fonts, use_dirty_rects=use_dirty_rects, route=route)
+    frame_times = []
+    present_times = []
+    surfaces = []
+    blit_areas = []
+    blits = []
+    for frame in range(frames):
+        started = time.perf_counter()
+        if frame % change_every == 0 and (frame == 0 or len(row_sets) > 1):
+            renderer.set_rows(row_sets[(frame // change_every) % len(row_sets)])
+        dirty_rects = renderer.render_frame()
+        rendered = time.perf_counter()
+        if dirty_rects is None:
+            pygame.display.update()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+        presented = time.perf_counter()
+        frame_times.append(rendered - started)
+        present_times.append(presented - rendered)
+        surfaces.append(renderer.frame_surfaces)
+        blit_areas.append(renderer.frame_blit_area)
+        blits.append(renderer.frame_blits)
+    steady = slice(1, None) # 1フレーム目 (背景の全体描画とテキストの作成) は別に報告する
+    return {
+        "frames": frames,
+        "first_frame_ms": frame_times[0] * 1000,
+        "frame_ms": distribution(frame_times[steady], 1000),
+        "present_ms": distribution(present_times[steady], 1000),
+        "surfaces_per_frame": {"mean": sum(surfaces[steady]) / (frames - 1), "max": max(surfaces[steady]),
+                               "total": sum(surfaces)},
+        "blit_area_px": distribution(blit_areas[steady]),
+        "blits_per_frame": sum(blits[steady]) / (frames - 1),
+        "text_cache": renderer.text_cache.stats(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """前回の結果と比べ、p95 のフレーム時間が許容範囲を超えて悪化した項目を返す"""
+    previous = {(r["scenario"], r["mode"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["mode"]))
+        if before is None:
+            continue
+        old_p95 = before["frame_ms"]["p95"]
+        new_p95 = result["frame_ms"]["p95"]
+        if new_p95 > old_p95 * (1 + tolerance) and new_p95 - old_p95 > 0.05: # 0.05ms未満の差は誤差とみなす
+            regressions.append(f"{result['scenario']} ({result['mode']}): p95 {old_p95:.3f}ms -> {new_p95:.3f}ms")
+        if result["surfaces_per_frame"]["mean"] > before["surfaces_per_frame"]["mean"]:
+            regressions.append(f"{result['scenario']} ({result['mode']}): Surface/フレーム "
+                               f"{before['surfaces_per_frame']['mean']:.2f} -> {result['surfaces_per_frame']['mean']:.2f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="発車案内の描画ベンチマーク (ウィンドウなし)")
+    parser.add_argument("--frames", type=int, default=900, help="表示状態ごとのフレーム数 (30fpsで30秒分)")
+    parser.add_argument("--change-every", type=int, default=30, help="row_change で表示行を切り替える間隔 (フレーム)")
+    parser.add_argument("--modes", default="dirty,full", help="dirty: 差分描画 / full: 毎フレーム全体描画 (カンマ区切り)")
+    parser.add_argument("--output", default="-", help="結果のJSONの出力先 (- は標準出力)")
+    parser.add_argument("--baseline", help="比較する前回の結果のJSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="p95 の悪化をどこまで許すか (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    if args.frames < 2:
+        parser.error("--frames は2以上にしてください")
+
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    font_paths = find_font_paths()
+    fonts = BoardFonts.load(*font_paths)
+
+    results = []
+    for name, route, row_sets in scenarios():
+        for mode in args.modes.split(","):
+            result = run_scenario(screen, fonts, route, row_sets, mode == "dirty", args.frames, args.change_every)
+            results.append({"scenario": name, "mode": mode, **result})
+            print(f"{name:15s} {mode:5s} p50 {result['frame_ms']['p50']:.3f}ms p95 {result['frame_ms']['p95']:.3f}ms "
+                  f"p99 {result['frame_ms']['p99']:.3f}ms Surface/フレーム {result['surfaces_per_frame']['mean']:.2f} "
+                  f"blit {result['blit_area_px']['mean']:.0f}px", file=sys.stderr)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "sdl": ".".join(map(str, pygame.get_sdl_version())),
+        "video_driver": pygame.display.get_driver(),
+        "screen": list(SCREEN_SIZE),
+        "fonts": list(font_paths),
+        "frames": args.frames,
+        "results": results,
+    }
+    pygame.quit()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"結果を書き出しました: {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"悪化: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
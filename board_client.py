@@ -0,0 +1,86 @@
+# board_client.py
+# 描画サーバー (board_server.py) が共有メモリに書いた発車案内のフレームを、この画面に表示する
+#
+# 使い方: python board_client.py 名前 [--fullscreen] [--fps 30]
+# 名前は boards.json の name。サーバーより先に起動した場合や、サーバーが再起動した場合は、
+# フレームバッファができるまで待ってから表示する。新しいフレームがなければ画面は更新しない。
+
+import sys
+import argparse
+
+import pygame
+
+from frame_buffer import SharedFrameBuffer, shm_name, PIXEL_FORMAT, BYTES_PER_PIXEL, STATE_CLOSED
+from frame_pacer import DEFAULT_FPS
+
+RETRY_INTERVAL_MS = 1000 # フレームバッファを開き直す間隔
+
+
+def open_frame_buffer(name):
+    """発車案内のフレームバッファを開く。まだなければNone"""
+    try:
+        return SharedFrameBuffer(shm_name(name), track=False)
+    except FileNotFoundError:
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="描画サーバーの発車案内を表示する")
+    parser.add_argument("name", help="発車案内の名前 (boards.json の name)")
+    parser.add_argument("--fullscreen", action="store_true", help="全画面で表示する")
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS, help="新しいフレームを確認する回数 (毎秒)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pygame.display.init() # 表示だけなので mixer やフォントは初期化しない
+    clock = pygame.time.Clock()
+    frame_buffer = None
+    screen = None
+    waiting_reported = False
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                if frame_buffer is not None:
+                    frame_buffer.close()
+                pygame.quit()
+                sys.exit()
+            elif event.type == pygame.VIDEOEXPOSE:
+                last_seq = None # ウィンドウが再表示されたら今のフレームを描き直す
+
+        if frame_buffer is None:
+            frame_buffer = open_frame_buffer(args.name)
+            if frame_buffer is None:
+                if not waiting_reported:
+                    print(f"描画サーバーを待っています: {args.name}")
+                    waiting_reported = True
+                pygame.time.wait(RETRY_INTERVAL_MS)
+                continue
+            waiting_reported = False
+            size = frame_buffer.size
+            if screen is None or screen.get_size() != size:
+                screen = pygame.display.set_mode(size, pygame.FULLSCREEN if args.fullscreen else 0)
+                pygame.display.set_caption(f"発車案内 ({args.name})")
+            # フレームは手元のバッファにコピーしてから表示する (描画サーバーの書き込み中の画面を出さない)
+            pixels = bytearray(size[0] * size[1] * BYTES_PER_PIXEL)
+            frame = pygame.image.frombuffer(pixels, size, PIXEL_FORMAT)
+            last_seq = None
+            print(f"表示を開始しました: {args.name} ({size[0]}x{size[1]})")
+
+        seq = frame_buffer.read_into(pixels, last_seq)
+        if seq is not None:
+            screen.blit(frame, (0, 0))
+            pygame.display.update()
+            last_seq = seq
+        elif frame_buffer.header()[1] == STATE_CLOSED:
+            print("描画サーバーが終了しました。再起動を待ちます")
+            frame_buffer.close()
+            frame_buffer = None
+            continue
+        clock.tick(args.fps)
+
+
+if __name__ == "__main__":
+    main()
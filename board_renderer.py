@@ -0,0 +1,478 @@
+# board_renderer.py
+# 発車案内の画面描画 (ウィンドウがなくても、任意のSurfaceに描画できる)
+#
+# GUI_test.py の描画ループと bench_render.py の両方から使う。
+# 固定レイアウトは背景レイヤーに一度だけ描画し、毎フレームはスクロール領域だけを更新する。
+# 起動を速くするため、フォントの探索結果と背景レイヤーはディスクにキャッシュできる
+# (cache/fonts.json と cache/layout/)。
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import subprocess
+
+import pygame
+
+from text_cache import TextSurfaceCache
+from route_model import get_default_route
+from connections import CONNECTIONS_KEY, format_connections
+
+SCREEN_SIZE = (1600, 900)
+TITLE_TEXT = "シャトルバス発車案内（武生駅・越前たけふ駅・国高・帆山町）"
+BACKGROUND_COLOR = (0, 0, 0) # 黒
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+YELLOW = (255, 220, 0) # 運行情報で変わった欄
+SCROLL_SPEED = 60 # 停車駅のスクロールの速さ (ドット/秒、30fpsで1フレーム2ドット)
+DEFAULT_FRAME_STEP = 1 / 30 # render_frame() で経過時間を指定しない場合に進める時間 (秒)
+STATIC_TEXT_MARGIN = 10 # スクロールしない案内文の左の余白 (ドット)
+WAIT_DISTANCE = 100 # スクロールが一周したあとに追加で待つドット数
+
+# 日本語フォントの候補 (sys.platform の先頭, 太字, 標準)。動いているOSの候補だけを上から順に調べ、存在するものを使う
+FONT_CANDIDATES = [
+    ("win32", "C:/Windows/Fonts/meiryob.ttc", "C:/Windows/Fonts/meiryo.ttc"), # メイリオ
+    ("win32", "C:/Windows/Fonts/YuGothB.ttc", "C:/Windows/Fonts/YuGothR.ttc"), # 游ゴシック
+    ("linux", "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc", "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc"), # Debian・Ubuntu・Raspberry Pi OS
+    ("linux", "/usr/share/fonts/noto-cjk/NotoSansCJK-Bold.ttc", "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc"), # Arch
+    ("linux", "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Bold.ttc", "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc"), # Fedora
+    ("linux", "/usr/share/fonts/opentype/ipaexfont-gothic/ipaexg.ttf", "/usr/share/fonts/opentype/ipaexfont-gothic/ipaexg.ttf"),
+    ("linux", "/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf", "/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf"),
+    ("darwin", "/System/Library/Fonts/ヒラギノ角ゴシック W6.ttc", "/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc"),
+]
+FONT_ENV = "BOARD_FONTS" # "太字のパス,標準のパス" で明示する場合
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+DEFAULT_FONT_CACHE_PATH = os.path.join(CACHE_DIR, "fonts.json")
+DEFAULT_LAYER_CACHE_DIR = os.path.join(CACHE_DIR, "layout")
+LAYOUT_VERSION = 1 # 固定レイアウトの描画内容を変えたら増やす (保存済みの背景レイヤーを使わなくなる)
+
+
+def _fontconfig_match(pattern):
+    """fontconfig (fc-match) で日本語フォントを探す。見つからなければNone"""
+    if shutil.which("fc-match") is None:
+        return None
+    try:
+        result = subprocess.run(["fc-match", "-f", "%{file}", pattern],
+                                capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    path = result.stdout.strip()
+    return path if path and os.path.exists(path) else None
+
+
+def _discover_font_paths():
+    for platform, bold, regular in FONT_CANDIDATES:
+        if sys.platform.startswith(platform) and os.path.exists(bold) and os.path.exists(regular):
+            return bold, regular
+    return _fontconfig_match("sans:lang=ja:weight=bold"), _fontconfig_match("sans:lang=ja")
+
+
+def _load_font_cache(cache_path):
+    """前回見つけたフォントのパスを返す (OSが違う・ファイルがなくなった場合はNone)"""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    paths = cached.get("paths")
+    if cached.get("platform") != sys.platform or not isinstance(paths, list) or len(paths) != 2:
+        return None
+    if not all(isinstance(path, str) and os.path.exists(path) for path in paths):
+        return None
+    return tuple(paths)
+
+
+def _save_font_cache(cache_path, paths):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"platform": sys.platform, "paths": list(paths)}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"警告: フォントの探索結果を保存できません: {e}")
+
+
+def find_font_paths(cache_path=None):
+    """日本語フォントのパス (太字, 標準) を探す。見つからない方はNone (pygameの標準フォントを使う)
+
+    cache_path を指定すると、見つかった結果を保存して次回からは候補の確認や fc-match を省く
+    (見つからなかった場合は保存せず、次回も探し直す)。
+    """
+    configured = os.environ.get(FONT_ENV)
+    if configured:
+        bold, _, regular = configured.partition(",")
+        return bold or None, regular or bold or None
+    if cache_path:
+        cached = _load_font_cache(cache_path)
+        if cached is not None:
+            return cached
+    paths = _discover_font_paths()
+    if cache_path and all(paths):
+        _save_font_cache(cache_path, paths)
+    return paths
+
+
+class BoardFonts:
+    """画面で使うフォント一式"""
+
+    def __init__(self, title, text, expo, scroll):
+        self.title = title
+        self.text = text
+        self.expo = expo
+        self.scroll = scroll
+
+    @classmethod
+    def load(cls, font_path_bold=None, font_path_regular=None):
+        """フォントを読み込む (読み込めなければpygameの標準フォントを使う)"""
+        try:
+            # フォントが存在するか確認
+            if font_path_bold and not os.path.exists(font_path_bold):
+                print(f"警告: フォントファイルが見つかりません: {font_path_bold}")
+                font_path_bold = None # Noneにしてデフォルトフォントを使う
+            if font_path_regular and not os.path.exists(font_path_regular):
+                print(f"警告: フォントファイルが見つかりません: {font_path_regular}")
+                font_path_regular = None
+            if font_path_bold is None or font_path_regular is None:
+                print("警告: 日本語フォントが見つかりません。標準フォントで表示します。")
+            # 見出しと停車駅は同じ書体・大きさなので、フォントファイルの読み込みは1回で済ませる
+            regular = pygame.font.Font(font_path_regular, 28)
+            fonts = cls(pygame.font.Font(font_path_bold, 45),
+                        pygame.font.Font(font_path_bold, 48),
+                        regular, regular)
+            print("Fonts loaded successfully.")
+        except Exception as e:
+            print(f"フォントの読み込みに失敗しました: {e}")
+            # フォールバックとしてデフォルトフォントを使用
+            fonts = cls(pygame.font.Font(None, 55), pygame.font.Font(None, 60),
+                        pygame.font.Font(None, 40), pygame.font.Font(None, 35))
+            print("Using default fonts.")
+        return fonts
+
+
+def create_stop_info(row, route=None):
+    """停車駅情報から案内文を返す (停車パターンごとに作成済みの文を表から引く)"""
+    if not row: # rowがNoneや空の場合
+        return "本日のバスは終了しました。"
+    return (route or get_default_route()).pattern(row).stop_info
+
+
+def render_row_fields(row, font, text_cache, route=None):
+    """表示行の各欄 (発車時刻・行き先・台数・乗り場) のSurfaceとX座標を返す"""
+    destination_text = (route or get_default_route()).destination_name(row)
+    if row.get('expected_ETD'): # 遅れている便は見込みの発車時刻を表示する
+        etd_surface = text_cache.render(font, row['expected_ETD'], YELLOW)
+    else:
+        etd_surface = text_cache.render(font, row['ETD'], WHITE)
+    platform_color = YELLOW if row.get('scheduled_platform') else WHITE
+    return [
+        (etd_surface, 310),
+        (text_cache.render(font, destination_text, WHITE), 695),
+        (text_cache.render(font, row.get('car', '-'), WHITE), 1150), # carがない場合
+        (text_cache.render(font, row.get('platform', '-'), platform_color), 1380), # platformがない場合
+    ]
+
+
+def render_connections(row, font, text_cache):
+    """接続列車欄のSurfaceを返す (乗り継ぎ列車は時刻表の読み込み時に探し済み)。なければNone"""
+    if not row:
+        return None
+    text = format_connections(row.get(CONNECTIONS_KEY))
+    if text is None:
+        return None
+    return text_cache.render(font, text, WHITE)
+
+
+def connection_position(surface, placeholder, top_y):
+    """接続列車欄の描画位置 (「調整中」は従来の位置、列車の案内は欄の中央。欄からはみ出す場合は左詰め)"""
+    if surface is placeholder:
+        return (840, top_y)
+    return (max(260, 900 - surface.get_width() // 2), top_y)
+
+
+def build_static_layer(surface, fonts):
+    """固定レイアウト (背景・枠線・見出し・タイトル) を描画した背景レイヤーを作る"""
+    screen_width, screen_height = surface.get_size()
+    static_layer = pygame.Surface((screen_width, screen_height), 0, surface) # 描画先と同じ形式にする
+    static_layer.fill(BACKGROUND_COLOR)
+
+    #背景描画
+    pygame.draw.rect(static_layer, (38, 38, 38), pygame.Rect(0, 0, screen_width, 130))
+    pygame.draw.rect(static_layer, (33, 95, 154), pygame.Rect(0, 80, screen_width, 10))
+    pygame.draw.rect(static_layer, (38, 38, 38), pygame.Rect(0, 510, screen_width, 10))
+
+    #図形描画
+    rect1 = pygame.Rect(30, 165, 190, 80)
+    rect2 = pygame.Rect(30, 560, 190, 80)
+    pygame.draw.rect(static_layer, (192, 79, 21), rect1, border_radius=10)
+    pygame.draw.rect(static_layer, (33, 95, 154), rect2, border_radius=10)
+
+    # 線描画
+    pygame.draw.line(static_layer, WHITE, (250, 355), (1550, 355), 1) # 停車駅エリア下線1
+    pygame.draw.line(static_layer, WHITE, (250, 465), (1550, 465), 1) # 接続列車エリア下線1
+    pygame.draw.line(static_layer, WHITE, (250, 740), (1550, 740), 1) # 停車駅エリア下線2
+    pygame.draw.line(static_layer, WHITE, (250, 850), (1550, 850), 1) # 接続列車エリア下線2
+
+    #固定テキスト描画 (位置調整)
+    font_expo_height = fonts.expo.get_height()
+    static_layer.blit(fonts.expo.render("J-TraIV", True, WHITE), (70, 93))
+    static_layer.blit(fonts.expo.render("発車時刻", True, WHITE), (310, 93))
+    static_layer.blit(fonts.expo.render("行き先", True, WHITE), (750, 93))
+    static_layer.blit(fonts.expo.render("台数", True, WHITE), (1130, 93))
+    static_layer.blit(fonts.expo.render("乗り場", True, WHITE), (1350, 93))
+    first_text = fonts.title.render("先発", True, WHITE)
+    static_layer.blit(first_text, first_text.get_rect(center=rect1.center)) # 先発 中央揃え
+    connection_text = fonts.expo.render("接続列車", True, WHITE)
+    static_layer.blit(connection_text, (65, 415 + (50 - font_expo_height) // 2)) # 接続列車 縦中央揃え
+    second_text = fonts.title.render("次発", True, WHITE)
+    static_layer.blit(second_text, second_text.get_rect(center=rect2.center)) # 次発 中央揃え
+    static_layer.blit(connection_text, (65, 800 + (50 - font_expo_height) // 2)) # 接続列車 縦中央揃え
+    # 接続列車欄 (乗り継ぎ列車がなければ「調整中」) は表示行に合わせて全体描画時に描く
+
+    # タイトル描画
+    title_surface = fonts.title.render(TITLE_TEXT, True, WHITE)
+    static_layer.blit(title_surface, title_surface.get_rect(center=(screen_width // 2, 43)))
+    return static_layer
+
+
+def font_fingerprint(font_paths):
+    """フォントファイルの識別に使う値 (パス・大きさ・更新時刻。中身は読まない)"""
+    parts = []
+    for path in font_paths:
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        parts.append([path, stat.st_size if stat else None, stat.st_mtime_ns if stat else None])
+    return parts
+
+
+def static_layer_key(size, font_paths):
+    """背景レイヤーのキャッシュのキー (画面の大きさ・フォント・タイトル・レイアウトの版が同じなら同じ)"""
+    source = json.dumps([LAYOUT_VERSION, list(size), TITLE_TEXT, font_fingerprint(font_paths)], ensure_ascii=False)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+class StaticLayerCache:
+    """描画済みの背景レイヤーをディスクに保存し、次回の起動ではフォントを使わずに表示できるようにする"""
+
+    def __init__(self, cache_dir=DEFAULT_LAYER_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, key):
+        # 単色の面が多いので PNG なら数KBで済む (停電直後のキャッシュされていないディスクからでも速く読める)
+        return os.path.join(self.cache_dir, f"static_{key}.png")
+
+    def load(self, key, surface):
+        """保存済みの背景レイヤーを surface と同じ形式で返す。なければNone"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            layer = pygame.image.load(path)
+        except (pygame.error, OSError) as e:
+            print(f"警告: 背景レイヤーのキャッシュを読み込めません: {path} ({e})")
+            return None
+        if layer.get_size() != surface.get_size():
+            return None
+        return layer.convert(surface)
+
+    def save(self, key, layer):
+        """背景レイヤーを保存する (同じキーの古いファイル以外は消す)"""
+        path = self._path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = path + ".tmp.png"
+            pygame.image.save(layer, tmp_path)
+            os.replace(tmp_path, path)
+            for name in os.listdir(self.cache_dir):
+                if name.startswith("static_") and name != os.path.basename(path):
+                    os.remove(os.path.join(self.cache_dir, name)) # フォントや画面の大きさが変わる前のもの
+        except (pygame.error, OSError) as e:
+            print(f"警告: 背景レイヤーのキャッシュを保存できません: {e}")
+
+
+class _RowSlot:
+    """先発・次発の1行分の描画状態 (各欄・停車駅スクロール・接続列車欄)"""
+
+    def __init__(self, y_offset, scroll_bottom_y, placeholder, placeholder_y, label, end_text,
+                 font_scroll_height, margin, screen_width):
+        self.y_offset = y_offset               # 各欄のY座標
+        self.scroll_bottom_y = scroll_bottom_y # 停車駅スクロールエリアの下端
+        self.placeholder = placeholder         # 接続列車欄の「調整中」
+        self.placeholder_y = placeholder_y
+        self.label = label                     # 「停車駅」
+        self.end_text = end_text               # 便がないときに停車駅欄に出す文
+        # テキストの下端が (scroll_bottom_y - margin) になるように描画Y座標 (上端) を計算
+        self.draw_top_y = scroll_bottom_y - margin - font_scroll_height
+        self.clip_rect = pygame.Rect(250, scroll_bottom_y - font_scroll_height - margin - 5, 1300, font_scroll_height + 10)
+        self.screen_width = screen_width
+        self.row = None
+        self.fields = []
+        self.connection_surface = placeholder
+        self.scroll_text = None
+        self.scroll_surface = None
+        self.scroll_width = 0
+        self.scroll_x = screen_width # 右端からスタート
+        self.scrolling = True # 案内文が欄に収まらずスクロールしているか
+
+    def fits(self):
+        """案内文がスクロールせずに欄に収まるか"""
+        return self.scroll_width + STATIC_TEXT_MARGIN <= self.clip_rect.width
+
+
+class BoardRenderer:
+    """時刻表の表示行を surface に描画する (ウィンドウの有無によらない)
+
+    set_rows() で表示行を渡し、render_frame() を毎フレーム呼ぶ。
+    render_frame() は更新した領域のリストを返す (画面全体を描き直したときはNone)。
+    呼び出し側はそれに合わせて pygame.display.update() などで転送する。
+    スクロールは経過時間で進めるので、フレームが遅れても速さは変わらない。
+    案内文が欄に収まる行はスクロールせずに止めて表示し、is_animating() が偽の間は
+    呼び出し側は次の変化まで描画を休んでよい。
+    static_layer を渡すと、固定レイアウトを描画せずにそれを背景に使う。
+    ベンチマーク用に、直近のフレームで blit した面積と新しく作った Surface の数を数える
+    (set_rows() で作った Surface は次のフレームに含める)。
+    """
+
+    def __init__(self, surface, fonts, use_dirty_rects=True, route=None, text_cache=None, static_layer=None):
+        self.surface = surface
+        self.fonts = fonts
+        self.use_dirty_rects = use_dirty_rects
+        self.route = route
+        self.text_cache = text_cache if text_cache is not None else TextSurfaceCache()
+        self.full_redraw = True # 次のフレームで画面全体を描き直すか
+        self.frame_blit_area = 0 # 直近のフレームで blit したピクセル数
+        self.frame_blits = 0
+        self.frame_surfaces = 0 # 直近のフレームで新しく作った Surface の数 (テキストの描画)
+        self._pending_surfaces = 0 # set_rows() で作った Surface の数 (次のフレームに含める)
+        # 起動時に表示した (またはキャッシュから読み込んだ) 背景レイヤーがあればそれを使う
+        self.static_layer = static_layer if static_layer is not None else build_static_layer(surface, fonts)
+        screen_width = surface.get_width()
+        font_scroll_height = fonts.scroll.get_height()
+        font_expo_height = fonts.expo.get_height()
+        # 「調整中」テキストの描画Y座標 (上端)
+        adjust1_draw_top_y = 415 + (50 - font_expo_height) // 2
+        adjust2_draw_top_y = 800 + (50 - font_expo_height) // 2
+        # 接続列車エリアの下線と「調整中」テキストの上端の間のマージンを、停車駅スクロールの下端の余白に使う
+        margin_for_scroll1 = adjust1_draw_top_y - 465
+        margin_for_scroll2 = adjust2_draw_top_y - 850
+        self.slots = (
+            _RowSlot(180, 355, fonts.expo.render("調整中", True, WHITE), adjust1_draw_top_y,
+                     fonts.expo.render("停車駅", True, WHITE), "本日のバスは終了しました",
+                     font_scroll_height, margin_for_scroll1, screen_width),
+            _RowSlot(180 + 385, 740, fonts.expo.render("調整中", True, WHITE), adjust2_draw_top_y,
+                     fonts.expo.render("停車駅", True, WHITE), "", # 次発がない場合は停車駅欄は空
+                     font_scroll_height, margin_for_scroll2, screen_width),
+        )
+
+    def invalidate(self):
+        """次のフレームで画面全体を描き直す (ウィンドウの再表示時など)"""
+        self.full_redraw = True
+
+    def set_rows(self, rows):
+        """表示行 (先頭2件を先発・次発に使う) を差し替え、変わった欄を描き直す
+
+        描画キャッシュは文字列がキーなので、変わらない欄は描画し直さない。
+        停車駅のスクロールは、案内文が変わった行だけ先頭に戻す。
+        """
+        misses = self.text_cache.misses
+        for i, slot in enumerate(self.slots):
+            row = rows[i] if len(rows) > i else None
+            slot.row = row
+            slot.fields = render_row_fields(row, self.fonts.text, self.text_cache, self.route) if row else []
+            slot.connection_surface = render_connections(row, self.fonts.expo, self.text_cache) or slot.placeholder
+            scroll_text = create_stop_info(row, self.route) if row else None
+            if scroll_text != slot.scroll_text:
+                slot.scroll_text = scroll_text
+                slot.scroll_surface = None
+                slot.scroll_x = slot.screen_width # スクロール位置もリセット
+                slot.scrolling = True # 案内文を描画したときに欄に収まるか確認する
+        self._pending_surfaces += self.text_cache.misses - misses
+        self.full_redraw = True # 行の各欄を背景から描き直す
+
+    def _blit(self, source, dest, area=None):
+        rect = self.surface.blit(source, dest, area)
+        self.frame_blit_area += rect.width * rect.height
+        self.frame_blits += 1
+
+    def _render_text(self, font, text, color):
+        misses = self.text_cache.misses
+        surface = self.text_cache.render(font, text, color)
+        self.frame_surfaces += self.text_cache.misses - misses
+        return surface
+
+    def _draw_slot(self, slot, full_redraw, dirty_rects, elapsed):
+        fonts = self.fonts
+        font_scroll_height = fonts.scroll.get_height()
+        if slot.row is not None:
+            if full_redraw:
+                for field_surface, field_x in slot.fields:
+                    self._blit(field_surface, (field_x, slot.y_offset))
+
+            # 停車駅スクロール
+            if slot.scroll_surface is None:
+                slot.scroll_surface = self._render_text(fonts.scroll, slot.scroll_text, WHITE)
+                slot.scroll_width = slot.scroll_surface.get_width()
+                # Y座標計算を再調整 (フォント高さが確定してから)
+                slot.draw_top_y = slot.scroll_bottom_y - slot.scroll_surface.get_height()
+                slot.clip_rect = pygame.Rect(250, slot.draw_top_y - 5, 1300, slot.scroll_surface.get_height() + 10) # クリップ領域再設定
+
+                slot.scrolling = not slot.fits()
+
+            if not slot.scrolling:
+                # 欄に収まる案内文は止めて表示する (変化しないので全体描画時のみ)
+                if full_redraw:
+                    self._blit(slot.scroll_surface, (slot.clip_rect.x + STATIC_TEXT_MARGIN, slot.draw_top_y))
+            else:
+                slot.scroll_x -= SCROLL_SPEED * elapsed
+                if slot.scroll_x < -slot.scroll_width - WAIT_DISTANCE:
+                    slot.scroll_x = slot.clip_rect.width # クリップ領域の幅を使う
+
+                if not full_redraw:
+                    self._blit(self.static_layer, slot.clip_rect, slot.clip_rect) # スクロール領域だけ背景を復元
+                self.surface.set_clip(slot.clip_rect)
+                self._blit(slot.scroll_surface, (int(slot.scroll_x) + slot.clip_rect.x, slot.draw_top_y))
+                self.surface.set_clip(None)
+                dirty_rects.append(slot.clip_rect)
+        elif full_redraw:
+            # 便がない場合の表示 (変化しないので全体描画時のみ)
+            no_bus_text = self._render_text(fonts.text, "---", GRAY) # グレー表示
+            for field_x in (310, 695, 1150, 1380):
+                self._blit(no_bus_text, (field_x, slot.y_offset))
+            no_stop_text = self._render_text(fonts.scroll, slot.end_text, GRAY)
+            # Y座標を計算した位置に合わせる
+            no_stop_rect = no_stop_text.get_rect(midleft=(slot.clip_rect.x + 10, slot.draw_top_y + font_scroll_height // 2))
+            self._blit(no_stop_text, no_stop_rect)
+
+        if full_redraw:
+            # 停車駅テキストのY座標はスクロールテキストの位置に合わせる
+            self._blit(slot.label, (77, slot.draw_top_y + (font_scroll_height - fonts.expo.get_height()) // 2))
+            self._blit(slot.connection_surface,
+                       connection_position(slot.connection_surface, slot.placeholder, slot.placeholder_y))
+
+    def is_animating(self):
+        """スクロールしている行があるか (偽なら次に set_rows() などを呼ぶまで画面は変わらない)"""
+        return any(slot.row is not None and slot.scrolling for slot in self.slots)
+
+    def render_frame(self, elapsed=None):
+        """1フレーム分を描画し、更新した領域のリストを返す (画面全体を描き直したときはNone)
+
+        elapsed は前のフレームからの経過時間 (秒)。省略すると30fpsの1フレーム分だけ進める。
+        """
+        if elapsed is None:
+            elapsed = DEFAULT_FRAME_STEP
+        full_redraw = self.full_redraw
+        dirty_rects = [] # 今回のフレームで更新した領域
+        self.frame_blit_area = 0
+        self.frame_blits = 0
+        self.frame_surfaces = self._pending_surfaces
+        self._pending_surfaces = 0
+        if full_redraw:
+            # 固定レイアウトは事前に描画済みの背景レイヤーを貼るだけ
+            self._blit(self.static_layer, (0, 0))
+        for slot in self.slots:
+            self._draw_slot(slot, full_redraw, dirty_rects, elapsed)
+        self.full_redraw = not self.use_dirty_rects
+        return None if full_redraw else dirty_rects
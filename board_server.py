@@ -0,0 +1,548 @@
+# board_server.py
+# 複数の発車案内をまとめて描画する描画サーバー (各画面の board_client.py は共有メモリのフレームを表示するだけ)
+#
+# 使い方: python board_server.py [--config boards.json] [--workers 4] [--fps 30] [--live-port 8765] [--metrics-port 9464]
+#
+# boards.json の例 (ファイルのパスは boards.json からの相対パス):
+# {
+#     "boards": [
+#         {"name": "jindai-1", "platforms": ["1"]},
+#         {"name": "jindai-lobby", "size": [1920, 1080]},
+#         {"name": "takefu", "calendars": "takefu/calendars.json", "route": "takefu/route.json", "size": [1280, 720]}
+#     ]
+# }
+# calendars (または1つの時刻表だけを使う timetable) と route を省略した発車案内は、GUI_test.py と同じファイルを使う。
+# platforms を指定すると、その乗り場から発車する便だけを表示する。size の既定は 1600x900。
+#
+# 時刻表の読み込み・監視と表示行の計算は、同じ時刻表と路線を使う発車案内の間で1つにまとめて親プロセスで行う。
+# 運行情報 (遅延・乗り場変更・運休) は GUI_test.py と同じく --live-port で受け付け (live_updates.py)、
+# その便がある全ての時刻表に重ねる。
+# 描画は CPU の数までの子プロセスに発車案内を振り分けて行い、子プロセスごとにフォント・背景レイヤー・
+# テキストの描画キャッシュを共有する。1600x900 と大きさが違う発車案内は 1600x900 で描画してから拡大・縮小する。
+# フレームは発車案内ごとの共有メモリ (frame_buffer.py) に書く。
+# 計測値は発車案内ごとの描画時間 (board_frame_seconds) と子プロセスごとのフレーム時間・取りこぼしを
+# 60秒ごとに表示し、--metrics-port を指定すれば metrics.py の /metrics でも公開する。
+# アナウンス (音声) は扱わない (音声を流す停留所では GUI_test.py を使う)。
+
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+import multiprocessing
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # 描画サーバー自身はウィンドウを開かない
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+import metrics
+import service_clock
+from latency_stats import LatencyStats
+from frame_pacer import DEFAULT_FPS, MAX_FRAME_STEP
+from frame_buffer import SharedFrameBuffer, shm_name, PIXEL_FORMAT, BYTES_PER_PIXEL
+from text_cache import TextSurfaceCache
+from route_model import RouteModel, RouteError, get_default_route
+from connections import ConnectionEngine
+from timetable_store import TimetableStore, TimetableError, Calendar, load_calendars
+from live_updates import LiveOverlay, DEFAULT_LIVE_PORT, start_server as start_live_server
+from board_renderer import (BoardRenderer, BoardFonts, SCREEN_SIZE, find_font_paths, build_static_layer,
+                            StaticLayerCache, static_layer_key, DEFAULT_FONT_CACHE_PATH)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG_PATH = os.path.join(SCRIPT_DIR, "boards.json")
+ROWS_PER_BOARD = 2 # 先発・次発
+UPDATE_CHECK_INTERVAL = 60 # 表示の切り替わり時刻とは別に表示行を確認し直す間隔 (時計の上での秒)
+STATS_INTERVAL = 1.0 # 子プロセスが計測値を送る間隔 (秒)
+REPORT_INTERVAL = 60 # 発車案内ごとのフレーム時間を表示する間隔 (秒)
+TEXT_CACHE_ITEMS_PER_BOARD = 32 # 子プロセスのテキスト描画キャッシュの大きさ (担当する発車案内1台あたり)
+
+
+class BoardConfigError(Exception):
+    """発車案内の設定 (boards.json) を読み込めない"""
+
+
+class BoardConfig:
+    """1台の発車案内の設定"""
+
+    def __init__(self, name, size=SCREEN_SIZE, calendars_path=None, timetable_path=None, route_path=None,
+                 platforms=None):
+        self.name = name
+        self.size = tuple(size)
+        self.calendars_path = calendars_path
+        self.timetable_path = timetable_path
+        self.route_path = route_path
+        self.platforms = set(platforms) if platforms else None
+
+    @classmethod
+    def from_json(cls, entry, base_dir):
+        def path_of(key):
+            value = entry.get(key)
+            return os.path.join(base_dir, value) if value else None
+        try:
+            name = str(entry["name"])
+            size = entry.get("size", SCREEN_SIZE)
+            if len(size) != 2 or not all(isinstance(v, int) and v > 0 for v in size):
+                raise BoardConfigError(f"発車案内 '{name}' の size が正しくありません: {size}")
+            platforms = entry.get("platforms")
+            return cls(name, size, path_of("calendars"), path_of("timetable"), path_of("route"),
+                       [str(p) for p in platforms] if platforms else None)
+        except (KeyError, TypeError) as e:
+            raise BoardConfigError(f"発車案内の設定に必要な項目がありません: {e}") from e
+
+    def source_key(self):
+        """時刻表の読み込みを共有できるかの判定に使う値"""
+        return (self.calendars_path, self.timetable_path, self.route_path)
+
+
+def load_board_configs(path):
+    """boards.json を読み込み、BoardConfig のリストを返す"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except OSError as e:
+        raise BoardConfigError(f"発車案内の設定 '{path}' を読み込めません: {e}") from e
+    except ValueError as e:
+        raise BoardConfigError(f"発車案内の設定 '{path}' の形式が正しくありません: {e}") from e
+    base_dir = os.path.dirname(os.path.abspath(path))
+    boards = [BoardConfig.from_json(entry, base_dir) for entry in config.get("boards", [])]
+    if not boards:
+        raise BoardConfigError(f"発車案内の設定 '{path}' に boards がありません")
+    names = [board.name for board in boards]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise BoardConfigError(f"発車案内の名前が重複しています: {', '.join(duplicates)}")
+    if len({shm_name(name) for name in names}) != len(names):
+        raise BoardConfigError("記号だけが違う発車案内の名前があります (共有メモリの名前が重なります)")
+    return boards
+
+
+def board_rows(schedule, platforms, now):
+    """発車案内に表示する行 (platforms を指定した場合はその乗り場の便だけ) を返す"""
+    if not platforms:
+        return schedule.upcoming(now, ROWS_PER_BOARD)
+    rows = []
+    for trip in schedule.upcoming_trips(now):
+        if trip.row.get('platform') in platforms:
+            rows.append(trip.row)
+            if len(rows) == ROWS_PER_BOARD:
+                break
+    return rows
+
+
+def load_route(route_path):
+    return RouteModel.load(route_path) if route_path else get_default_route()
+
+
+class ScheduleSources:
+    """時刻表の読み込みと監視 (同じ時刻表と路線を使う発車案内の間で共有する)
+
+    時刻表ごとに運行情報を重ねた LiveOverlay を作り、発車案内はその schedule を使う。
+    """
+
+    def __init__(self, on_change):
+        self.on_change = on_change # 時刻表か運行情報が変わったときに呼ぶ
+        self.stores = {} # BoardConfig.source_key() -> TimetableStore
+        self.overlays = {} # BoardConfig.source_key() -> LiveOverlay
+        self.connections = ConnectionEngine.load_if_exists()
+
+    def overlay_for(self, board):
+        key = board.source_key()
+        overlay = self.overlays.get(key)
+        if overlay is None:
+            if board.timetable_path:
+                calendars = [Calendar("指定", board.timetable_path)]
+            else:
+                calendars = load_calendars(board.calendars_path or os.path.join(SCRIPT_DIR, "calendars.json"),
+                                           os.path.join(SCRIPT_DIR, "timetable.csv"))
+            store = TimetableStore(calendars, route=load_route(board.route_path), connections=self.connections)
+            store.load()
+            overlay = LiveOverlay(store)
+            overlay.add_listener(lambda schedule, diff: self.on_change())
+            self.stores[key] = store
+            self.overlays[key] = overlay
+        return overlay
+
+    def start(self):
+        for store in self.stores.values():
+            store.start()
+
+    def mark_displayed(self):
+        for overlay in self.overlays.values():
+            overlay.mark_displayed()
+
+    def next_transition(self):
+        transitions = [overlay.schedule.next_transition() for overlay in self.overlays.values()]
+        transitions = [t for t in transitions if t is not None]
+        return min(transitions) if transitions else None
+
+
+class OverlayGroup:
+    """運行情報の受付 (live_updates.start_server) に渡す: 変更をその便がある全ての時刻表に重ねる"""
+
+    def __init__(self, overlays):
+        self.overlays = overlays
+
+    @staticmethod
+    def _merge(diffs):
+        merged = diffs[0]
+        for diff in diffs[1:]:
+            merged.added |= diff.added
+            merged.removed |= diff.removed
+            merged.changed |= diff.changed
+        return merged
+
+    def set_override(self, key, override):
+        """便に変更を設定する (override=None で取り消し)。どの時刻表にも便がなければ KeyError"""
+        diffs = []
+        for overlay in self.overlays:
+            try:
+                diffs.append(overlay.set_override(key, override))
+            except KeyError:
+                continue
+        if not diffs:
+            raise KeyError(key)
+        return self._merge(diffs)
+
+    def clear(self):
+        return self._merge([overlay.clear() for overlay in self.overlays])
+
+    def overrides(self):
+        found = {}
+        for overlay in self.overlays:
+            for entry in overlay.overrides():
+                found.setdefault((entry["order"], entry["ETD"]), entry)
+        return list(found.values())
+
+
+def prepare_static_layer(font_paths):
+    """背景レイヤーを一度だけ描画して保存しておく (子プロセスはそれを読み込むだけにする)"""
+    layer_cache = StaticLayerCache()
+    key = static_layer_key(SCREEN_SIZE, font_paths)
+    template = pygame.image.frombuffer(bytearray(SCREEN_SIZE[0] * SCREEN_SIZE[1] * BYTES_PER_PIXEL),
+                                       SCREEN_SIZE, PIXEL_FORMAT)
+    if layer_cache.load(key, template) is None:
+        layer_cache.save(key, build_static_layer(template, BoardFonts.load(*font_paths)))
+
+
+# --- 描画の子プロセス ---
+
+class BoardView:
+    """子プロセスでの1台分の描画 (共有メモリのフレームバッファに書く)"""
+
+    def __init__(self, spec, fonts, text_cache, static_layer, route):
+        self.name = spec["name"]
+        self.frame_buffer = SharedFrameBuffer(spec["shm"])
+        target = self.frame_buffer.surface()
+        self.scaled = self.frame_buffer.size != SCREEN_SIZE
+        # 大きさが違う画面は 1600x900 の作業用の Surface に描画してから拡大・縮小する
+        self.canvas = pygame.Surface(SCREEN_SIZE, 0, target) if self.scaled else target
+        self.renderer = BoardRenderer(self.canvas, fonts, route=route, text_cache=text_cache, static_layer=static_layer)
+        self.renderer.set_rows(spec["rows"])
+        self.pending = True # 表示行が変わってまだ描画していない
+        self.frame_times = [] # 親プロセスに送るまでの描画時間
+
+    def set_rows(self, rows):
+        self.renderer.set_rows(rows)
+        self.pending = True
+
+    def needs_frame(self):
+        return self.pending or self.renderer.is_animating()
+
+    def render(self, elapsed):
+        started = time.perf_counter()
+        frame_buffer = self.frame_buffer
+        frame_buffer.begin_write()
+        dirty_rects = self.renderer.render_frame(elapsed)
+        changed = dirty_rects is None or bool(dirty_rects)
+        if self.scaled and changed:
+            pygame.transform.smoothscale(self.canvas, frame_buffer.size, frame_buffer.surface())
+        frame_buffer.end_write(changed)
+        self.pending = False
+        self.frame_times.append(time.perf_counter() - started)
+
+    def close(self):
+        # 共有メモリを参照している Surface を手放してから閉じる (残っていると共有メモリを閉じられない)
+        self.renderer = None
+        self.canvas = None
+        self.frame_buffer.close()
+
+
+def render_worker(index, specs, font_paths, control, stats, fps):
+    """子プロセスの入口: 割り当てられた発車案内を fps で描画する (動いているものがなければ眠る)"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C は親プロセスが受けて stop を送る
+    pygame.display.init()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL) # SDL が差し替えた SIGTERM を戻す (親プロセスの terminate() で終わるように)
+    pygame.display.set_mode((1, 1)) # dummy ドライバー (背景レイヤーの形式の変換に必要)
+    pygame.font.init()
+    fonts = BoardFonts.load(*font_paths)
+    text_cache = TextSurfaceCache(max_items=TEXT_CACHE_ITEMS_PER_BOARD * len(specs))
+    template = pygame.image.frombuffer(bytearray(SCREEN_SIZE[0] * SCREEN_SIZE[1] * BYTES_PER_PIXEL),
+                                       SCREEN_SIZE, PIXEL_FORMAT)
+    static_layer = StaticLayerCache().load(static_layer_key(SCREEN_SIZE, font_paths), template)
+    if static_layer is None:
+        static_layer = build_static_layer(template, fonts)
+    routes = {}
+    views = {}
+    for spec in specs:
+        route_path = spec["route_path"]
+        if route_path not in routes:
+            routes[route_path] = load_route(route_path)
+        views[spec["name"]] = BoardView(spec, fonts, text_cache, static_layer, routes[route_path])
+
+    parent = multiprocessing.parent_process()
+    frame_interval = 1 / fps
+    next_frame = time.perf_counter()
+    last_frame = None # 直前にスクロールを進めた時刻 (動いているものがなければNone)
+    worker_frame_times = []
+    dropped = 0
+    next_stats = time.perf_counter() + STATS_INTERVAL
+    while True:
+        now = time.perf_counter()
+        active = [view for view in views.values() if view.needs_frame()]
+        if active and now >= next_frame:
+            elapsed = 0.0 if last_frame is None else min(now - last_frame, MAX_FRAME_STEP)
+            for view in active:
+                view.render(elapsed)
+            worker_frame_times.append(time.perf_counter() - now)
+            if last_frame is None:
+                next_frame = now + frame_interval # 静止画面から動き出した (眠っていた時間はフレーム落ちではない)
+            else:
+                late = now - next_frame
+                if late >= frame_interval:
+                    dropped += int(late / frame_interval)
+                    next_frame = now + frame_interval
+                else:
+                    next_frame += frame_interval
+            animating = any(view.renderer.is_animating() for view in views.values())
+            last_frame = now if animating else None
+            active = [view for view in views.values() if view.needs_frame()]
+        if now >= next_stats:
+            if parent is not None and not parent.is_alive(): # 親プロセスが異常終了した
+                for view in views.values():
+                    view.close()
+                return
+            frame_times = {view.name: view.frame_times for view in views.values() if view.frame_times}
+            if frame_times or worker_frame_times:
+                stats.put(("stats", index, frame_times, worker_frame_times, dropped))
+                for view in views.values():
+                    view.frame_times = []
+                worker_frame_times = []
+                dropped = 0
+            next_stats = now + STATS_INTERVAL
+
+        # 次のフレームまで (動いているものがなければ計測値を送る時刻まで) 指示を待つ
+        wait_until = min(next_frame, next_stats) if active else next_stats
+        timeout = max(wait_until - time.perf_counter(), 0)
+        try:
+            message = control.get(timeout=timeout) if timeout > 0 else control.get_nowait()
+        except queue.Empty:
+            continue
+        while True:
+            kind = message[0]
+            if kind == "rows":
+                views[message[1]].set_rows(message[2])
+            elif kind == "stop":
+                for view in views.values():
+                    view.close()
+                return
+            try:
+                message = control.get_nowait()
+            except queue.Empty:
+                break
+
+
+# --- 親プロセス ---
+
+class RenderWorker:
+    """描画の子プロセス1つ分 (担当する発車案内と指示のキュー)"""
+
+    def __init__(self, index, boards):
+        self.index = index
+        self.boards = boards
+        self.control = None
+        self.process = None
+
+    def start(self, context, font_paths, stats, fps, rows):
+        self.control = context.Queue()
+        specs = [{"name": board.name, "shm": shm_name(board.name), "route_path": board.route_path,
+                  "rows": rows[board.name]} for board in self.boards]
+        self.process = context.Process(target=render_worker, name=f"board-render-{self.index}", daemon=True,
+                                       args=(self.index, specs, font_paths, self.control, stats, fps))
+        self.process.start()
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.control.put(("stop",))
+            self.process.join(2)
+            if self.process.is_alive():
+                self.process.terminate()
+
+
+class BoardServer:
+    """発車案内の表示行を計算して描画の子プロセスに送り、計測値を集める"""
+
+    def __init__(self, boards, workers, fps, font_paths):
+        self.boards = boards
+        self.fps = fps
+        self.font_paths = font_paths
+        self.schedules_changed = threading.Event()
+        self.sources = ScheduleSources(self.schedules_changed.set)
+        self.schedules = {board.name: self.sources.overlay_for(board) for board in boards} # 運行情報を重ねた時刻表
+        self.frame_buffers = {}
+        self.rows = {}
+        self.board_stats = {board.name: LatencyStats(f"描画時間 [{board.name}]", max_samples=REPORT_INTERVAL * fps)
+                            for board in boards}
+        worker_count = max(1, min(workers, len(boards)))
+        self.workers = [RenderWorker(i, boards[i::worker_count]) for i in range(worker_count)]
+        self.worker_of = {board.name: worker for worker in self.workers for board in worker.boards}
+        self.context = multiprocessing.get_context("spawn")
+        self.stats = self.context.Queue()
+
+    def update_rows(self, initial=False):
+        """各発車案内の表示行を計算し、変わったものだけを子プロセスに送る"""
+        now = service_clock.now()
+        for board in self.boards:
+            rows = board_rows(self.schedules[board.name].schedule, board.platforms, now)
+            if rows == self.rows.get(board.name):
+                continue
+            self.rows[board.name] = rows
+            if not initial:
+                self.worker_of[board.name].control.put(("rows", board.name, rows))
+        self.sources.mark_displayed() # 運行情報の受信から描画プロセスに送るまでの時間を記録する
+
+    def start(self):
+        for board in self.boards:
+            name = shm_name(board.name)
+            try:
+                self.frame_buffers[board.name] = SharedFrameBuffer(name, board.size, create=True)
+            except FileExistsError: # 前回異常終了したサーバーのものが残っている
+                stale = SharedFrameBuffer(name)
+                stale.mark_closed() # 残っているものを表示しているクライアントに開き直させる
+                stale.close(unlink=True)
+                self.frame_buffers[board.name] = SharedFrameBuffer(name, board.size, create=True)
+        self.update_rows(initial=True)
+        for worker in self.workers:
+            worker.start(self.context, self.font_paths, self.stats, self.fps, self.rows)
+            print(f"描画プロセス {worker.index} (pid {worker.process.pid}): "
+                  f"{', '.join(board.name for board in worker.boards)}")
+        self.sources.start()
+
+    def handle_stats(self, message):
+        _, index, frame_times, worker_frame_times, dropped = message
+        for name, times in frame_times.items():
+            board_stats = self.board_stats[name]
+            for seconds in times:
+                board_stats.record(seconds)
+                metrics.observe("board_frame_seconds", seconds, board=name)
+            metrics.increment("board_frames_total", len(times), board=name)
+        if metrics.enabled:
+            for seconds in worker_frame_times:
+                metrics.observe("render_worker_frame_seconds", seconds, worker=index)
+            if dropped:
+                metrics.increment("render_worker_dropped_frames_total", dropped, worker=index)
+
+    def check_workers(self):
+        """異常終了した描画プロセスを起動し直す"""
+        for worker in self.workers:
+            if not worker.process.is_alive():
+                print(f"警告: 描画プロセス {worker.index} が終了しました (終了コード {worker.process.exitcode})。起動し直します")
+                metrics.increment("render_worker_restarts_total", worker=worker.index)
+                worker.start(self.context, self.font_paths, self.stats, self.fps, self.rows)
+
+    def report(self):
+        for board_stats in self.board_stats.values():
+            if board_stats.count:
+                print(board_stats.format())
+        for overlay in self.sources.overlays.values():
+            if overlay.screen_latency.count:
+                print(overlay.screen_latency.format())
+
+    def run(self):
+        last_update_time = service_clock.monotonic()
+        next_transition = self.sources.next_transition()
+        last_report = time.monotonic()
+        while True:
+            try:
+                self.handle_stats(self.stats.get(timeout=STATS_INTERVAL))
+            except queue.Empty:
+                pass
+            service_time = service_clock.monotonic()
+            if (self.schedules_changed.is_set()
+                    or (next_transition is not None and service_clock.now() >= next_transition)
+                    or service_time - last_update_time >= UPDATE_CHECK_INTERVAL):
+                self.schedules_changed.clear()
+                self.update_rows()
+                next_transition = self.sources.next_transition()
+                last_update_time = service_time
+            self.check_workers()
+            if time.monotonic() - last_report >= REPORT_INTERVAL:
+                self.report()
+                last_report = time.monotonic()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        for frame_buffer in self.frame_buffers.values():
+            frame_buffer.mark_closed() # 表示クライアントに開き直すよう知らせる
+            frame_buffer.close(unlink=True)
+        self.frame_buffers = {}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="複数の発車案内をまとめて描画する描画サーバー")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, help="発車案内の設定 (boards.json)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="描画プロセスの数 (既定はCPUの数、発車案内の数より多くはしない)")
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS, help="スクロール中のフレームレート")
+    parser.add_argument("--live-port", type=int, default=DEFAULT_LIVE_PORT,
+                        help="運行情報 (遅延・乗り場変更・運休) を受け付けるポート (127.0.0.1、0で受け付けない)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help=f"計測値を /metrics で公開するポート (127.0.0.1、0で公開しない。例: {metrics.DEFAULT_METRICS_PORT})")
+    parser.add_argument("--metrics-log", help="計測値とイベントを JSON Lines で書き出すログファイル")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        boards = load_board_configs(args.config)
+    except BoardConfigError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    if args.metrics_port or args.metrics_log:
+        metrics.enable(args.metrics_log)
+        if args.metrics_port:
+            metrics.start_server(port=args.metrics_port)
+
+    # フォントの探索と背景レイヤーの描画は親プロセスで一度だけ行い、子プロセスはその結果を使う
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    pygame.font.init()
+    font_paths = find_font_paths(DEFAULT_FONT_CACHE_PATH)
+    prepare_static_layer(font_paths)
+
+    try:
+        server = BoardServer(boards, args.workers, args.fps, font_paths)
+    except (TimetableError, RouteError, OSError, ValueError) as e:
+        print(f"エラー: 時刻表を読み込めません: {e}")
+        sys.exit(1)
+    if args.live_port:
+        start_live_server(OverlayGroup(list(server.sources.overlays.values())), port=args.live_port)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server.start()
+    print(f"{len(boards)}台の発車案内を {len(server.workers)}個の描画プロセスで描画しています")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.report()
+        server.stop()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
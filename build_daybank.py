@@ -0,0 +1,126 @@
+# build_daybank.py
+# 時刻表から1日分のアナウンス音声をまとめて合成し、デイバンクに書き出す
+#
+# 使い方: python build_daybank.py [--date 2026-10-17] [--output daybank.bin] [--workers 4]
+# calendars.json でその日のカレンダーの時刻表を選び、daybank-<時刻表>-<日付>.bin に書き出す
+# (表示中の前日分のファイルは置き換えない)。夜間に翌日分を作っておけば、日付が変わったときに
+# 表示側が開き直す。既存のデイバンクにあるアナウンスはそのまま再利用する。
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from datetime import date
+
+import requests # type: ignore
+
+from GUI_test import (load_timetable, build_announcement_text, END_OF_SERVICE_MESSAGE,
+                      DEFAULT_SPEAKER, SYNTHESIS_PARAMS)
+from audio_cache import make_cache_key
+from daybank import DayBank, DayBankError, write_daybank, daybank_path_for, find_daybanks, remove_old_daybanks
+from schedule_index import ScheduleIndex
+from timetable_store import TimetableStore, load_calendars
+from voicevox_client import get_default_client
+
+
+def announcement_texts(timetable):
+    """announcement_loop が読み上げる全てのアナウンス文を返す (重複なし)"""
+    texts = [build_announcement_text(trip.row) for trip in ScheduleIndex(timetable).trips]
+    texts.append(END_OF_SERVICE_MESSAGE)
+    return list(dict.fromkeys(texts))
+
+
+def _synthesize_worker(job):
+    """ワーカープロセスで1件合成する (接続はプロセスごとのクライアントで使い回す)"""
+    key, text, speaker = job
+    try:
+        data = get_default_client().synthesize(text, speaker, params=SYNTHESIS_PARAMS)
+        return key, text, data, None
+    except requests.exceptions.RequestException as e:
+        return key, text, None, str(e)
+
+
+def build(timetable_path, output_path, workers, speaker=DEFAULT_SPEAKER, rebuild=False, reuse_paths=()):
+    """デイバンクを作成する。合成に失敗したアナウンスがあれば False を返す
+
+    reuse_paths (他の日付のデイバンクなど) にあるアナウンスも合成せずに使う。
+    """
+    texts = announcement_texts(load_timetable(timetable_path))
+    wanted = {make_cache_key(text, speaker, SYNTHESIS_PARAMS): text for text in texts}
+
+    # 既存のデイバンクから再利用できるものを集める (差分だけ合成する)
+    clips = {}
+    for path in ([] if rebuild else [output_path, *reuse_paths]):
+        existing = DayBank.open_if_exists(path)
+        if existing is None:
+            continue
+        for key, text in wanted.items():
+            if key not in clips and key in existing.keys():
+                clips[key] = (text, bytes(existing.get_by_key(key)))
+        existing.close()
+    jobs = [(key, text, speaker) for key, text in wanted.items() if key not in clips]
+    print(f"アナウンス {len(wanted)}件 (再利用 {len(clips)}件 / 合成 {len(jobs)}件)")
+
+    failures = 0
+    if jobs:
+        start = time.monotonic()
+        with multiprocessing.Pool(processes=min(workers, len(jobs))) as pool:
+            for done, (key, text, data, error) in enumerate(pool.imap_unordered(_synthesize_worker, jobs), 1):
+                if data:
+                    clips[key] = (text, data)
+                    print(f"[{done}/{len(jobs)}] 合成完了: {text[:30]}...")
+                else:
+                    failures += 1
+                    print(f"[{done}/{len(jobs)}] 合成失敗: {text[:30]}... ({error})")
+        print(f"合成時間: {time.monotonic() - start:.1f}秒 (ワーカー {min(workers, len(jobs))})")
+
+    # 時刻表の順番で書き出す
+    ordered = {key: clips[key] for key in wanted if key in clips}
+    count = write_daybank(output_path, ordered)
+    size = os.path.getsize(output_path)
+    print(f"デイバンクを書き出しました: {output_path} ({count}件, {size / 1024 / 1024:.1f}MB)")
+    return failures == 0
+
+
+def main(argv=None):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="1日分のアナウンス音声を事前に合成してデイバンクにまとめる")
+    parser.add_argument("--date", type=date.fromisoformat, default=None,
+                        help="どの日のデイバンクを作るか (YYYY-MM-DD、省略時は今日)")
+    parser.add_argument("--calendars", default=os.path.join(script_dir, "calendars.json"),
+                        help="日付ごとの時刻表の切り替え (なければ timetable.csv)")
+    parser.add_argument("--timetable", help="カレンダーを使わずにこの時刻表から作る (GUI_test.py の --timetable と同じ)")
+    parser.add_argument("--output", default=os.path.join(script_dir, "daybank.bin"),
+                        help="GUI_test.py の --daybank と同じパス (実際のファイル名には時刻表と日付が付く)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="合成を並行して行うプロセス数 (VOICEVOX_ENDPOINTS で複数エンジンを指定すると効果的)")
+    parser.add_argument("--speaker", type=int, default=DEFAULT_SPEAKER)
+    parser.add_argument("--rebuild", action="store_true", help="既存のデイバンクを使わずに全て合成し直す")
+    args = parser.parse_args(argv)
+    day = args.date or date.today()
+    try:
+        if args.timetable:
+            timetable_path = args.timetable
+        else:
+            calendars = load_calendars(args.calendars, os.path.join(script_dir, "timetable.csv"))
+            calendar = TimetableStore(calendars).calendar_for(day)
+            timetable_path = calendar.path
+            print(f"{day} の時刻表: {calendar.name} ({os.path.basename(timetable_path)})")
+        output_path = daybank_path_for(args.output, timetable_path, day)
+        others = [path for _, path in find_daybanks(args.output) if path != output_path]
+        ok = build(timetable_path, output_path, max(1, args.workers), args.speaker, args.rebuild, others)
+        # 今日より前の日付のものはもう使われないので消す (今日の分は表示中なので残す)
+        removed = remove_old_daybanks(args.output, min(day, date.today()))
+        if removed:
+            print(f"古いデイバンクを削除しました ({removed}件)")
+    except (OSError, ValueError, DayBankError) as e:
+        print(f"エラー: デイバンクを作成できません: {e}")
+        sys.exit(1)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    # multiprocessing を Windows で使う場合に必要な記述
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,166 @@
+# connections.py
+# 「接続列車」欄の表示用: 鉄道の時刻表から、バスの到着後に乗り継げる列車を探す
+#
+# rail_timetable.csv の例 (駅名は route.json の停車地・終点の表示名と合わせる):
+#   station, direction, departure, train, destination
+#   武生駅, 上り, 8:52, 普通, 福井
+#   越前たけふ駅, 下り, 9:03, つるぎ, 敦賀
+# 駅と方向 (上り・下りなど) ごとに発車時刻でソートした索引を作り、二分探索で次の列車を探す。
+# バスの駅への到着時刻は、発車時刻 (ETD) に route.json の停車地ごとの minutes を足して求める。
+# 乗り継ぎの計算は時刻表の読み込み時に便ごとに済ませておき、描画ループでは結果を読むだけにする。
+
+import os
+import csv
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from schedule_index import PLACEHOLDER_ETD
+
+DEFAULT_RAIL_TIMETABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rail_timetable.csv")
+CONNECTIONS_KEY = "connections" # compile_timetable() で行に追加する乗り継ぎ列車のキー
+DEFAULT_MIN_TRANSFER = 5 # 乗り換えに必要な時間 (分)
+
+
+class RailTimetableError(Exception):
+    """鉄道の時刻表ファイルを読み込めない"""
+
+
+class Train:
+    """駅を発車する1本の列車"""
+    __slots__ = ("station", "direction", "departure", "departure_seconds", "train", "destination")
+
+    def __init__(self, station, direction, departure, departure_seconds, train, destination):
+        self.station = station
+        self.direction = direction
+        self.departure = departure                 # 表示用の発車時刻 ("8:52")
+        self.departure_seconds = departure_seconds # 当日0時からの秒
+        self.train = train
+        self.destination = destination
+
+    def __repr__(self):
+        return f"Train({self.station} {self.direction} {self.departure} {self.train} {self.destination})"
+
+
+def _seconds(text):
+    """"H:MM" を当日0時からの秒にする。不正ならNone (ETA の "0" のような未記入の値を含む)"""
+    try:
+        t = datetime.strptime(str(text).strip(), '%H:%M').time()
+    except ValueError:
+        return None
+    return t.hour * 3600 + t.minute * 60
+
+
+def read_rail_timetable(path):
+    """鉄道の時刻表CSVを読み込み、列車のリストを返す (不正な行は警告してスキップ)"""
+    trains = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f, skipinitialspace=True):
+                seconds = _seconds(row.get('departure', ''))
+                if seconds is None or not row.get('station'):
+                    print(f"警告: 鉄道時刻表の行 {row} が不正です。スキップします。")
+                    continue
+                trains.append(Train(row['station'].strip(), (row.get('direction') or '').strip(),
+                                    row['departure'].strip(), seconds,
+                                    (row.get('train') or '').strip(), (row.get('destination') or '').strip()))
+    except OSError as e:
+        raise RailTimetableError(f"鉄道時刻表 '{path}' を読み込めません: {e}") from e
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise RailTimetableError(f"鉄道時刻表 '{path}' の読み込み中にエラーが発生しました: {e}") from e
+    return trains
+
+
+class ConnectionEngine:
+    """駅・方向ごとの発車時刻の索引から、バスの到着後に乗り継げる列車を探す
+
+    バスの各駅への到着時刻は時刻表にないため、発車時刻 (ETD) に路線の定義の minutes を足して求める
+    (ETD が未定なら ETA から逆算する)。minutes のない駅は、ETA (終点への到着時刻) を到着時刻として使う。
+    """
+
+    def __init__(self, trains, min_transfer=DEFAULT_MIN_TRANSFER, per_direction=1):
+        self.min_transfer = min_transfer
+        self.per_direction = per_direction
+        self._index = {} # 駅 -> [(方向, 発車時刻の配列, 列車のリスト)] (方向はファイルに出てきた順)
+        groups = {}
+        for train in trains:
+            groups.setdefault(train.station, {}).setdefault(train.direction, []).append(train)
+        for station, directions in groups.items():
+            entries = []
+            for direction, station_trains in directions.items():
+                station_trains.sort(key=lambda t: t.departure_seconds)
+                entries.append((direction, array('l', (t.departure_seconds for t in station_trains)), station_trains))
+            self._index[station] = entries
+        self.train_count = len(trains)
+
+    @classmethod
+    def load_if_exists(cls, path=DEFAULT_RAIL_TIMETABLE_PATH, **kwargs):
+        """ファイルがあれば読み込む。ない・読めない場合はNone (接続列車欄は「調整中」のまま)"""
+        if not os.path.exists(path):
+            return None
+        try:
+            engine = cls(read_rail_timetable(path), **kwargs)
+        except RailTimetableError as e:
+            print(f"警告: {e}")
+            return None
+        print(f"鉄道時刻表を読み込みました: {engine.train_count}本 ({len(engine._index)}駅)")
+        return engine
+
+    @property
+    def stations(self):
+        return self._index.keys()
+
+    def next_trains(self, station, arrival_seconds):
+        """駅に arrival_seconds に着いたときに乗り継げる列車を、方向ごとに per_direction 本ずつ返す"""
+        earliest = arrival_seconds + self.min_transfer * 60
+        found = []
+        for _, departures, trains in self._index.get(station, ()):
+            start = bisect_left(departures, earliest)
+            found.extend(trains[start:start + self.per_direction])
+        return found
+
+    def arrival_seconds(self, row, route, station, pattern):
+        """便が駅に着く時刻 (当日0時からの秒) を返す。分からなければNone"""
+        etd = str(row.get('ETD', '')).strip()
+        departure = None if etd == PLACEHOLDER_ETD else _seconds(etd)
+        terminus = _seconds(row.get('ETA', ''))
+        minutes = route.minutes_to(station)
+        if minutes is not None and departure is not None:
+            arrival = departure + int(minutes * 60)
+            return arrival if terminus is None else min(arrival, terminus)
+        terminus_minutes = route.minutes_to(pattern.destination)
+        if minutes is not None and terminus is not None and terminus_minutes is not None:
+            return terminus - int(max(terminus_minutes - minutes, 0) * 60)
+        return terminus # 途中の駅にはETAより前に着くので、ここで見つけた列車には必ず乗り継げる
+
+    def connections_for(self, row, route):
+        """便の停車駅と終点のうち鉄道の駅について、乗り継げる列車を返す"""
+        pattern = route.pattern(row)
+        found = []
+        for station in dict.fromkeys(pattern.stops + (pattern.destination,)):
+            if station not in self._index:
+                continue
+            arrival = self.arrival_seconds(row, route, station, pattern)
+            if arrival is not None:
+                found.extend(self.next_trains(station, arrival))
+        return tuple(found)
+
+    def compile_timetable(self, timetable, route):
+        """時刻表の各行に乗り継げる列車を付けておく (描画ループで探さない)"""
+        for row in timetable:
+            row[CONNECTIONS_KEY] = self.connections_for(row, route)
+
+
+def format_connections(trains, limit=2):
+    """接続列車欄に表示する文字列を返す (発車の早い順に limit 本まで、列車がなければNone)"""
+    if not trains:
+        return None
+    parts = []
+    for train in sorted(trains, key=lambda t: t.departure_seconds)[:limit]:
+        text = f"{train.station} {train.departure}発"
+        if train.train:
+            text += f" {train.train}"
+        if train.destination:
+            text += f" {train.destination}行"
+        parts.append(text)
+    return "　".join(parts)
@@ -0,0 +1,168 @@
+# cue_scheduler.py
+# 発車時刻から決めた時刻 (10分前・3分前・1分前など) にアナウンスを鳴らすスケジューラー (asyncio)
+
+import heapq
+import asyncio
+import threading
+from datetime import timedelta
+
+import metrics
+import service_clock
+from latency_stats import LatencyStats
+from schedule_index import trip_key
+
+DEFAULT_CUE_OFFSETS = (10, 3, 1) # 発車の何分前にアナウンスするか
+MAX_SLEEP = 60 # 時計の補正に備えて、これより長くは眠らずに時刻を確認し直す (秒)
+
+
+class Cue:
+    """1回分のアナウンス予定 (row が None なら終了アナウンス)"""
+    __slots__ = ("fire_at", "departure", "offset", "row")
+
+    def __init__(self, fire_at, departure, offset, row):
+        self.fire_at = fire_at     # アナウンスする時刻 (datetime)
+        self.departure = departure # 対象の便の発車時刻 (datetime)
+        self.offset = offset       # 発車の何分前か
+        self.row = row
+
+    @property
+    def key(self):
+        """どの便の何分前のキューか (同じ発車時刻の別の便とは区別する)"""
+        return (trip_key(self.row) if self.row is not None else None, self.offset)
+
+    def describe(self):
+        if self.row is None:
+            return "終了アナウンス"
+        return f"{self.row['ETD']}発 ({self.offset}分前)"
+
+
+def parse_offsets(text):
+    """"10,3,1" のような文字列をキューの分数のタプルにする (大きい順)"""
+    offsets = sorted({int(part) for part in text.split(",") if part.strip()}, reverse=True)
+    if not offsets or offsets[-1] < 1:
+        raise ValueError(f"キューの分数が不正です: {text}")
+    return tuple(offsets)
+
+
+def build_cues(schedule, now, offsets, grace=5):
+    """now 以降に鳴らすべきキューを作る
+
+    すでに過ぎたキューは、grace 秒以内のものだけ残す (起動直後や再読み込み直後の取りこぼし防止)。
+    当日の最終便の発車後には終了アナウンスのキューを置く。
+    """
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    earliest = now - timedelta(seconds=grace)
+    cues = []
+    trips = schedule.upcoming_trips(now)
+    for trip in trips:
+        departure = midnight + timedelta(seconds=trip.etd_seconds)
+        for offset in offsets:
+            fire_at = departure - timedelta(minutes=offset)
+            if fire_at >= earliest:
+                cues.append(Cue(fire_at, departure, offset, trip.row))
+    if trips:
+        last_departure = midnight + timedelta(seconds=trips[-1].etd_seconds)
+        cues.append(Cue(last_departure + timedelta(seconds=1), last_departure, 0, None))
+    return cues
+
+
+class CueScheduler:
+    """キューをヒープで管理し、時刻になったら announce(row) を呼ぶ
+
+    announce は再生が終わるまで戻らない関数で、同時に1つしか呼ばないのでアナウンスは重ならない。
+    再生中に時刻を過ぎたキューは、同じ便のより新しいキューがあれば飛ばす。
+    発車時刻を過ぎた便のキューは鳴らさずに捨てる。
+    """
+
+    def __init__(self, schedule, announce, offsets=DEFAULT_CUE_OFFSETS, grace=5):
+        self.announce = announce
+        self.offsets = tuple(offsets)
+        self.grace = grace
+        self.lateness_stats = LatencyStats("キューの発火遅れ")
+        self._schedule = schedule
+        self._schedule_lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+
+    def set_schedule(self, schedule):
+        """時刻表を差し替え、キューを作り直させる (別スレッドから呼べる)"""
+        with self._schedule_lock:
+            self._schedule = schedule
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def run(self):
+        """スケジューラーを実行する (呼び出したスレッドで動き続ける)"""
+        asyncio.run(self._main())
+
+    def _build_heap(self, now):
+        with self._schedule_lock:
+            schedule = self._schedule
+        heap = [(cue.fire_at, seq, cue) for seq, cue in enumerate(build_cues(schedule, now, self.offsets, self.grace))]
+        heapq.heapify(heap)
+        return heap
+
+    async def _sleep_until(self, when):
+        """when まで待つ。時刻表が差し替えられたら True を返す"""
+        while True:
+            remaining = (when - service_clock.now()).total_seconds()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=service_clock.get_clock().real_seconds(min(remaining, MAX_SLEEP)))
+                return True
+            except asyncio.TimeoutError:
+                continue
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        announced_end = False
+        fired = set() # 鳴らしたキュー (作り直したときに同じキューを二度鳴らさない)
+        heap = self._build_heap(service_clock.now())
+        if not heap:
+            # 当日の便がもうない場合は終了アナウンスを一度だけ行う
+            await self._fire(Cue(service_clock.now(), service_clock.now(), 0, None))
+            announced_end = True
+
+        while True:
+            if heap:
+                rebuild = await self._sleep_until(heap[0][0])
+            else:
+                # 翌0時になったら翌日 (新しい日付) のキューを作る
+                tomorrow = (service_clock.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+                await self._sleep_until(tomorrow)
+                rebuild = True
+                if service_clock.now() >= tomorrow:
+                    announced_end = False
+                    fired.clear()
+            if rebuild:
+                self._wakeup.clear()
+                heap = self._build_heap(service_clock.now())
+                continue
+
+            _, _, cue = heapq.heappop(heap)
+            now = service_clock.now()
+            if cue.key in fired:
+                continue
+            if cue.row is not None:
+                if now >= cue.departure:
+                    print(f"発車済みのためキューを取り消します: {cue.describe()}")
+                    continue
+                if heap and heap[0][2].row is cue.row and heap[0][0] <= now:
+                    continue # 同じ便のより新しいキューも時刻を過ぎている (前のアナウンスが長引いた)
+            elif announced_end:
+                continue
+            fired.add(cue.key)
+            await self._fire(cue)
+            if cue.row is None:
+                announced_end = True
+
+    async def _fire(self, cue):
+        lateness = (service_clock.now() - cue.fire_at).total_seconds()
+        self.lateness_stats.record(max(lateness, 0))
+        metrics.observe("announcement_lateness_seconds", max(lateness, 0))
+        metrics.event("cue", cue=cue.describe(), fire_at=cue.fire_at.isoformat(), lateness=lateness)
+        print(f"キュー発火: {cue.describe()} 予定 {cue.fire_at:%H:%M:%S} 遅れ {lateness:+.3f}秒")
+        # 再生が終わるまで次のキューは処理しない (アナウンスを重ねない)
+        await self._loop.run_in_executor(None, self.announce, cue.row)
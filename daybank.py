@@ -0,0 +1,187 @@
+# daybank.py
+# 1日分のアナウンス音声をまとめたアーカイブ (デイバンク) の読み書き
+#
+# ファイル形式:
+#   ヘッダー  : マジック "HRKDBNK1" (8バイト) + 索引の位置 (uint64) + 索引の長さ (uint64)
+#   本体      : 各音声のWAVデータを連結したもの
+#   索引      : JSON {"version": 1, "clips": {キー: [位置, 長さ, テキスト]}}
+# キーは audio_cache.make_cache_key (テキスト・話者・合成パラメータのsha256) と同じ。
+#
+# ファイルはカレンダー (の時刻表ファイル) と日付ごとに分ける (daybank_path_for)。
+# 夜間に翌日分を作っても表示中の (メモリマップで開いている) ファイルは置き換えないので、
+# Windows でも書き出しに失敗しない。
+
+import os
+import re
+import json
+import mmap
+import struct
+from datetime import date
+
+from audio_cache import make_cache_key
+
+MAGIC = b"HRKDBNK1"
+HEADER = struct.Struct("<8sQQ")
+FORMAT_VERSION = 1
+
+
+class DayBankError(Exception):
+    """デイバンクのファイルが壊れている、または形式が違う"""
+
+
+class DayBank:
+    """デイバンクをメモリマップで開き、必要な音声だけを取り出す"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        st = os.fstat(self._file.fileno())
+        self._signature = (st.st_mtime_ns, st.st_size)
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e: # 空のファイル
+            self._file.close()
+            raise DayBankError(f"デイバンクが空です: {path}") from e
+        try:
+            self._index = self._read_index()
+        except DayBankError:
+            self.close()
+            raise
+        self.hits = 0
+        self.misses = 0
+
+    def _read_index(self):
+        if len(self._map) < HEADER.size:
+            raise DayBankError(f"デイバンクのヘッダーが不正です: {self.path}")
+        magic, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise DayBankError(f"デイバンクの形式が違います: {self.path}")
+        if index_offset + index_length > len(self._map):
+            raise DayBankError(f"デイバンクの索引が壊れています: {self.path}")
+        try:
+            index = json.loads(self._map[index_offset:index_offset + index_length].decode("utf-8"))
+        except ValueError as e:
+            raise DayBankError(f"デイバンクの索引が読めません: {self.path}") from e
+        if index.get("version") != FORMAT_VERSION:
+            raise DayBankError(f"デイバンクのバージョンが違います: {index.get('version')}")
+        return index.get("clips", {})
+
+    @classmethod
+    def open_if_exists(cls, path):
+        """ファイルがあれば開く。ない・壊れている場合はNone"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            bank = cls(path)
+        except (OSError, DayBankError) as e:
+            print(f"警告: デイバンクを開けません: {e}")
+            return None
+        print(f"デイバンクを読み込みました: {path} ({len(bank)}件)")
+        return bank
+
+    def is_current(self, path):
+        """path が開いているファイルそのもの (置き換えられていない) か"""
+        if os.path.abspath(path) != os.path.abspath(self.path):
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return (st.st_mtime_ns, st.st_size) == self._signature
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def get_by_key(self, key):
+        """キーで音声を取り出す (memoryview、コピーしない)。なければNone"""
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        offset, length = entry[0], entry[1]
+        try:
+            return memoryview(self._map)[offset:offset + length]
+        except ValueError: # 別の日のデイバンクに切り替えて閉じた直後
+            return None
+
+    def get(self, text, speaker, params=None):
+        """テキスト・話者・合成パラメータで音声を取り出す。なければNone"""
+        data = self.get_by_key(make_cache_key(text, speaker, params))
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def close(self):
+        try:
+            self._map.close()
+        except (BufferError, ValueError): # 取り出した memoryview が残っている場合
+            pass
+        self._file.close()
+
+
+def daybank_path_for(base_path, timetable_path, day):
+    """カレンダーの時刻表ファイルと日付ごとのデイバンクのパス (daybank.bin -> daybank-weekday-2026-10-16.bin)"""
+    root, ext = os.path.splitext(base_path)
+    name = os.path.splitext(os.path.basename(timetable_path))[0]
+    return f"{root}-{name}-{day.isoformat()}{ext}"
+
+
+def find_daybanks(base_path):
+    """base_path から作ったデイバンクを [(日付, パス)] で返す (新しい日付から)"""
+    root, ext = os.path.splitext(base_path)
+    directory = os.path.dirname(root) or "."
+    pattern = re.compile(re.escape(os.path.basename(root)) + r"-.+-(\d{4}-\d{2}-\d{2})" + re.escape(ext) + "$")
+    found = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return found
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            try:
+                found.append((date.fromisoformat(match.group(1)), os.path.join(directory, name)))
+            except ValueError:
+                continue
+    found.sort(reverse=True)
+    return found
+
+
+def remove_old_daybanks(base_path, before):
+    """before より前の日付のデイバンクを削除する (開いているプロセスがあって消せないものは残す)"""
+    removed = 0
+    for day, path in find_daybanks(base_path):
+        if day < before:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def write_daybank(path, clips):
+    """clips ({キー: (テキスト, WAVデータ)}) からデイバンクを書き出す (一時ファイルから置き換える)"""
+    tmp_path = path + ".tmp"
+    index = {}
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0)) # 索引の位置は最後に書き直す
+        offset = HEADER.size
+        for key, (text, data) in clips.items():
+            f.write(data)
+            index[key] = [offset, len(data), text]
+            offset += len(data)
+        index_bytes = json.dumps({"version": FORMAT_VERSION, "clips": index}, ensure_ascii=False).encode("utf-8")
+        f.write(index_bytes)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, offset, len(index_bytes)))
+    try:
+        os.replace(tmp_path, path)
+    except PermissionError as e: # Windows でメモリマップで開かれているファイルは置き換えられない
+        os.remove(tmp_path)
+        raise DayBankError(f"デイバンクが使用中のため置き換えられません: {path}") from e
+    return len(index)
@@ -0,0 +1,111 @@
+# frame_buffer.py
+# 描画サーバー (board_server.py) と表示クライアント (board_client.py) が共有するフレームバッファ
+#
+# 1台の発車案内につき1つの共有メモリに、ヘッダーとピクセル (RGBX, 1ピクセル4バイト) を置く。
+# 書き込み側は描画の前後でヘッダーの seq を1ずつ増やす (奇数の間は書き込み中)。
+# 読み出し側は seq が偶数で、コピーの前後で変わっていなければそのフレームを使う (ロックは使わない)。
+
+import re
+import time
+import struct
+from multiprocessing import shared_memory
+
+import pygame
+
+FRAME_HEADER = struct.Struct("<QIIIId") # seq, 幅, 高さ, 状態, 予備, 最後に書き込んだ時刻 (time.time())
+PIXEL_FORMAT = "RGBX"
+BYTES_PER_PIXEL = 4
+STATE_RUNNING = 1
+STATE_CLOSED = 0 # サーバーが終了した (クライアントは開き直す)
+SHM_PREFIX = "departure_board_"
+
+
+def shm_name(board_name):
+    """発車案内の名前から共有メモリの名前を作る"""
+    return SHM_PREFIX + re.sub(r"[^0-9A-Za-z_-]", "_", board_name)
+
+
+def _open_untracked(name):
+    """既存の共有メモリを開く (クライアントの終了時に消されないよう、resource_tracker の管理から外す)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13 以降
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except (ImportError, AttributeError, KeyError):
+            pass
+        return shm
+
+
+class SharedFrameBuffer:
+    """1台分のフレームバッファ
+
+    create=True で作成する (描画サーバーの親プロセス)。それ以外は名前で既存のものを開く。
+    """
+
+    def __init__(self, name, size=None, create=False, track=True):
+        if create:
+            width, height = size
+            self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                  size=FRAME_HEADER.size + width * height * BYTES_PER_PIXEL)
+            FRAME_HEADER.pack_into(self.shm.buf, 0, 0, width, height, STATE_RUNNING, 0, 0.0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name) if track else _open_untracked(name)
+        self.name = name
+        _, width, height, _, _, _ = FRAME_HEADER.unpack_from(self.shm.buf, 0)
+        self.size = (width, height)
+        self.pixels = self.shm.buf[FRAME_HEADER.size:FRAME_HEADER.size + width * height * BYTES_PER_PIXEL]
+        self._surface = None
+
+    def header(self):
+        """(seq, 状態, 最後に書き込んだ時刻) を返す"""
+        seq, _, _, state, _, written_at = FRAME_HEADER.unpack_from(self.shm.buf, 0)
+        return seq, state, written_at
+
+    def _set(self, seq, state, written_at):
+        FRAME_HEADER.pack_into(self.shm.buf, 0, seq, self.size[0], self.size[1], state, 0, written_at)
+
+    # --- 書き込み側 ---
+
+    def surface(self):
+        """共有メモリに直接描画できる Surface を返す (描画は begin_write() と end_write() の間で行う)"""
+        if self._surface is None:
+            self._surface = pygame.image.frombuffer(self.pixels, self.size, PIXEL_FORMAT)
+        return self._surface
+
+    def begin_write(self):
+        seq, state, written_at = self.header()
+        self._set(seq | 1, state, written_at) # 奇数: 書き込み中
+
+    def end_write(self, changed=True):
+        """書き込みを終える (changed が偽なら何も描かなかったので、読み出し側には新しいフレームと見せない)"""
+        seq, state, written_at = self.header()
+        if changed:
+            self._set((seq | 1) + 1, state, time.time())
+        else:
+            self._set(seq - 1 if seq & 1 else seq, state, written_at)
+
+    def mark_closed(self):
+        seq, _, written_at = self.header()
+        self._set(seq, STATE_CLOSED, written_at)
+
+    # --- 読み出し側 ---
+
+    def read_into(self, target, last_seq=None):
+        """新しいフレームがあれば target (bytearray) にコピーして seq を返す。なければ (書き込み中を含む) None"""
+        seq, _, _ = self.header()
+        if seq & 1 or seq == last_seq:
+            return None
+        target[:] = self.pixels
+        if self.header()[0] != seq: # コピー中に書き換えられた
+            return None
+        return seq
+
+    def close(self, unlink=False):
+        self._surface = None # 共有メモリを参照している Surface を先に手放す
+        self.pixels.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
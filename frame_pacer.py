@@ -0,0 +1,78 @@
+# frame_pacer.py
+# 描画ループの待ち方を決める (動いているものがあるときだけ一定のフレームレートで回し、静止画面では眠る)
+#
+# 停車駅のスクロールなど画面が動いている間は pygame.time.Clock で fps を保つ。
+# 運行終了後や案内文が欄に収まっているときなど画面が変わらない間は、次の表示の切り替わり時刻か
+# イベント (終了・再表示・音声の終了) か wake() による通知が届くまで眠る。
+# pygame.event.wait() は SDL のドライバーによっては1msごとに起きて確認するため使わず、
+# IDLE_POLL_INTERVAL ごとにイベントの有無だけを確認する。
+
+import time
+import threading
+
+import pygame
+
+DEFAULT_FPS = 30
+IDLE_POLL_INTERVAL = 0.1 # 静止画面でイベントが届いていないか確認する間隔 (秒)
+MAX_IDLE_SECONDS = 60.0 # 静止画面でもこれより長くは眠らない
+MAX_FRAME_STEP = 0.25 # アニメーションを進める1フレームの上限 (秒、長く止まったあとに飛ばないように)
+
+
+class FramePacer:
+    """描画ループの1フレームごとの待ち時間を決める
+
+    描画ループは events() でイベントを受け取り、描画後に tick() を呼ぶ。
+    tick() はアニメーションを進める時間 (秒) を返す。静止画面で眠った直後は0を返す。
+    poll_interval を指定すると、静止画面でもその間隔で描画ループに戻る (イベントで起こせない処理を確認する場合)。
+    """
+
+    def __init__(self, fps=DEFAULT_FPS, poll_interval=None):
+        self.fps = fps
+        self.poll_interval = poll_interval
+        self.clock = pygame.time.Clock()
+        self.frame_seconds = 0.0 # 直近のフレームの間隔 (眠っていた時間を含む)
+        self.idle_seconds = 0.0 # 直近のフレームで眠っていた時間
+        self.idle = False # 直近のフレームで眠ったか
+        self._wake = threading.Event()
+        self._last = time.perf_counter()
+
+    def events(self):
+        """前回から届いたイベントを返す"""
+        return pygame.event.get()
+
+    def wake(self):
+        """眠っている描画ループを起こす (どのスレッドからでも呼べる)"""
+        self._wake.set()
+
+    def _sleep(self, limit):
+        """limit 秒か、イベントか wake() が届くまで眠る"""
+        deadline = time.perf_counter() + limit
+        while not pygame.event.peek():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or self._wake.wait(min(remaining, IDLE_POLL_INTERVAL)):
+                break
+        self._wake.clear()
+
+    def tick(self, animating, timeout=None):
+        """次のフレームまで待ち、アニメーションを進める時間 (秒) を返す
+
+        animating が真なら fps に合わせて待つ。偽なら timeout 秒 (実時間) かイベントが届くまで眠る。
+        """
+        if animating:
+            self.clock.tick(self.fps)
+            self.idle_seconds = 0.0
+            step = None
+        else:
+            limit = MAX_IDLE_SECONDS if timeout is None else min(max(timeout, 0.0), MAX_IDLE_SECONDS)
+            if self.poll_interval is not None:
+                limit = min(limit, self.poll_interval)
+            started = time.perf_counter()
+            self._sleep(limit)
+            self.idle_seconds = time.perf_counter() - started
+            self.clock.tick() # 次に動き出したときの fps の基準を今にする
+            step = 0.0 # 眠っていた間はアニメーションを進めない
+        now = time.perf_counter()
+        self.frame_seconds = now - self._last
+        self._last = now
+        self.idle = not animating
+        return min(self.frame_seconds, MAX_FRAME_STEP) if step is None else step
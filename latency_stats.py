@@ -0,0 +1,46 @@
+# latency_stats.py
+# 遅延・所要時間の簡易統計 (デバッグ表示用)
+
+import threading
+from collections import deque
+
+
+class LatencyStats:
+    """直近の測定値を保持し、平均やパーセンタイルを返す"""
+
+    def __init__(self, name, max_samples=1000):
+        self.name = name
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds):
+        """測定値 (秒) を1件追加する"""
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        """件数・平均・p50・p95・最小・最大を辞書で返す (測定値がなければ件数のみ)"""
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+        n = len(samples)
+        return {
+            "count": count,
+            "mean": sum(samples) / n,
+            "p50": samples[int((n - 1) * 0.50)],
+            "p95": samples[int((n - 1) * 0.95)],
+            "min": samples[0],
+            "max": samples[-1],
+        }
+
+    def format(self):
+        """1行の文字列にまとめる (ログ出力用)"""
+        s = self.summary()
+        if "mean" not in s:
+            return f"{self.name}: 測定なし"
+        return (f"{self.name}: n={s['count']} 平均 {s['mean']:.3f}s "
+                f"p50 {s['p50']:.3f}s p95 {s['p95']:.3f}s 最大 {s['max']:.3f}s")
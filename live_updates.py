@@ -0,0 +1,233 @@
+# live_updates.py
+# 遅延・乗り場変更・運休の情報をローカルのHTTPで受け取り、時刻表に重ねて反映する
+#
+# 受け付けるリクエスト (127.0.0.1 のみ):
+#   POST   /overrides  {"order": "3", "ETD": "8:15", "delay": 5, "platform": "2", "cancelled": false}
+#                      便は order と ETD (時刻表の値) で指定する。"clear": true でその便の変更を取り消す。
+#   GET    /overrides  現在の変更の一覧
+#   DELETE /overrides  全ての変更を取り消す
+# 変更は TimetableStore の時刻表に重ねた新しい ScheduleIndex として通知する (時刻表ファイルは書き換えない)。
+
+import json
+import time
+import threading
+import urllib.parse
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import service_clock
+from schedule_index import ScheduleIndex, trip_key
+from timetable_store import ScheduleDiff
+from latency_stats import LatencyStats
+
+DEFAULT_LIVE_PORT = 8765
+RECEIVED_AT_KEY = "override_received_at" # 変更を受け取った時刻 (time.time()、遅延の計測用)
+
+
+class OverrideError(ValueError):
+    """変更の内容が不正"""
+
+
+class Override:
+    """1便分の変更"""
+    __slots__ = ("delay", "platform", "cancelled", "received_at")
+
+    def __init__(self, delay=0, platform=None, cancelled=False, received_at=None):
+        self.delay = delay         # 遅れ (分)
+        self.platform = platform   # 変更後の乗り場 (Noneなら変更なし)
+        self.cancelled = cancelled # 運休
+        self.received_at = received_at if received_at is not None else time.time()
+
+    @classmethod
+    def from_json(cls, payload):
+        try:
+            delay = int(payload.get("delay", 0) or 0)
+        except (TypeError, ValueError) as e:
+            raise OverrideError(f"delay が数値ではありません: {payload.get('delay')!r}") from e
+        if not 0 <= delay <= 24 * 60:
+            raise OverrideError(f"delay が範囲外です: {delay}")
+        platform = payload.get("platform")
+        return cls(delay, str(platform).strip() if platform not in (None, "") else None,
+                   bool(payload.get("cancelled", False)))
+
+    def to_json(self):
+        return {"delay": self.delay, "platform": self.platform, "cancelled": self.cancelled}
+
+
+def apply_override(row, override, day):
+    """変更を反映した行のコピーを返す (運休ならNone)"""
+    if override.cancelled:
+        return None
+    row = dict(row)
+    if override.platform is not None and override.platform != row.get('platform'):
+        row['scheduled_platform'] = row.get('platform') or '-'
+        row['platform'] = override.platform
+    if override.delay:
+        scheduled = datetime.combine(day, row['ETD_time'])
+        expected = min(scheduled + timedelta(minutes=override.delay),
+                       datetime.combine(day, datetime.max.time()).replace(second=0, microsecond=0))
+        row['delay'] = str(override.delay)
+        row['expected_ETD'] = f"{expected.hour}:{expected.minute:02d}"
+        row['ETD_time'] = expected.time() # 遅れた発車時刻まで表示・アナウンスの対象に残す
+    row[RECEIVED_AT_KEY] = override.received_at
+    return row
+
+
+class LiveOverlay:
+    """TimetableStore の時刻表に変更を重ね、変わったときに listener(schedule, diff) を呼ぶ
+
+    TimetableStore の代わりにこちらの add_listener() に登録すれば、時刻表ファイルの更新と
+    HTTPで受けた変更のどちらでも同じ通知を受け取れる。変更は日付が変わると破棄する
+    (TimetableStore は時刻表が同じでも日付が変われば通知するので、そのときに重ね直す)。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._overrides = {} # 便のキー (order, ETD) -> Override
+        self._day = store.day or service_clock.now().date()
+        self._lock = threading.Lock()
+        # 合成から通知までをまとめて順番に行う (別スレッドの通知が前後して古い時刻表で上書きしない)
+        self._publish_lock = threading.RLock()
+        self._listeners = []
+        self._pending_screen = [] # 画面への反映を待っている変更の受信時刻
+        self.screen_latency = LatencyStats("変更から画面表示まで")
+        self.schedule = self._compose()
+        store.add_listener(self._on_base_reloaded)
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _compose(self):
+        base = self.store.schedule
+        today = self.store.day or service_clock.now().date() # 時刻表を選んだ日付に合わせる
+        if today != self._day: # 前日の変更は使わない
+            self._overrides.clear()
+            self._day = today
+        if not self._overrides:
+            return base
+        rows = []
+        for trip in base.trips:
+            override = self._overrides.get(trip.key)
+            if override is None:
+                rows.append(trip.row)
+                continue
+            row = apply_override(trip.row, override, today)
+            if row is not None:
+                rows.append(row)
+        return ScheduleIndex(rows)
+
+    def _publish(self):
+        with self._publish_lock:
+            with self._lock:
+                old_schedule = self.schedule
+                self.schedule = self._compose()
+                new_schedule = self.schedule
+            diff = ScheduleDiff(old_schedule, new_schedule)
+            for callback in self._listeners:
+                try:
+                    callback(new_schedule, diff)
+                except Exception as e:
+                    print(f"運行情報の更新通知中にエラーが発生しました: {e}")
+        return diff
+
+    def _on_base_reloaded(self, schedule, diff):
+        self._publish()
+
+    def set_override(self, key, override):
+        """便に変更を設定する (override=None で取り消し)。便がなければ KeyError"""
+        if key not in {trip.key for trip in self.store.schedule.trips}:
+            raise KeyError(key)
+        with self._lock:
+            if override is None:
+                self._overrides.pop(key, None)
+            else:
+                self._overrides[key] = override
+            self._pending_screen.append(time.time())
+        return self._publish()
+
+    def clear(self):
+        with self._lock:
+            self._overrides.clear()
+            self._pending_screen.append(time.time())
+        return self._publish()
+
+    def overrides(self):
+        with self._lock:
+            return [{"order": key[0], "ETD": key[1], **override.to_json()}
+                    for key, override in self._overrides.items()]
+
+    def mark_displayed(self):
+        """描画ループが変更後の画面を表示したときに呼ぶ (受信から表示までの時間を記録)"""
+        with self._lock:
+            pending = self._pending_screen
+            self._pending_screen = []
+        now = time.time()
+        for received_at in pending:
+            self.screen_latency.record(now - received_at)
+
+
+class OverrideHandler(BaseHTTPRequestHandler):
+    """運行情報の変更を受け付ける (server.overlay に反映する)"""
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path == "/overrides":
+            self._send_json(self.server.overlay.overrides())
+        else:
+            self._send_json({"detail": "Not Found"}, status=404)
+
+    def do_DELETE(self):
+        if urllib.parse.urlparse(self.path).path == "/overrides":
+            self.server.overlay.clear()
+            self._send_json({"cleared": True})
+        else:
+            self._send_json({"detail": "Not Found"}, status=404)
+
+    def do_POST(self):
+        if urllib.parse.urlparse(self.path).path != "/overrides":
+            self._send_json({"detail": "Not Found"}, status=404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ValueError(f"Content-Length が不正です: {length}")
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            key = trip_key(payload)
+            override = None if payload.get("clear") else Override.from_json(payload)
+        except (ValueError, AttributeError) as e:
+            self.close_connection = True # 本文を読み切れていないかもしれないので接続を使い回さない
+            self._send_json({"detail": f"invalid request: {e}"}, status=400)
+            return
+        try:
+            diff = self.server.overlay.set_override(key, override)
+        except KeyError:
+            self._send_json({"detail": f"trip not found: order={key[0]} ETD={key[1]}"}, status=404)
+            return
+        print(f"運行情報を受信しました: order={key[0]} ETD={key[1]} "
+              f"{'取り消し' if override is None else override.to_json()} ({diff})")
+        self._send_json({"applied": True, "changed": len(diff.changed) + len(diff.added) + len(diff.removed)})
+
+    def log_message(self, format, *args):
+        pass # アクセスログは出さない
+
+
+def start_server(overlay, host="127.0.0.1", port=DEFAULT_LIVE_PORT):
+    """変更受付サーバーをバックグラウンドで開始する。起動できなければNone"""
+    try:
+        server = ThreadingHTTPServer((host, port), OverrideHandler)
+    except OSError as e:
+        print(f"警告: 運行情報の受付を開始できません ({host}:{port}): {e}")
+        return None
+    server.daemon_threads = True
+    server.overlay = overlay
+    threading.Thread(target=server.serve_forever, name="live-updates", daemon=True).start()
+    print(f"運行情報の受付を開始しました: http://{host}:{server.server_address[1]}/overrides")
+    return server
@@ -0,0 +1,268 @@
+# load_test.py
+# 模擬時計で1日分の運行を早回しし、アナウンスの遅れ・合成待ち・描画の乱れを測る負荷試験
+#
+# 使い方: python load_test.py [--timetable timetable.csv] [--speed 100] [--start 7:00] [--end 21:30]
+#                            [--latency-ms 800] [--jitter-ms 400] [--failure-rate 0.05] [--seed 1]
+#                            [--announce-timing cues] [--announce-mode sentence] [--output load_test.json]
+#
+# GUI_test.main() をウィンドウなし (SDL の dummy ドライバー) で動かし、時計を service_clock.SimulatedClock に差し替える。
+# VOICEVOXエンジンの代わりに遅延・ばらつき・失敗率を設定したスタブサーバーを起動する。
+# 遅延と音声の長さ (スタブの無音WAV・チャイム) は本番の値で指定し、ここで速さに合わせて縮めるので、
+# 結果の時間 (遅れなど) は全て時計の上での秒数 = 本番に換算した値になる。
+# ただし描画のフレーム時間だけは実時間で測る。
+
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import tempfile
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+import service_clock
+from service_clock import SimulatedClock
+from cue_scheduler import DEFAULT_CUE_OFFSETS, parse_offsets
+from schedule_index import ScheduleIndex, trip_key
+from timetable_store import read_timetable
+from voicevox_client import ENDPOINTS_ENV, get_default_client
+from voicevox_stub_server import make_server, SECONDS_PER_CHAR
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FRAME_SPIKE_SECONDS = 0.050 # 30fps (33ms) の1.5倍を超えたフレームを乱れとして記録する
+
+
+def parse_time_of_day(text, day):
+    return datetime.combine(day, datetime.strptime(text, "%H:%M").time())
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int((len(values) - 1) * q))]
+    return {"count": len(values), "mean": sum(values) / len(values), "p50": pick(0.50),
+            "p95": pick(0.95), "p99": pick(0.99), "max": values[-1]}
+
+
+def write_scaled_sounds(sounds_dir, output_dir, speed):
+    """効果音と同じ名前で、長さを 1/speed にした無音WAVを作る (チャイムも時計の上で本番と同じ長さになる)"""
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(sounds_dir):
+        if not name.lower().endswith(".wav"):
+            continue
+        with wave.open(os.path.join(sounds_dir, name), "rb") as src:
+            params = src.getparams()
+        frames = max(1, int(params.nframes / speed))
+        with wave.open(os.path.join(output_dir, name), "wb") as dst:
+            dst.setnchannels(params.nchannels)
+            dst.setsampwidth(params.sampwidth)
+            dst.setframerate(params.framerate)
+            dst.writeframes(b"\x00" * frames * params.nchannels * params.sampwidth)
+
+
+class LoadTestRecorder:
+    """GUI_test の計測フックと、合成待ちの定期的な確認の結果を集める"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.frames = [] # (時計の時刻, フレーム時間 (実秒), 表示行が変わったか)
+        self.announcements = [] # (便のキー, 開始時刻, 音声が鳴り始めた時刻)
+        self.queue_samples = [] # (時計の時刻, 合成待ちの数, エンジンで処理中の数)
+        self._lock = threading.Lock()
+
+    def on_frame(self, frame_seconds, rows_redrawn):
+        self.frames.append((self.clock.now(), frame_seconds, rows_redrawn))
+
+    def on_announce(self, row, started_at, audio_started_at):
+        key = trip_key(row) if row else None
+        with self._lock:
+            self.announcements.append((key, started_at, audio_started_at))
+
+    def sample_queue(self, app, client):
+        prefetcher = app.prefetcher
+        depth = prefetcher.queue_depth() if prefetcher is not None else 0
+        in_flight = sum(endpoint["in_flight"] for endpoint in client.status())
+        self.queue_samples.append((self.clock.now(), depth, in_flight))
+
+
+def departure_report(departures, announcements, timing, offsets, start):
+    """便ごとに、アナウンスすべき時刻と実際に鳴り始めた時刻を突き合わせる"""
+    report = []
+    latenesses = []
+    missed = 0
+    previous_departure = start
+    for trip in departures:
+        midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        departure = midnight + timedelta(seconds=trip.etd_seconds)
+        if timing == "cues":
+            dues = [(departure - timedelta(minutes=offset), offset) for offset in offsets]
+            dues = [(due, offset) for due, offset in dues if due >= start]
+        else:
+            # 60秒ごとのアナウンスでは、前の便が発車して対象になった時点でアナウンスすべき
+            dues = [(max(start, previous_departure), None)]
+        previous_departure = departure
+        events = sorted((s, a) for key, s, a in announcements if key == trip.key)
+        entries = []
+        for i, (due, offset) in enumerate(dues):
+            until = dues[i + 1][0] if i + 1 < len(dues) else departure
+            found = next(((s, a) for s, a in events if due - timedelta(seconds=1) <= s < until), None)
+            entry = {"due": due.strftime("%H:%M:%S"), "offset_minutes": offset}
+            if found is None:
+                entry["missed"] = True
+                missed += 1
+            else:
+                started_at, audio_at = found
+                heard_at = audio_at or started_at
+                entry.update(started=started_at.strftime("%H:%M:%S"),
+                             audio=audio_at.strftime("%H:%M:%S") if audio_at else None,
+                             lateness_seconds=(heard_at - due).total_seconds())
+                latenesses.append(entry["lateness_seconds"])
+            entries.append(entry)
+        report.append({"order": trip.key[0], "ETD": trip.key[1], "announcements": entries})
+    return report, percentiles(latenesses), missed
+
+
+def frame_report(frames, spike_seconds, window=3):
+    """フレーム時間の分布と、表示の切り替わり前後 (window フレーム) の乱れを返す"""
+    times = [f for _, f, _ in frames[1:]]
+    transition_indexes = [i for i, (_, _, changed) in enumerate(frames) if changed]
+    near_transition = set()
+    for i in transition_indexes:
+        near_transition.update(range(i - window, i + window + 1))
+    spikes = [{"at": at.strftime("%H:%M:%S"), "frame_ms": f * 1000, "near_transition": i in near_transition}
+              for i, (at, f, _) in enumerate(frames) if i > 0 and f > spike_seconds]
+    return {
+        "frame_ms": percentiles([f * 1000 for f in times]),
+        "transition_frame_ms": percentiles([frames[i][1] * 1000 for i in transition_indexes if i > 0]),
+        "transitions": len(transition_indexes),
+        "spikes": len(spikes),
+        "spikes_near_transition": sum(1 for s in spikes if s["near_transition"]),
+        "worst_spikes": sorted(spikes, key=lambda s: -s["frame_ms"])[:20],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模擬時計で1日分の運行を早回しする負荷試験")
+    parser.add_argument("--timetable", default=os.path.join(SCRIPT_DIR, "timetable.csv"))
+    parser.add_argument("--speed", type=float, default=100.0, help="時計の速さ (倍)")
+    parser.add_argument("--start", default=None, help="開始時刻 (H:MM、既定は最初の便の15分前)")
+    parser.add_argument("--end", default=None, help="終了時刻 (H:MM、既定は最終便の5分後)")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="エンジンの合成時間 (本番換算のミリ秒)")
+    parser.add_argument("--jitter-ms", type=float, default=400.0, help="合成時間のばらつき (±ミリ秒)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="エンジンが 503 を返す割合 (0〜1)")
+    parser.add_argument("--seed", type=int, default=1, help="遅延と失敗の乱数の種")
+    parser.add_argument("--announce-timing", choices=("interval", "cues"), default="cues")
+    parser.add_argument("--announce-mode", choices=("sentence", "phrases", "streaming"), default="sentence")
+    parser.add_argument("--cue-offsets", type=parse_offsets, default=DEFAULT_CUE_OFFSETS)
+    parser.add_argument("--spike-ms", type=float, default=FRAME_SPIKE_SECONDS * 1000, help="乱れとみなすフレーム時間 (実ミリ秒)")
+    parser.add_argument("--output", default=os.path.join(SCRIPT_DIR, "load_test.json"),
+                        help="結果のJSONの出力先 (- は標準出力)")
+    args = parser.parse_args(argv)
+
+    schedule = ScheduleIndex(read_timetable(args.timetable))
+    if not schedule.trips:
+        print("エラー: 時刻表に発車時刻の決まった便がありません。")
+        sys.exit(1)
+    today = datetime.now().date()
+    midnight = datetime.combine(today, datetime.min.time())
+    first = midnight + timedelta(seconds=schedule.trips[0].etd_seconds)
+    last = midnight + timedelta(seconds=schedule.trips[-1].etd_seconds)
+    start = parse_time_of_day(args.start, today) if args.start else first - timedelta(minutes=15)
+    end = parse_time_of_day(args.end, today) if args.end else last + timedelta(minutes=5)
+    departures = [trip for trip in schedule.trips if start <= midnight + timedelta(seconds=trip.etd_seconds) <= end]
+
+    # 本番の値を速さに合わせて縮めたスタブエンジン
+    work_dir = tempfile.mkdtemp(prefix="load_test_")
+    stub = make_server(port=0, latency=args.latency_ms / 1000 / args.speed, jitter=args.jitter_ms / 1000 / args.speed,
+                       failure_rate=args.failure_rate, seconds_per_char=SECONDS_PER_CHAR / args.speed, seed=args.seed)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    os.environ[ENDPOINTS_ENV] = f"http://127.0.0.1:{stub.server_address[1]}"
+    sounds_dir = os.path.join(work_dir, "sounds")
+    write_scaled_sounds(os.path.join(SCRIPT_DIR, "sounds"), sounds_dir, args.speed)
+
+    import GUI_test as app
+    clock = SimulatedClock(start, args.speed)
+    service_clock.set_clock(clock)
+    recorder = LoadTestRecorder(clock)
+    app.frame_listener = recorder.on_frame
+    app.announce_listener = recorder.on_announce
+    client = get_default_client()
+
+    def supervise():
+        # 合成待ちを定期的に記録し、終了時刻になったら描画ループを止める
+        while clock.now() < end:
+            try:
+                recorder.sample_queue(app, client)
+            except Exception as e:
+                print(f"合成待ちの確認中にエラーが発生しました: {e}")
+            time.sleep(0.05)
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+    print(f"負荷試験: {start:%H:%M}〜{end:%H:%M} ({len(departures)}便) を {args.speed:g}倍速で再生します "
+          f"(実時間 約{(end - start).total_seconds() / args.speed:.0f}秒)", file=sys.stderr)
+    threading.Thread(target=supervise, daemon=True).start()
+    real_started = time.monotonic()
+    try:
+        app.main(["--timetable", args.timetable, "--sounds", sounds_dir,
+                  "--daybank", os.path.join(work_dir, "daybank.bin"), "--live-port", "0",
+                  # 本番のキャッシュ (本来の長さの音声・話者一覧・フォントの探索結果・背景レイヤー) は使わず、書き換えもしない
+                  "--cache-dir", os.path.join(work_dir, "cache"),
+                  "--announce-timing", args.announce_timing, "--announce-mode", args.announce_mode,
+                  "--cue-offsets", ",".join(map(str, args.cue_offsets))])
+    except SystemExit:
+        pass
+    real_seconds = time.monotonic() - real_started
+    stub.shutdown()
+
+    departures_detail, lateness, missed = departure_report(
+        departures, recorder.announcements, args.announce_timing, args.cue_offsets, start)
+    depths = [depth for _, depth, _ in recorder.queue_samples]
+    in_flight = [n for _, _, n in recorder.queue_samples]
+    peak = max(recorder.queue_samples, key=lambda s: s[1], default=None)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "timetable": os.path.abspath(args.timetable),
+        "window": [start.strftime("%H:%M"), end.strftime("%H:%M")],
+        "speed": args.speed,
+        "real_seconds": real_seconds,
+        "engine": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "failure_rate": args.failure_rate,
+                   "seed": args.seed, **stub.stats},
+        "announce_timing": args.announce_timing,
+        "announce_mode": args.announce_mode,
+        "departures": len(departures),
+        "announcement_lateness_seconds": lateness,
+        "missed_announcements": missed,
+        "synthesis_queue": {
+            "depth": percentiles(depths),
+            "in_flight": percentiles(in_flight),
+            "peak_at": peak[0].strftime("%H:%M:%S") if peak else None,
+        },
+        "frames": frame_report(recorder.frames, args.spike_ms / 1000),
+        "per_departure": departures_detail,
+    }
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"結果を書き出しました: {args.output}", file=sys.stderr)
+    s = lateness or {}
+    print(f"アナウンスの遅れ: p50 {s.get('p50', 0):.1f}秒 p95 {s.get('p95', 0):.1f}秒 最大 {s.get('max', 0):.1f}秒 / "
+          f"未実施 {missed}件 / 合成待ち 最大 {max(depths, default=0)} / "
+          f"フレームの乱れ {report['frames']['spikes']}回 (切り替わり付近 {report['frames']['spikes_near_transition']}回)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
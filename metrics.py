@@ -0,0 +1,323 @@
+# metrics.py
+# 描画・音声合成・アナウンスの計測値 (カウンターと遅延のヒストグラム) の集計と公開
+#
+# 既定では無効で、計測する側は「if metrics.enabled:」の確認だけで済む (無効時はほぼ負荷なし)。
+# enable() で有効にすると、start_server() の localhost の /metrics (Prometheus のテキスト形式) と
+# /metrics.json で公開し、log_path を指定すれば一定間隔の集計と個別のイベントを JSON Lines で
+# ローテーションするログに書き出す。
+# 子プロセスでは enable_forwarding() で計測値を溜めておき、drain() で取り出して親プロセスに送り、
+# 親プロセスの merge() で集計に加える (announcement_worker.py)。
+#
+# 主な計測値 (秒):
+#   frame_seconds / render_seconds / dropped_frames_total   描画ループ
+#   voicevox_request_seconds{path="/audio_query" | "/synthesis"}   エンジンへのリクエスト
+#   audio_decode_seconds                                    WAVのmixer形式への変換
+#   announcement_lateness_seconds                           予定時刻からのアナウンス開始の遅れ
+#   announcement_first_audio_seconds{mode=...}              アナウンスが必要になってから音声が出るまで
+#   lock_wait_seconds{lock="announcement_lock"}             ロックの取得待ち
+
+import json
+import time
+import logging
+import threading
+import urllib.parse
+from bisect import bisect_left
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_METRICS_PORT = 9464
+# ヒストグラムのバケットの上限 (秒)。1フレーム (33ms) 前後とエンジンの応答 (数秒) の両方を見分けられるようにする
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+enabled = False # 計測する側はこれを確認してから呼ぶ
+_registry = None
+_logger = None
+
+
+class Histogram:
+    """固定バケットのヒストグラム (Prometheus と同じく上限以下の数を数える)"""
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # 最後は上限なし
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """q 分位点の推定値 (その値を含むバケットの上限)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "p50": self.quantile(0.50), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+
+def _label_text(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """名前とラベルごとのカウンター・ゲージ・ヒストグラム"""
+
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def increment(self, name, value=1, labels=None):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, labels=None):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, labels=None):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        """全ての値を JSON にできる辞書で返す"""
+        def name_of(key):
+            name, labels = key
+            return name + _label_text(labels)
+        with self._lock:
+            return {
+                "uptime_seconds": time.time() - self.started_at,
+                "counters": {name_of(k): v for k, v in self._counters.items()},
+                "gauges": {name_of(k): v for k, v in self._gauges.items()},
+                "histograms": {name_of(k): h.summary() for k, h in self._histograms.items()},
+            }
+
+    def prometheus_text(self):
+        """Prometheus のテキスト形式で返す"""
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f"{name}{_label_text(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                lines.append(f"{name}{_label_text(labels)} {value}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, n in zip(h.bounds, h.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_label_text(labels, [('le', '+Inf')])} {h.count}")
+                lines.append(f"{name}_sum{_label_text(labels)} {h.sum}")
+                lines.append(f"{name}_count{_label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+class ForwardingBuffer:
+    """子プロセスの計測値を親プロセスに送るまで溜めておく (MetricsRegistry の代わりに使う)"""
+
+    def __init__(self):
+        self._records = []
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, labels=None):
+        with self._lock:
+            self._records.append(("increment", name, value, labels))
+
+    def set_gauge(self, name, value, labels=None):
+        with self._lock:
+            self._records.append(("set_gauge", name, value, labels))
+
+    def observe(self, name, value, labels=None):
+        with self._lock:
+            self._records.append(("observe", name, value, labels))
+
+    def event(self, kind, fields):
+        with self._lock:
+            self._records.append(("event", kind, fields, None))
+
+    def drain(self):
+        """溜めた計測値を返して空にする (merge() に渡せる形)"""
+        with self._lock:
+            records = self._records
+            self._records = []
+        return records
+
+
+def enable(log_path=None, max_bytes=5 * 1024 * 1024, backup_count=5, snapshot_interval=60):
+    """計測を有効にする。log_path を指定すると JSON Lines のログ (サイズでローテーション) にも書き出す"""
+    global enabled, _registry, _logger
+    if _registry is None:
+        _registry = MetricsRegistry()
+    if log_path and _logger is None:
+        logger = logging.getLogger("departure_board.metrics")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False # 通常の print の出力には混ぜない
+        handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _logger = logger
+
+        def write_snapshots():
+            while True:
+                time.sleep(snapshot_interval)
+                event("snapshot", metrics=_registry.snapshot())
+
+        threading.Thread(target=write_snapshots, name="metrics-log", daemon=True).start()
+    enabled = True
+    return _registry
+
+
+def enable_forwarding():
+    """子プロセスで計測を有効にする (値は drain() で取り出して親プロセスの merge() に渡す)"""
+    global enabled, _registry
+    _registry = ForwardingBuffer()
+    enabled = True
+    return _registry
+
+
+def drain():
+    """enable_forwarding() で溜めた計測値を取り出す"""
+    if not enabled or not isinstance(_registry, ForwardingBuffer):
+        return []
+    return _registry.drain()
+
+
+def merge(records):
+    """子プロセスから届いた計測値を集計に加える"""
+    if not enabled:
+        return
+    for kind, name, value, labels in records:
+        if kind == "event":
+            event(name, **value)
+        else:
+            getattr(_registry, kind)(name, value, labels)
+
+
+def get_registry():
+    return _registry
+
+
+def increment(name, value=1, **labels):
+    if enabled:
+        _registry.increment(name, value, labels)
+
+
+def set_gauge(name, value, **labels):
+    if enabled:
+        _registry.set_gauge(name, value, labels)
+
+
+def observe(name, seconds, **labels):
+    if enabled:
+        _registry.observe(name, seconds, labels)
+
+
+def event(kind, **fields):
+    """個別の出来事をログに1行書く (ログを設定していなければ何もしない)"""
+    if enabled and isinstance(_registry, ForwardingBuffer):
+        _registry.event(kind, fields)
+        return
+    if not enabled or _logger is None:
+        return
+    record = {"time": time.time(), "event": kind}
+    record.update(fields)
+    try:
+        _logger.info(json.dumps(record, ensure_ascii=False, default=str))
+    except (TypeError, ValueError) as e:
+        print(f"計測ログを書き出せません: {e}")
+
+
+class InstrumentedLock:
+    """取得待ちの時間を lock_wait_seconds に記録するロック (計測を有効にしたときだけ差し替えて使う)"""
+
+    def __init__(self, name, lock=None):
+        self.name = name
+        self._lock = lock if lock is not None else threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False): # 待たずに取れた場合は時間を測らない
+            observe("lock_wait_seconds", 0.0, lock=self.name)
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        waited = time.perf_counter() - start
+        observe("lock_wait_seconds", waited, lock=self.name)
+        increment("lock_contended_total", lock=self.name)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics (Prometheus のテキスト形式) と /metrics.json を返す"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        registry = _registry
+        status = 200
+        if path == "/metrics" and registry is not None:
+            body, content_type = registry.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4"
+        elif path == "/metrics.json" and registry is not None:
+            body, content_type = json.dumps(registry.snapshot(), ensure_ascii=False).encode("utf-8"), "application/json"
+        else:
+            status, body, content_type = 404, b'{"detail": "Not Found"}', "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # アクセスログは出さない
+
+
+def start_server(host="127.0.0.1", port=DEFAULT_METRICS_PORT):
+    """計測値の公開を始める。起動できなければNone"""
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print(f"警告: 計測値の公開を開始できません ({host}:{port}): {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"計測値を公開しています: http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,97 @@
+# phrase_assembler.py
+# 定型句と差し替え部分 (時刻・行き先・乗り場・駅名) を個別に合成し、つなぎ合わせてアナウンスを作る
+
+import io
+import wave
+import threading
+
+PAUSE_SHORT = 0.15 # 読点 (、) に相当する間 (秒)
+PAUSE_LONG = 0.45  # 句点 (。) に相当する間 (秒)
+
+
+class SegmentedAnnouncement(tuple):
+    """(フレーズ, 直後の間の秒数) を並べたアナウンス
+
+    タプルなのでそのまま辞書のキーやキャッシュのキーに使える。
+    str() でつなげた文章を返す (ログ表示用)。
+    """
+
+    def __str__(self):
+        return "、".join(text for text, _ in self)
+
+
+class PhraseAssembler:
+    """フレーズごとの合成結果をPCMで保持し、間を挟んで1つのWAVにつなぐ
+
+    synthesize(text) はWAVデータ (bytes) を返す関数。
+    同じフレーズは一度しか合成しないので、語彙がそろえばエンジンを使わずに組み立てられる。
+    """
+
+    def __init__(self, synthesize):
+        self.synthesize = synthesize
+        self._pcm = {} # フレーズ -> ((チャンネル数, サンプル幅, サンプリングレート), PCMデータ)
+        self._lock = threading.Lock()
+        self.synth_calls = 0
+
+    def segment_pcm(self, text):
+        """フレーズのPCMを返す (未合成なら合成する)。失敗したらNone"""
+        with self._lock:
+            cached = self._pcm.get(text)
+        if cached is not None:
+            return cached
+        data = self.synthesize(text)
+        self.synth_calls += 1
+        if not data:
+            return None
+        try:
+            with wave.open(io.BytesIO(data), "rb") as wf:
+                params = (wf.getnchannels(), wf.getsampwidth(), wf.getframerate())
+                frames = wf.readframes(wf.getnframes())
+        except (wave.Error, EOFError) as e:
+            print(f"フレーズ音声の読み込みに失敗しました: {text} ({e})")
+            return None
+        with self._lock:
+            self._pcm[text] = (params, frames)
+        return params, frames
+
+    def prepare(self, phrases):
+        """語彙をまとめて合成しておく。合成済みのフレーズ数を返す"""
+        for text in dict.fromkeys(phrases): # 重複を除いて順番通りに
+            self.segment_pcm(text)
+        return self.vocabulary_size()
+
+    def vocabulary_size(self):
+        with self._lock:
+            return len(self._pcm)
+
+    def assemble(self, announcement):
+        """アナウンスのWAVデータを組み立てる (文字列はそのまま1フレーズとして合成する)"""
+        if isinstance(announcement, str):
+            return self.synthesize(announcement)
+
+        params = None
+        chunks = []
+        for text, pause in announcement:
+            segment = self.segment_pcm(text)
+            if segment is None:
+                return None
+            segment_params, frames = segment
+            if params is None:
+                params = segment_params
+            elif segment_params != params:
+                print(f"フレーズの音声形式が一致しないため組み立てできません: {text}")
+                return None
+            chunks.append(frames)
+            if pause:
+                channels, sample_width, rate = params
+                chunks.append(b"\x00" * (int(rate * pause) * channels * sample_width))
+        if params is None:
+            return None
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wf:
+            wf.setnchannels(params[0])
+            wf.setsampwidth(params[1])
+            wf.setframerate(params[2])
+            wf.writeframes(b"".join(chunks))
+        return buffer.getvalue()
@@ -0,0 +1,106 @@
+# publish_override.py
+# 運行情報の変更を GUI_test.py の受付 (live_updates.py) に送るテスト用の送信ツール
+#
+# 使い方:
+#   python publish_override.py --order 3 --etd 8:15 --delay 5
+#   python publish_override.py --order 3 --etd 8:15 --platform 2
+#   python publish_override.py --order 3 --etd 8:15 --cancel
+#   python publish_override.py --order 3 --etd 8:15 --clear     (その便の変更を取り消す)
+#   python publish_override.py --clear-all
+#   python publish_override.py --list
+#   python publish_override.py --demo [--interval 10]           (次の便に遅延→乗り場変更→取り消しを順に送る)
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+
+import requests # type: ignore
+
+from live_updates import DEFAULT_LIVE_PORT
+from schedule_index import ScheduleIndex
+from timetable_store import read_timetable, TimetableError
+
+DEFAULT_URL = f"http://127.0.0.1:{DEFAULT_LIVE_PORT}/overrides"
+
+
+def publish(url, payload):
+    """変更を1件送り、受付からの応答を表示する。成功したらTrue"""
+    started = time.perf_counter()
+    response = requests.post(url, json=payload, timeout=5)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{payload} -> {response.status_code} {response.text} ({elapsed:.1f}ms)")
+    return response.ok
+
+
+def run_demo(url, timetable_path, interval):
+    """時刻表の次の便に、遅延・乗り場変更・取り消しを interval 秒ごとに送る"""
+    trips = ScheduleIndex(read_timetable(timetable_path)).upcoming_trips(datetime.now(), count=1)
+    if not trips:
+        print("これから発車する便がありません。")
+        return False
+    order, etd = trips[0].key
+    steps = [
+        {"order": order, "ETD": etd, "delay": 5},
+        {"order": order, "ETD": etd, "delay": 5, "platform": "2"},
+        {"order": order, "ETD": etd, "clear": True},
+    ]
+    for i, payload in enumerate(steps):
+        if i:
+            time.sleep(interval)
+        if not publish(url, payload):
+            return False
+    return True
+
+
+def main(argv=None):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="運行情報 (遅延・乗り場変更・運休) をバス案内表示に送る")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--order", help="便の order (時刻表の値)")
+    parser.add_argument("--etd", help="便の ETD (時刻表の値、例: 8:15)")
+    parser.add_argument("--delay", type=int, default=0, help="遅れ (分)")
+    parser.add_argument("--platform", help="変更後の乗り場")
+    parser.add_argument("--cancel", action="store_true", help="運休にする")
+    parser.add_argument("--clear", action="store_true", help="その便の変更を取り消す")
+    parser.add_argument("--clear-all", action="store_true", help="全ての変更を取り消す")
+    parser.add_argument("--list", action="store_true", help="現在の変更を表示する")
+    parser.add_argument("--demo", action="store_true", help="次の便に変更を順に送る")
+    parser.add_argument("--interval", type=float, default=10.0, help="--demo で変更を送る間隔 (秒)")
+    parser.add_argument("--timetable", default=os.path.join(script_dir, "timetable.csv"), help="--demo で使う時刻表")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.list:
+            response = requests.get(args.url, timeout=5)
+            print(response.text)
+            ok = response.ok
+        elif args.clear_all:
+            response = requests.delete(args.url, timeout=5)
+            print(response.text)
+            ok = response.ok
+        elif args.demo:
+            ok = run_demo(args.url, args.timetable, args.interval)
+        else:
+            if not args.order or not args.etd:
+                parser.error("--order と --etd で便を指定してください")
+            payload = {"order": args.order, "ETD": args.etd}
+            if args.clear:
+                payload["clear"] = True
+            else:
+                payload.update(delay=args.delay, cancelled=args.cancel)
+                if args.platform:
+                    payload["platform"] = args.platform
+            ok = publish(args.url, payload)
+    except requests.exceptions.RequestException as e:
+        print(f"エラー: 受付 ({args.url}) に接続できません: {e}")
+        ok = False
+    except TimetableError as e:
+        print(f"エラー: {e}")
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
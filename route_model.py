@@ -0,0 +1,201 @@
+# route_model.py
+# 路線の定義 (停車地の順番・表示名・読み上げ用の読み) と、便ごとの停車パターンの表
+#
+# route.json の例:
+# {
+#     "origin": "仁愛大学",
+#     "stops": [
+#         {"column": "echizen_takefu", "name": "越前たけふ駅", "minutes": 8},
+#         {"column": "jindai", "name": "仁愛大学", "pass_only": true, "minutes": 35}
+#     ],
+#     "destinations": {"0": "仁愛大学"},
+#     "default_destination": "武生駅",
+#     "readings": {"国高": "くにたか"}
+# }
+# stops は時刻表CSVの列名と停車地の対応 (運行順)。列の値が "1" なら停車、それ以外は通過として案内する。
+# pass_only の停車地は、値が "0" のときだけ通過として案内する (停車駅としては案内しない)。
+# minutes は起点を出てからその停車地に着くまでの標準的な時間 (分)。
+# 時刻表には途中の停車地の時刻がないため、接続列車の計算 (connections.py) で駅への到着時刻に使う。
+# destinations は destination 列の値と終点の対応 (当てはまらなければ default_destination)。
+# readings は表示名から読み上げ用の表記への置き換え (アナウンス文だけに使う)。
+
+import os
+import json
+import threading
+
+DEFAULT_ROUTE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "route.json")
+PATTERN_KEY = "stop_pattern" # compile_timetable() で行に追加する停車パターンのキー
+
+# route.json がない場合に使う定義 (従来の仁愛大学シャトルバス)
+DEFAULT_ROUTE = {
+    "origin": "仁愛大学",
+    "stops": [
+        {"column": "echizen_takefu", "name": "越前たけふ駅", "minutes": 8},
+        {"column": "hoyama(1)", "name": "帆山町", "minutes": 12},
+        {"column": "kunitaka(1)", "name": "国高", "minutes": 15},
+        {"column": "takefu", "name": "武生駅", "minutes": 18},
+        {"column": "kunitaka(2)", "name": "国高", "minutes": 23},
+        {"column": "hoyama(2)", "name": "帆山町", "minutes": 27},
+        {"column": "jindai", "name": "仁愛大学", "pass_only": True, "minutes": 35},
+    ],
+    "destinations": {"0": "仁愛大学"},
+    "default_destination": "武生駅",
+    "readings": {},
+}
+
+
+class RouteError(Exception):
+    """路線の定義ファイルを読み込めない、または内容が不正"""
+
+
+class StopPattern:
+    """1つの停車パターン (停車地ビットマスクと終点の組) について事前に作った案内文"""
+    __slots__ = ("stops", "ways", "destination", "stop_info", "spoken_stops", "spoken_ways",
+                 "spoken_destination", "spoken_stop_info")
+
+    def __init__(self, stops, ways, destination, readings):
+        self.stops = stops             # 停車する停車地の表示名 (運行順)
+        self.ways = ways               # 通過する停車地の表示名 (重複なし)
+        self.destination = destination # 終点の表示名
+        self.stop_info = self._stop_info(stops, ways, destination)
+        # 読み上げ用 (readings で置き換えたもの)
+        self.spoken_stops = tuple(readings.get(name, name) for name in stops)
+        self.spoken_ways = tuple(readings.get(name, name) for name in ways)
+        self.spoken_destination = readings.get(destination, destination)
+        self.spoken_stop_info = self._stop_info(self.spoken_stops, self.spoken_ways, self.spoken_destination)
+
+    @staticmethod
+    def _stop_info(stops, ways, destination):
+        destination_text = "終点：" + destination
+        if not stops:
+            return destination_text + "です。" # 直行便の場合など
+        stop_info = "停車駅は、" + "、".join(stops) + "、" + destination_text + "です。"
+        if ways:
+            stop_info += "　" + "、".join(ways) + "には停車しません。ご注意ください。"
+        return stop_info
+
+
+class RouteModel:
+    """路線の定義を持ち、便の停車パターンをビットマスクにして案内文を引く
+
+    案内文は停車パターンごとに一度だけ作り、以降は表から返す (描画ループでは文字列を作らない)。
+    """
+
+    def __init__(self, definition):
+        try:
+            self.origin = definition["origin"]
+            self.stops = [(stop["column"], stop["name"], bool(stop.get("pass_only")))
+                          for stop in definition["stops"]]
+            # 表示名 -> 起点から着くまでの時間 (分)。同じ名前の停車地が複数あれば最初のもの
+            self.minutes = {}
+            for stop in definition["stops"]:
+                if stop.get("minutes") is not None:
+                    self.minutes.setdefault(stop["name"], float(stop["minutes"]))
+        except (KeyError, TypeError) as e:
+            raise RouteError(f"路線の定義に必要な項目がありません: {e}") from e
+        except ValueError as e:
+            raise RouteError(f"路線の定義の minutes が数値ではありません: {e}") from e
+        self.destinations = dict(definition.get("destinations", {}))
+        self.default_destination = definition.get("default_destination", "")
+        self.readings = dict(definition.get("readings", {}))
+        self._patterns = {} # (ビットマスク, 終点) -> StopPattern
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """路線の定義ファイルを読み込む"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                definition = json.load(f)
+        except OSError as e:
+            raise RouteError(f"路線の定義 '{path}' を読み込めません: {e}") from e
+        except ValueError as e:
+            raise RouteError(f"路線の定義 '{path}' の形式が正しくありません: {e}") from e
+        return cls(definition)
+
+    def destination_name(self, row):
+        """終点の表示名を返す"""
+        return self.destinations.get(row.get('destination'), self.default_destination)
+
+    def minutes_to(self, name):
+        """起点を出てから表示名 name の停車地に着くまでの時間 (分)。定義になければNone"""
+        return self.minutes.get(name)
+
+    def spoken(self, name):
+        """表示名の読み上げ用の表記を返す"""
+        return self.readings.get(name, name)
+
+    def pattern_key(self, row):
+        """行の停車フラグをビットマスクにし、(ビットマスク, 終点) を返す
+
+        ビットは停車地の順番に対応し、通常の停車地は停車するとき、
+        pass_only の停車地は通過として案内するときに立つ。
+        """
+        mask = 0
+        for bit, (column, _, pass_only) in enumerate(self.stops):
+            if row.get(column) == ('0' if pass_only else '1'):
+                mask |= 1 << bit
+        return mask, self.destination_name(row)
+
+    def _build_pattern(self, key):
+        mask, destination = key
+        stops = []
+        ways = []
+        for bit, (_, name, pass_only) in enumerate(self.stops):
+            listed = mask & (1 << bit)
+            if pass_only:
+                if listed:
+                    ways.append(name)
+            elif listed:
+                stops.append(name)
+            else:
+                ways.append(name)
+        # 停車する駅と同じ名前の通過駅 (往復で通る駅) は除き、重複を除く
+        ways = tuple(dict.fromkeys(name for name in ways if name not in stops))
+        return StopPattern(tuple(stops), ways, destination, self.readings)
+
+    def pattern_for_key(self, key):
+        pattern = self._patterns.get(key)
+        if pattern is None:
+            pattern = self._build_pattern(key)
+            with self._lock:
+                self._patterns[key] = pattern
+        return pattern
+
+    def pattern(self, row):
+        """行の停車パターンを返す (compile_timetable() 済みの行は表を引くだけ)"""
+        key = row.get(PATTERN_KEY)
+        if key is None:
+            key = self.pattern_key(row)
+        return self.pattern_for_key(key)
+
+    def compile_timetable(self, timetable):
+        """時刻表の各行に停車パターンのキーを付け、案内文を事前に作る。パターン数を返す"""
+        keys = set()
+        for row in timetable:
+            key = self.pattern_key(row)
+            row[PATTERN_KEY] = key
+            keys.add(key)
+        for key in keys:
+            self.pattern_for_key(key)
+        return len(keys)
+
+    def pattern_count(self):
+        with self._lock:
+            return len(self._patterns)
+
+
+_default_route = None
+_default_route_lock = threading.Lock()
+
+
+def get_default_route():
+    """route.json の路線定義を返す (ファイルがなければ従来の定義を使う)"""
+    global _default_route
+    with _default_route_lock:
+        if _default_route is None:
+            if os.path.exists(DEFAULT_ROUTE_PATH):
+                _default_route = RouteModel.load(DEFAULT_ROUTE_PATH)
+            else:
+                _default_route = RouteModel(DEFAULT_ROUTE)
+        return _default_route
@@ -0,0 +1,92 @@
+# schedule_index.py
+# 発車時刻で二分探索できる時刻表インデックス
+
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+
+import service_clock
+
+PLACEHOLDER_ETD = "0:0" # timetable.csv で発車時刻未定の便に使われている値
+
+
+def seconds_of_day(dt):
+    """datetime の当日0時からの経過秒 (小数を含む) を返す"""
+    return dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1_000_000
+
+
+class Trip:
+    """時刻表の1便 (元の行の辞書をそのまま保持する)"""
+    __slots__ = ("etd_seconds", "key", "row")
+
+    def __init__(self, etd_seconds, key, row):
+        self.etd_seconds = etd_seconds # 発車時刻 (当日0時からの秒)
+        self.key = key                 # 便を識別するキー (order, ETD)
+        self.row = row
+
+    def __repr__(self):
+        return f"Trip({self.row.get('ETD')!r}, key={self.key!r})"
+
+
+def trip_key(row):
+    """行から便を識別するキーを作る"""
+    return (str(row.get('order', '')).strip(), str(row.get('ETD', '')).strip())
+
+
+class ScheduleIndex:
+    """ETD順に並べた変更不可の時刻表インデックス
+
+    発車時刻は array に、便は tuple に保持し、現在時刻以降の便を bisect で探す。
+    便は「発車時刻 >= 現在時刻」の間だけ表示対象になる (load_timetable/update_display_rows と同じ)。
+    ETD が "0:0" の便は発車時刻未定として索引に含めない。
+    """
+
+    def __init__(self, timetable):
+        trips = []
+        for row in timetable:
+            etd_time = row.get('ETD_time')
+            if etd_time is None or str(row.get('ETD', '')).strip() == PLACEHOLDER_ETD:
+                continue
+            seconds = etd_time.hour * 3600 + etd_time.minute * 60 + etd_time.second
+            trips.append(Trip(seconds, trip_key(row), row))
+        trips.sort(key=lambda trip: trip.etd_seconds) # 安定ソートなので同時刻はCSVの順を保つ
+        self._trips = tuple(trips)
+        self._etds = array('l', (trip.etd_seconds for trip in trips))
+
+    def __len__(self):
+        return len(self._trips)
+
+    @property
+    def trips(self):
+        return self._trips
+
+    def _first_upcoming(self, now):
+        return bisect_left(self._etds, seconds_of_day(now))
+
+    def upcoming_trips(self, now=None, count=None):
+        """now 以降に発車する便を最大 count 件返す"""
+        if now is None:
+            now = service_clock.now()
+        start = self._first_upcoming(now)
+        end = len(self._trips) if count is None else start + count
+        return self._trips[start:end]
+
+    def upcoming(self, now=None, count=None):
+        """now 以降に発車する便の行 (辞書) を最大 count 件返す"""
+        return [trip.row for trip in self.upcoming_trips(now, count)]
+
+    def next_transition(self, now=None):
+        """表示対象が次に変わる時刻 (datetime) を返す。便がなければNone
+
+        先頭の便の発車時刻を過ぎた瞬間に表示が切り替わる。
+        当日の便がもうなければ、翌日の便が表示対象に戻る翌0時を返す。
+        """
+        if not self._trips:
+            return None
+        if now is None:
+            now = service_clock.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        start = self._first_upcoming(now)
+        if start < len(self._trips):
+            return midnight + timedelta(seconds=self._etds[start])
+        return midnight + timedelta(days=1)
@@ -0,0 +1,96 @@
+# service_clock.py
+# 表示・アナウンスが使う時計 (通常は実時間、負荷試験では早回しの模擬時計に差し替える)
+#
+# 時刻表に関わる処理は datetime.now() / time.sleep() / Event.wait() を直接使わず、
+# このモジュールの now() / sleep() / wait() を使う。set_clock(SimulatedClock(...)) で
+# 1日分の運行を100倍速などで再生できる。
+# フレーム時間・合成時間などの計測や、音声の再生時間は実時間のまま扱う。
+
+import time
+import threading
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """実時間の時計"""
+    speed = 1.0
+
+    def now(self):
+        return datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def real_seconds(self, seconds):
+        """時計の上での秒数を、実際に待つ秒数に換算する"""
+        return seconds
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout=None):
+        return event.wait(timeout)
+
+
+class SimulatedClock(SystemClock):
+    """start から speed 倍の速さで進む模擬時計 (負荷試験用)"""
+
+    def __init__(self, start, speed=100.0):
+        if speed <= 0:
+            raise ValueError(f"時計の速さが不正です: {speed}")
+        self.start = start
+        self.speed = speed
+        self._origin = time.monotonic()
+
+    def elapsed(self):
+        """開始からの時計の上での経過秒数"""
+        return (time.monotonic() - self._origin) * self.speed
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed())
+
+    def monotonic(self):
+        return self.elapsed()
+
+    def real_seconds(self, seconds):
+        return seconds / self.speed
+
+    def sleep(self, seconds):
+        time.sleep(max(seconds, 0) / self.speed)
+
+    def wait(self, event, timeout=None):
+        return event.wait(None if timeout is None else max(timeout, 0) / self.speed)
+
+
+_clock = SystemClock()
+_clock_lock = threading.Lock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    """使う時計を差し替える (起動前に呼ぶこと)"""
+    global _clock
+    with _clock_lock:
+        _clock = clock
+
+
+def now():
+    """現在時刻 (datetime)"""
+    return _clock.now()
+
+
+def monotonic():
+    """経過時間の計測用の時刻 (秒)"""
+    return _clock.monotonic()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+
+def wait(event, timeout=None):
+    """threading.Event / Condition を時計の上での timeout 秒まで待つ"""
+    return _clock.wait(event, timeout)
@@ -0,0 +1,152 @@
+# sound_bank.py
+# 音声をmixerと同じ形式 (サンプリングレート・チャンネル数・16bit) に一度だけ変換して保持する
+#
+# NumPy があればリサンプリング・チャンネル変換・音量の正規化をまとめて行う。
+# ない場合は pygame の変換に任せる (音量の正規化は行わない)。
+
+import io
+import time
+import wave
+import threading
+from collections import OrderedDict
+
+import pygame
+
+import metrics
+
+try:
+    import numpy as np
+except ImportError: # NumPy がない環境
+    np = None
+
+DEFAULT_TARGET_DBFS = -20.0 # 正規化後の音量 (RMS, フルスケール基準)
+PEAK_LIMIT = 0.98 # 正規化で音が割れないようにピークをこの値までに抑える
+
+
+def decode_wav(wav_bytes):
+    """WAVデータを (サンプリングレート, float32の配列 (フレーム数, チャンネル数)) に変換する"""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+        channels = wf.getnchannels()
+        sample_width = wf.getsampwidth()
+        rate = wf.getframerate()
+        frames = wf.readframes(wf.getnframes())
+    if sample_width == 1: # 8bitは符号なし
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise wave.Error(f"未対応のサンプル幅です: {sample_width}バイト")
+    return rate, samples.reshape(-1, channels)
+
+
+def convert_samples(samples, rate, target_rate, target_channels, target_dbfs=DEFAULT_TARGET_DBFS):
+    """サンプル配列をリサンプリング・チャンネル変換・正規化し、16bitのPCMデータ (bytes) を返す"""
+    if rate != target_rate and len(samples):
+        # 線形補間でリサンプリング (全チャンネルをまとめて計算する)
+        length = max(1, int(round(len(samples) * target_rate / rate)))
+        positions = np.arange(length, dtype=np.float64) * (rate / target_rate)
+        left = np.minimum(positions.astype(np.int64), len(samples) - 1)
+        right = np.minimum(left + 1, len(samples) - 1)
+        fraction = (positions - left).astype(np.float32)[:, None]
+        samples = samples[left] * (1.0 - fraction) + samples[right] * fraction
+
+    channels = samples.shape[1]
+    if channels != target_channels:
+        if channels == 1:
+            samples = np.repeat(samples, target_channels, axis=1)
+        else: # 多チャンネルは一度モノラルにまとめてから広げる
+            samples = np.repeat(samples.mean(axis=1, keepdims=True), target_channels, axis=1)
+
+    if target_dbfs is not None and len(samples):
+        rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+        peak = float(np.max(np.abs(samples)))
+        if rms > 0:
+            gain = min(10 ** (target_dbfs / 20) / rms, PEAK_LIMIT / peak)
+            samples = samples * gain
+
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+class SoundBank:
+    """mixerの形式に変換済みの Sound を保持する
+
+    resident=True で追加した音声 (チャイムなど) は削除せず、
+    それ以外 (アナウンス音声) は最近使ったものを max_items 件まで保持する。
+    mixer_format ((レート, サイズ, チャンネル数)) と make_sound (PCMから再生用の
+    オブジェクトを作る関数) を指定すると、mixerのないプロセスでも変換だけを行える。
+    """
+
+    def __init__(self, max_items=16, target_dbfs=DEFAULT_TARGET_DBFS, mixer_format=None, make_sound=None):
+        rate, size, channels = mixer_format or pygame.mixer.get_init()
+        if abs(size) != 16:
+            print(f"警告: mixerが16bitではないため、変換はpygameに任せます (size={size})")
+        self.rate = rate
+        self.channels = channels
+        self.vectorized = np is not None and abs(size) == 16
+        if np is None:
+            print("警告: NumPy がないため、音声の変換はpygameに任せます (音量の正規化なし)")
+        self.max_items = max_items
+        self.target_dbfs = target_dbfs
+        self.make_sound = make_sound or (lambda pcm: pygame.mixer.Sound(buffer=pcm)) # 同じ形式なのでそのまま使われる
+        self._resident = {}
+        self._items = OrderedDict()
+        self._sizes = {} # キー -> 変換後のバイト数
+        self._lock = threading.Lock()
+        self.conversions = 0
+        self.conversion_seconds = 0.0
+
+    def _convert(self, wav_bytes):
+        """(Sound, 変換後のバイト数) を返す"""
+        if not self.vectorized:
+            sound = pygame.mixer.Sound(io.BytesIO(wav_bytes))
+            return sound, len(sound.get_raw())
+        rate, samples = decode_wav(bytes(wav_bytes))
+        pcm = convert_samples(samples, rate, self.rate, self.channels, self.target_dbfs)
+        return self.make_sound(pcm), len(pcm)
+
+    def get(self, key):
+        """変換済みの Sound を返す。なければNone"""
+        with self._lock:
+            sound = self._resident.get(key)
+            if sound is None:
+                sound = self._items.get(key)
+                if sound is not None:
+                    self._items.move_to_end(key)
+            return sound
+
+    def add(self, key, wav_bytes, resident=False):
+        """WAVデータを変換して登録し、Sound を返す (登録済みなら変換しない)"""
+        sound = self.get(key)
+        if sound is not None:
+            return sound
+        start = time.monotonic()
+        sound, size = self._convert(wav_bytes)
+        elapsed = time.monotonic() - start
+        metrics.observe("audio_decode_seconds", elapsed)
+        with self._lock:
+            self.conversions += 1
+            self.conversion_seconds += elapsed
+            self._sizes[key] = size
+            if resident:
+                self._resident[key] = sound
+            else:
+                self._items[key] = sound
+                while len(self._items) > self.max_items:
+                    evicted, _ = self._items.popitem(last=False)
+                    self._sizes.pop(evicted, None)
+        return sound
+
+    def memory_bytes(self):
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def report(self):
+        """保持している音声の件数とメモリ使用量の文字列を返す"""
+        with self._lock:
+            resident_bytes = sum(self._sizes[key] for key in self._resident)
+            voice_bytes = sum(self._sizes[key] for key in self._items)
+            return (f"サウンドバンク: 常駐 {len(self._resident)}件 {resident_bytes / 1024 / 1024:.1f}MB / "
+                    f"アナウンス {len(self._items)}件 {voice_bytes / 1024 / 1024:.1f}MB "
+                    f"({self.rate}Hz {self.channels}ch, 変換 {self.conversions}回 {self.conversion_seconds:.2f}秒)")
@@ -0,0 +1,141 @@
+# speaker_catalog.py
+# VOICEVOXの話者一覧のキャッシュ、話者IDの確認、起動時のエンジンのウォームアップ
+
+import os
+import json
+import time
+
+import requests # type: ignore
+
+import service_clock
+from latency_stats import LatencyStats
+from voicevox_client import SYNTHESIS_TIMEOUT
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "speakers.json")
+DEFAULT_TTL = 24 * 60 * 60 # 話者一覧を取り直すまでの時間 (秒)
+
+
+class SpeakerCatalog:
+    """/speakers の結果をディスクにキャッシュし、スタイルIDの確認に使う"""
+
+    def __init__(self, client, path=DEFAULT_CATALOG_PATH, ttl=DEFAULT_TTL):
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self._speakers = None
+
+    def _load_cached(self):
+        """有効期限内のキャッシュがあれば返す"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - cached.get("fetched_at", 0) > self.ttl:
+            return None
+        return cached.get("speakers")
+
+    def _save(self, speakers):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": time.time(), "speakers": speakers}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"警告: 話者一覧のキャッシュを保存できません: {e}")
+
+    def speakers(self, refresh=False):
+        """話者一覧を返す (キャッシュが有効ならエンジンに問い合わせない)"""
+        if self._speakers is not None and not refresh:
+            return self._speakers
+        speakers = None if refresh else self._load_cached()
+        if speakers is None:
+            speakers = self.client.speakers()
+            self._save(speakers)
+        self._speakers = speakers
+        return speakers
+
+    def styles(self):
+        """スタイルID -> (話者名, スタイル名) の辞書を返す"""
+        return {style["id"]: (speaker["name"], style["name"])
+                for speaker in self.speakers() for style in speaker.get("styles", [])}
+
+    def validate(self, style_ids):
+        """設定されたスタイルIDのうち、エンジンに存在しないものを返す
+
+        キャッシュに見当たらない場合は一覧を取り直してから判定する (エンジン更新で増えた話者など)。
+        """
+        missing = [style_id for style_id in style_ids if style_id not in self.styles()]
+        if missing:
+            self.speakers(refresh=True)
+            missing = [style_id for style_id in style_ids if style_id not in self.styles()]
+        return missing
+
+
+class EngineWarmup:
+    """ボードの運用開始前にスタイルを初期化し、起動時と最初のアナウンスの遅延を記録する"""
+
+    def __init__(self, client, catalog):
+        self.client = client
+        self.catalog = catalog
+        self.cold_start_stats = LatencyStats("エンジンのウォームアップ")
+        self.first_announcement_stats = LatencyStats("最初のアナウンスの合成時間")
+        self.ready_styles = set()
+        self._first_synthesis_done = False
+
+    def warm_up(self, style_ids, warmup_text="ウォームアップ"):
+        """スタイルIDを確認し、/initialize_speaker と短い合成でモデルを読み込ませる
+
+        初期化できたスタイルIDの集合を返す。
+        """
+        try:
+            missing = self.catalog.validate(style_ids)
+        except requests.exceptions.RequestException as e:
+            print(f"警告: 話者一覧を取得できません。ウォームアップを省略します: {e}")
+            return set()
+        for style_id in missing:
+            print(f"警告: 話者スタイルID {style_id} はVOICEVOXエンジンにありません。")
+
+        styles = self.catalog.styles()
+        for style_id in style_ids:
+            if style_id in missing:
+                continue
+            start = time.monotonic()
+            # 振り分け先のどのエンジンでもモデル読み込み済みにする (外されているエンジンは飛ばす)
+            initialized = 0
+            now = service_clock.monotonic()
+            for endpoint in self.client.endpoints:
+                if not endpoint.available(now):
+                    continue
+                try:
+                    response = endpoint.session.post(endpoint.url + "/initialize_speaker",
+                                                     params={"speaker": style_id, "skip_reinit": True},
+                                                     timeout=SYNTHESIS_TIMEOUT)
+                    response.raise_for_status()
+                except requests.exceptions.RequestException as e:
+                    print(f"警告: {endpoint.url} で話者スタイルID {style_id} を初期化できません: {e}")
+                    continue
+                initialized += 1
+            if not initialized:
+                print(f"警告: 話者スタイルID {style_id} のウォームアップに失敗しました (初期化できたエンジンがありません)")
+                continue
+            try:
+                # 初回の合成でしか発生しない準備もここで済ませておく
+                self.client.synthesize(warmup_text, style_id)
+            except requests.exceptions.RequestException as e:
+                print(f"警告: 話者スタイルID {style_id} の試し合成に失敗しました: {e}")
+            elapsed = time.monotonic() - start
+            self.cold_start_stats.record(elapsed)
+            self.ready_styles.add(style_id)
+            name, style_name = styles[style_id]
+            print(f"ウォームアップ完了: {name} ({style_name}) id: {style_id} ({elapsed:.2f}秒)")
+        return self.ready_styles
+
+    def record_synthesis(self, elapsed):
+        """エンジンでの合成時間を受け取り、起動後最初の1回だけを記録する"""
+        if self._first_synthesis_done:
+            return
+        self._first_synthesis_done = True
+        self.first_announcement_stats.record(elapsed)
+        print(f"起動後最初のアナウンス合成: {elapsed:.2f}秒")
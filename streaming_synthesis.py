@@ -0,0 +1,65 @@
+# streaming_synthesis.py
+# アナウンス文を文・句の区切りで分割し、先頭から順に合成結果を渡す (合成と再生の並行処理用)
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def split_clauses(text, first_clause_min=6, first_clause_max=24):
+    """アナウンス文を合成単位に分割する
+
+    文 (。や全角スペース) ごとに区切り、最初の文だけはさらに読点 (、) で切る。
+    先頭のかたまりを短くすることで、最初の音声が出るまでの時間を短くする。
+    """
+    sentences = []
+    current = ""
+    for ch in text:
+        if ch == "　":
+            if current:
+                sentences.append(current)
+            current = ""
+            continue
+        current += ch
+        if ch == "。":
+            sentences.append(current)
+            current = ""
+    if current:
+        sentences.append(current)
+    if not sentences:
+        return []
+
+    first = sentences[0]
+    comma = first.find("、", first_clause_min - 1) # 短すぎるかたまりは作らない
+    if 0 <= comma < first_clause_max and comma < len(first) - 1:
+        return [first[:comma + 1], first[comma + 1:]] + sentences[1:]
+    return sentences
+
+
+class StreamingSynthesizer:
+    """分割した各かたまりを並行して合成し、文章の順番通りに受け取れるようにする"""
+
+    def __init__(self, synthesize, max_workers=2):
+        self.synthesize = synthesize
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stream-synth")
+
+    def stream(self, text):
+        """全てのかたまりの合成を依頼し、(かたまりの文字列, WAVデータ, 合成完了までの秒数) を
+        文章の順番に返すイテレーターを返す
+
+        この関数を呼んだ時点で合成が始まるので、受け取り側がチャイムや前のかたまりを
+        再生している間にも後ろのかたまりの合成が進む。
+        """
+        start = time.monotonic()
+        chunks = split_clauses(text)
+        futures = [self._executor.submit(self._synthesize_timed, chunk, start) for chunk in chunks]
+        return self._results(chunks, futures)
+
+    def _synthesize_timed(self, chunk, start):
+        data = self.synthesize(chunk)
+        return data, time.monotonic() - start
+
+    @staticmethod
+    def _results(chunks, futures):
+        for chunk, future in zip(chunks, futures):
+            data, elapsed = future.result()
+            yield chunk, data, elapsed
@@ -0,0 +1,39 @@
+# アナウンス処理の子プロセス (announcement_worker.py) のリングバッファのテスト
+# 実行: python -m pytest -q tests
+
+import unittest
+from unittest import mock
+
+import announcement_worker
+from announcement_worker import PcmRing, ParentGoneError
+
+
+class DeadParent:
+    def is_alive(self):
+        return False
+
+
+class PcmRingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = PcmRing(capacity=16)
+
+    def tearDown(self):
+        self.ring.close(unlink=True)
+
+    def test_wraps_around_the_end(self):
+        position = self.ring.write(b"0123456789")
+        self.assertEqual(self.ring.read(position, 10), b"0123456789")
+        position = self.ring.write(b"abcdefghij") # 末尾で折り返す
+        self.assertEqual(self.ring.read(position, 10), b"abcdefghij")
+
+    def test_full_ring_gives_up_when_parent_is_gone(self):
+        self.ring.write(b"x" * 12) # 読み出されないまま
+        with mock.patch.object(announcement_worker, "PARENT_CHECK_INTERVAL", 0.05), \
+                mock.patch("multiprocessing.parent_process", return_value=DeadParent()):
+            with self.assertRaises(ParentGoneError):
+                self.ring.write(b"y" * 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
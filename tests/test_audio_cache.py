@@ -0,0 +1,60 @@
+# 音声キャッシュ (audio_cache.py) のテスト
+# 実行: python -m pytest -q tests
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+import audio_cache
+from audio_cache import AudioCache
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def files(self, suffix):
+        return [name for name in os.listdir(self.cache_dir) if name.endswith(suffix)]
+
+    def test_overwrite_keeps_disk_bytes(self):
+        cache = AudioCache(self.cache_dir)
+        cache.put("次は", 1, b"x" * 300)
+        cache.put("次は", 1, b"y" * 100)
+        self.assertEqual(cache.stats()["disk_bytes"], 100)
+
+    def test_concurrent_puts_of_same_key(self):
+        cache = AudioCache(self.cache_dir)
+        payloads = [bytes([i]) * 50000 for i in range(8)]
+        threads = [threading.Thread(target=cache.put, args=("同じ文", 1, data)) for data in payloads]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.files(".tmp"), [])
+        [name] = self.files(".wav")
+        with open(os.path.join(self.cache_dir, name), "rb") as f:
+            self.assertIn(f.read(), payloads) # どれか1つが混ざらずに残る
+        self.assertEqual(cache.stats()["disk_bytes"], 50000)
+
+    def test_stale_tmp_files_are_removed_on_startup(self):
+        stale = os.path.join(self.cache_dir, "old.1234.tmp")
+        fresh = os.path.join(self.cache_dir, "new.5678.tmp")
+        for path in (stale, fresh):
+            with open(path, "wb") as f:
+                f.write(b"partial")
+        old = time.time() - audio_cache.STALE_TMP_SECONDS - 10
+        os.utime(stale, (old, old))
+        AudioCache(self.cache_dir)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh)) # 他のプロセスが書き込み中かもしれない
+
+
+if __name__ == "__main__":
+    unittest.main()
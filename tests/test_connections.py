@@ -0,0 +1,61 @@
+# 接続列車の計算 (connections.py) のテスト
+# 実行: python -m pytest -q tests
+
+import unittest
+
+from connections import ConnectionEngine, Train
+from route_model import RouteModel, DEFAULT_ROUTE
+
+
+def rail_trains(station="武生駅", interval=20):
+    """7時から21時まで interval 分ごとに発車する上りの列車"""
+    trains = []
+    for minutes in range(7 * 60, 21 * 60, interval):
+        text = f"{minutes // 60}:{minutes % 60:02d}"
+        trains.append(Train(station, "上り", text, minutes * 60, "普通", "福井"))
+    return trains
+
+
+def trip(etd, eta, destination, stops):
+    """timetable.csv と同じ形の行 (stops は停車する列名)"""
+    row = {"order": "1", "ETD": etd, "ETA": eta, "destination": destination, "car": "1", "platform": "1"}
+    for column, _, pass_only in RouteModel(DEFAULT_ROUTE).stops:
+        row[column] = "0" if pass_only else ("1" if column in stops else "0")
+    return row
+
+
+class ConnectionsForTest(unittest.TestCase):
+
+    def setUp(self):
+        self.route = RouteModel(DEFAULT_ROUTE)
+        self.engine = ConnectionEngine(rail_trains())
+
+    def departures(self, row):
+        return [train.departure for train in self.engine.connections_for(row, self.route)]
+
+    def test_trip_ending_at_takefu(self):
+        # 武生駅止まりの便は ETA が "0" (未記入) でも、発車時刻と所要時間から接続列車を出す (14:58 着)
+        row = trip("14:40", "0", "1", ["hoyama(1)", "takefu"])
+        self.assertEqual(self.departures(row), ["15:20"])
+
+    def test_loop_trip_uses_arrival_at_station(self):
+        # 循環便は終点の ETA (8:50) ではなく、途中で武生駅に着く時刻 (8:15 + 18分) で探す
+        row = trip("8:15", "8:50", "0", ["hoyama(1)", "takefu", "kunitaka(2)"])
+        self.assertEqual(self.departures(row), ["8:40"])
+
+    def test_placeholder_etd_counts_back_from_eta(self):
+        # 発車時刻が未定 ("0:0") の便は ETA から逆算する (8:15 - (35 - 18)分 = 7:58 着)
+        row = trip("0:0", "8:15", "0", ["hoyama(1)", "takefu", "kunitaka(2)"])
+        self.assertEqual(self.departures(row), ["8:20"])
+
+    def test_route_without_minutes_uses_eta(self):
+        definition = dict(DEFAULT_ROUTE, stops=[{key: value for key, value in stop.items() if key != "minutes"}
+                                                for stop in DEFAULT_ROUTE["stops"]])
+        self.route = RouteModel(definition)
+        row = trip("8:15", "8:50", "0", ["hoyama(1)", "takefu", "kunitaka(2)"])
+        self.assertEqual(self.departures(row), ["9:00"])
+        self.assertEqual(self.departures(trip("14:40", "0", "1", ["takefu"])), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
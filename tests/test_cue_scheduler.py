@@ -0,0 +1,49 @@
+# 発車前アナウンスのスケジューラー (cue_scheduler.py) のテスト
+# 実行: python -m pytest -q tests
+
+import time
+import threading
+import unittest
+from datetime import datetime
+
+import service_clock
+from cue_scheduler import CueScheduler, parse_offsets
+from schedule_index import ScheduleIndex
+
+
+def row(order, etd):
+    hour, minute = (int(part) for part in etd.split(":"))
+    return {"order": order, "ETD": etd, "ETD_time": datetime(2026, 10, 16, hour, minute).time()}
+
+
+class CueSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.announced = []
+        self.finished = threading.Event()
+
+    def tearDown(self):
+        service_clock.set_clock(service_clock.SystemClock())
+
+    def announce(self, row):
+        self.announced.append(None if row is None else row["order"])
+        if row is None:
+            self.finished.set()
+
+    def test_trips_with_same_departure_time_are_both_announced(self):
+        # timetable.csv と同じく、同じ発車時刻の便が2本ずつある
+        rows = [row("18", "16:25"), row("19", "16:25"), row("21", "18:05"), row("22", "18:05")]
+        service_clock.set_clock(service_clock.SimulatedClock(datetime(2026, 10, 16, 16, 23), speed=3000.0))
+        scheduler = CueScheduler(ScheduleIndex(rows), self.announce, offsets=(1,))
+        threading.Thread(target=scheduler.run, daemon=True).start()
+        self.assertTrue(self.finished.wait(10))
+        self.assertEqual(self.announced, ["18", "19", "21", "22", None])
+
+    def test_parse_offsets(self):
+        self.assertEqual(parse_offsets("1, 10,3,3"), (10, 3, 1))
+        with self.assertRaises(ValueError):
+            parse_offsets("0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# デイバンク (daybank.py) と、日付・カレンダーによる切り替え (GUI_test.switch_daybank) のテスト
+# 実行: python -m pytest -q tests
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+import GUI_test as app
+from audio_cache import make_cache_key
+from daybank import (DayBank, write_daybank, daybank_path_for, find_daybanks, remove_old_daybanks)
+
+
+class DayBankTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.base = os.path.join(self.dir, "daybank.bin")
+
+    def tearDown(self):
+        if app.daybank is not None:
+            app.daybank.close()
+            app.daybank = None
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write(self, path, texts):
+        clips = {make_cache_key(text, 1, None): (text, text.encode("utf-8")) for text in texts}
+        write_daybank(path, clips)
+        return path
+
+    def test_round_trip(self):
+        path = self.write(self.base, ["次は", "終点です"])
+        bank = DayBank(path)
+        self.assertEqual(len(bank), 2)
+        self.assertEqual(bytes(bank.get("終点です", 1)), "終点です".encode("utf-8"))
+        self.assertIsNone(bank.get("未登録", 1))
+        bank.close()
+
+    def test_path_is_keyed_by_timetable_and_date(self):
+        weekday = daybank_path_for(self.base, "/data/weekday.csv", date(2026, 10, 16))
+        saturday = daybank_path_for(self.base, "/data/saturday.csv", date(2026, 10, 17))
+        self.assertEqual(weekday, os.path.join(self.dir, "daybank-weekday-2026-10-16.bin"))
+        self.assertNotEqual(weekday, saturday)
+
+    def test_remove_old_daybanks_keeps_today_and_later(self):
+        for day in (date(2026, 10, 15), date(2026, 10, 16), date(2026, 10, 17)):
+            self.write(daybank_path_for(self.base, "weekday.csv", day), ["次は"])
+        self.assertEqual(remove_old_daybanks(self.base, date(2026, 10, 16)), 1)
+        self.assertEqual([day for day, _ in find_daybanks(self.base)], [date(2026, 10, 17), date(2026, 10, 16)])
+
+    def test_switch_reopens_only_when_date_or_file_changes(self):
+        today = self.write(daybank_path_for(self.base, "weekday.csv", date(2026, 10, 16)), ["今日"])
+        tomorrow = self.write(daybank_path_for(self.base, "saturday.csv", date(2026, 10, 17)), ["明日"])
+        app.switch_daybank(today)
+        first = app.daybank
+        app.switch_daybank(today)
+        self.assertIs(app.daybank, first) # 同じファイルなら開き直さない
+
+        app.switch_daybank(tomorrow) # 日付 (カレンダー) が変わった
+        self.assertEqual(app.daybank.path, tomorrow)
+        self.assertIsNotNone(app.daybank.get("明日", 1))
+        self.assertIsNone(first.get_by_key(make_cache_key("今日", 1, None))) # 前日分は閉じている
+
+        self.write(tomorrow, ["明日", "追加"]) # 同じ日の分を作り直した
+        app.switch_daybank(tomorrow)
+        self.assertIsNotNone(app.daybank.get("追加", 1))
+
+    def test_switch_to_missing_bank(self):
+        app.switch_daybank(self.write(daybank_path_for(self.base, "weekday.csv", date(2026, 10, 16)), ["今日"]))
+        app.switch_daybank(daybank_path_for(self.base, "weekday.csv", date(2026, 10, 17)))
+        self.assertIsNone(app.daybank)
+
+
+if __name__ == "__main__":
+    unittest.main()
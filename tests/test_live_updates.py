@@ -0,0 +1,113 @@
+# 運行情報の重ね合わせ (live_updates.py) のテスト
+# 実行: python -m pytest -q tests
+
+import os
+import json
+import threading
+import unittest
+import http.client
+from datetime import datetime
+
+import service_clock
+from live_updates import LiveOverlay, Override, start_server
+from timetable_store import TimetableStore, Calendar
+
+TIMETABLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "timetable.csv")
+
+
+class MidnightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = service_clock.SimulatedClock(datetime(2026, 10, 16, 23, 50), speed=1.0)
+        service_clock.set_clock(self.clock)
+        self.store = TimetableStore([Calendar("標準", TIMETABLE_PATH)])
+        self.store.load()
+        self.overlay = LiveOverlay(self.store)
+        self.notified = []
+        self.overlay.add_listener(lambda schedule, diff: self.notified.append(diff))
+
+    def tearDown(self):
+        service_clock.set_clock(service_clock.SystemClock())
+
+    def test_overrides_are_dropped_after_midnight(self):
+        total = len(self.store.schedule.trips)
+        self.overlay.set_override(("3", "8:15"), Override(cancelled=True))
+        self.assertEqual(len(self.overlay.schedule.trips), total - 1)
+
+        # 同じ時刻表ファイルのまま日付が変わる
+        self.clock.start = datetime(2026, 10, 17, 0, 10)
+        self.store.poll()
+        self.assertEqual(len(self.overlay.schedule.trips), total)
+        self.assertEqual(self.overlay.overrides(), [])
+        self.assertTrue(self.notified[-1].added) # 運休を取り消した便が戻ったと通知される
+
+    def test_same_day_poll_does_not_notify(self):
+        self.store.poll()
+        self.assertEqual(self.notified, [])
+
+
+class OverlayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = service_clock.SimulatedClock(datetime(2026, 10, 16, 8, 0), speed=1.0)
+        service_clock.set_clock(self.clock)
+        self.store = TimetableStore([Calendar("標準", TIMETABLE_PATH)])
+        self.store.load()
+        self.overlay = LiveOverlay(self.store)
+
+    def tearDown(self):
+        service_clock.set_clock(service_clock.SystemClock())
+
+    def test_last_notification_is_the_current_schedule(self):
+        notified = []
+        self.overlay.add_listener(lambda schedule, diff: notified.append(schedule))
+        keys = [trip.key for trip in self.store.schedule.trips][:8]
+
+        def post(key):
+            for delay in range(1, 20):
+                self.overlay.set_override(key, Override(delay=delay))
+
+        threads = [threading.Thread(target=post, args=(key,)) for key in keys]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIs(notified[-1], self.overlay.schedule) # 古い時刻表の通知が後から届かない
+
+
+class OverrideServerTest(OverlayTest):
+
+    def setUp(self):
+        super().setUp()
+        self.server = start_server(self.overlay, port=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def post(self, body, headers):
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+        connection.putrequest("POST", "/overrides")
+        for name, value in headers.items():
+            connection.putheader(name, value)
+        connection.endheaders(body)
+        response = connection.getresponse()
+        result = response.status, json.loads(response.read())
+        connection.close()
+        return result
+
+    def test_applies_override(self):
+        body = json.dumps({"order": "3", "ETD": "8:15", "delay": 5}).encode("utf-8")
+        status, result = self.post(body, {"Content-Length": str(len(body))})
+        self.assertEqual(status, 200)
+        self.assertTrue(result["applied"])
+
+    def test_malformed_content_length_is_bad_request(self):
+        for length in ("abc", "-1"):
+            status, _ = self.post(b"{}", {"Content-Length": length})
+            self.assertEqual(status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+# 時刻表インデックス (schedule_index.py) のテスト
+# 実行: python -m pytest -q tests
+
+import unittest
+from datetime import datetime
+
+from schedule_index import ScheduleIndex, trip_key
+
+
+def row(order, etd):
+    hour, minute = (int(part) for part in etd.split(":"))
+    return {"order": order, "ETD": etd, "ETD_time": datetime(2026, 10, 16, hour, minute).time()}
+
+
+def at(hour, minute, second=0):
+    return datetime(2026, 10, 16, hour, minute, second)
+
+
+class ScheduleIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        # timetable.csv と同じく発車時刻未定 ("0:0") の便と、同じ発車時刻の便を含む
+        self.rows = [row("1", "0:0"), row("4", "8:40"), row("3", "8:15"), row("18", "16:25"), row("19", "16:25")]
+        self.schedule = ScheduleIndex(self.rows)
+
+    def etds(self, rows):
+        return [(r["order"], r["ETD"]) for r in rows]
+
+    def test_placeholder_rows_are_not_indexed(self):
+        self.assertEqual(len(self.schedule), 4)
+        self.assertNotIn(("1", "0:0"), [trip.key for trip in self.schedule.trips])
+
+    def test_upcoming_is_sorted_and_keeps_csv_order_for_same_time(self):
+        self.assertEqual(self.etds(self.schedule.upcoming(at(0, 0))),
+                         [("3", "8:15"), ("4", "8:40"), ("18", "16:25"), ("19", "16:25")])
+        self.assertEqual(self.etds(self.schedule.upcoming(at(8, 20), count=2)), [("4", "8:40"), ("18", "16:25")])
+
+    def test_trip_stays_upcoming_until_its_departure_time(self):
+        self.assertEqual(self.etds(self.schedule.upcoming(at(8, 15), count=1)), [("3", "8:15")])
+        self.assertEqual(self.etds(self.schedule.upcoming(at(8, 15, 1), count=1)), [("4", "8:40")])
+
+    def test_no_trips_after_last_departure(self):
+        self.assertEqual(self.schedule.upcoming(at(23, 59)), [])
+
+    def test_next_transition(self):
+        self.assertEqual(self.schedule.next_transition(at(0, 0)), at(8, 15))
+        self.assertEqual(self.schedule.next_transition(at(8, 20)), at(8, 40))
+        self.assertEqual(self.schedule.next_transition(at(16, 0)), at(16, 25))
+
+    def test_next_transition_rolls_over_at_midnight(self):
+        # 当日の便がもうなければ、翌日の便が表示対象に戻る翌0時に切り替わる
+        self.assertEqual(self.schedule.next_transition(at(16, 30)), datetime(2026, 10, 17, 0, 0))
+        self.assertEqual(self.etds(self.schedule.upcoming(datetime(2026, 10, 17, 0, 0), count=1)), [("3", "8:15")])
+
+    def test_empty_schedule(self):
+        schedule = ScheduleIndex([row("1", "0:0")])
+        self.assertEqual(len(schedule), 0)
+        self.assertIsNone(schedule.next_transition(at(8, 0)))
+
+    def test_trip_key(self):
+        self.assertEqual(trip_key({"order": " 3", "ETD": "8:15 "}), ("3", "8:15"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+# 時刻表の管理 (timetable_store.py) のテスト: 差分・カレンダーの判定・ファイルの再読み込み
+# 実行: python -m pytest -q tests
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from schedule_index import ScheduleIndex
+from timetable_store import (TimetableStore, TimetableError, ScheduleDiff, Calendar, load_calendars,
+                             read_timetable)
+
+HEADER = "order, ETD, destination, car, platform, ETA\n"
+
+
+def read_rows(rows):
+    """(order, ETD, 乗り場) から read_timetable() と同じ形の行を作る"""
+    return [{"order": order, "ETD": etd, "platform": platform, "ETD_time": datetime.strptime(etd, "%H:%M").time()}
+            for order, etd, platform in rows]
+
+
+class TimetableFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write(self, name, lines):
+        path = os.path.join(self.dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(HEADER + "".join(line + "\n" for line in lines))
+        return path
+
+
+class ReadTimetableTest(TimetableFilesTest):
+
+    def test_sorts_by_etd_and_skips_invalid_rows(self):
+        path = self.write("timetable.csv", ["2, 9:15, 0, 1, 1, 9:55", "1, 8:15, 0, 1, 1, 8:50", "3, 25:99, 0, 1, 1, 0"])
+        self.assertEqual([row["order"] for row in read_timetable(path)], ["1", "2"])
+
+    def test_missing_file(self):
+        with self.assertRaises(TimetableError):
+            read_timetable(os.path.join(self.dir, "none.csv"))
+
+
+class ScheduleDiffTest(unittest.TestCase):
+
+    def schedule(self, rows):
+        return ScheduleIndex(read_rows(rows))
+
+    def test_added_removed_changed(self):
+        old = self.schedule([("1", "8:15", "1"), ("2", "8:40", "1"), ("3", "9:15", "1")])
+        new = self.schedule([("1", "8:15", "2"), ("3", "9:15", "1"), ("4", "9:40", "1")])
+        diff = ScheduleDiff(old, new)
+        self.assertEqual(diff.added, {("4", "9:40")})
+        self.assertEqual(diff.removed, {("2", "8:40")})
+        self.assertEqual(diff.changed, {("1", "8:15")}) # 乗り場が変わった
+        self.assertEqual(sorted(row["order"] for row in diff.stale_rows()), ["1", "2"])
+        self.assertTrue(diff)
+
+    def test_same_rows_are_not_a_change(self):
+        rows = [("1", "8:15", "1")]
+        self.assertFalse(ScheduleDiff(self.schedule(rows), self.schedule(rows)))
+
+    def test_first_load_adds_everything(self):
+        diff = ScheduleDiff(None, self.schedule([("1", "8:15", "1")]))
+        self.assertEqual(diff.added, {("1", "8:15")})
+
+
+class CalendarTest(TimetableFilesTest):
+
+    def test_matching_rules(self):
+        holiday = Calendar("休日", "h.csv", dates=["2026-11-03"])
+        exam = Calendar("試験期間", "e.csv", date_from="2026-07-27", date_to="2026-08-07")
+        saturday = Calendar("土曜", "s.csv", weekdays=[5])
+        self.assertTrue(holiday.matches(date(2026, 11, 3)))
+        self.assertFalse(holiday.matches(date(2026, 11, 4)))
+        self.assertTrue(exam.matches(date(2026, 7, 27)))
+        self.assertTrue(exam.matches(date(2026, 8, 7)))
+        self.assertFalse(exam.matches(date(2026, 8, 8)))
+        self.assertTrue(saturday.matches(date(2026, 10, 17)))
+        self.assertFalse(saturday.matches(date(2026, 10, 16)))
+
+    def test_first_matching_calendar_wins_and_default_is_last(self):
+        config = {"default": "weekday.csv", "calendars": [
+            {"name": "休日", "file": "holiday.csv", "dates": ["2026-10-17"]},
+            {"name": "土曜", "file": "saturday.csv", "weekdays": [5]},
+        ]}
+        config_path = os.path.join(self.dir, "calendars.json")
+        with open(config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False)
+        store = TimetableStore(load_calendars(config_path, "unused.csv"))
+        self.assertEqual(store.calendar_for(date(2026, 10, 17)).name, "休日")   # 土曜でもある
+        self.assertEqual(store.calendar_for(date(2026, 10, 24)).name, "土曜")
+        self.assertEqual(store.calendar_for(date(2026, 10, 19)).name, "標準")
+        self.assertEqual(store.calendar_for(date(2026, 10, 19)).path, os.path.join(self.dir, "weekday.csv"))
+
+    def test_without_calendars_json(self):
+        calendars = load_calendars(os.path.join(self.dir, "none.json"), "timetable.csv")
+        self.assertEqual([(c.name, c.path) for c in calendars], [("標準", "timetable.csv")])
+
+
+class TimetableStoreTest(TimetableFilesTest):
+
+    def setUp(self):
+        super().setUp()
+        self.weekday = self.write("weekday.csv", ["1, 8:15, 0, 1, 1, 8:50", "2, 9:15, 0, 1, 1, 9:55"])
+        self.saturday = self.write("saturday.csv", ["1, 10:00, 0, 1, 1, 10:30"])
+        self.store = TimetableStore([Calendar("土曜", self.saturday, weekdays=[5]), Calendar("標準", self.weekday)])
+        self.notified = []
+        self.store.add_listener(lambda schedule, diff: self.notified.append(diff))
+
+    def test_switches_calendar_by_date(self):
+        self.store.load(date(2026, 10, 16))
+        self.assertEqual(self.store.calendar.name, "標準")
+        self.assertEqual(len(self.store.schedule), 2)
+        self.store.load(date(2026, 10, 17))
+        self.assertEqual(self.store.calendar.name, "土曜")
+        self.assertEqual(len(self.store.schedule), 1)
+        self.assertEqual(len(self.notified), 2)
+
+    def test_reloads_only_when_file_changes(self):
+        self.store.load(date(2026, 10, 16))
+        first = self.store.schedule
+        self.assertIsNone(self.store.load(date(2026, 10, 16)))
+        self.assertIs(self.store.schedule, first)
+
+        self.write("weekday.csv", ["1, 8:15, 0, 1, 2, 8:50", "2, 9:15, 0, 1, 1, 9:55", "3, 9:40, 0, 1, 1, 10:20"])
+        os.utime(self.weekday, ns=(0, os.stat(self.weekday).st_mtime_ns + 1_000_000_000)) # 更新日時を確実に変える
+        diff = self.store.load(date(2026, 10, 16))
+        self.assertEqual(diff.added, {("3", "9:40")})
+        self.assertEqual(diff.changed, {("1", "8:15")})
+        self.assertEqual(self.store.reload_count, 2)
+
+    def test_poll_keeps_current_schedule_when_file_breaks(self):
+        self.store.load(date(2026, 10, 16))
+        schedule = self.store.schedule
+        os.remove(self.weekday)
+        os.remove(self.saturday) # poll() は今日の日付で選ぶので、どちらのカレンダーでも読めなくする
+        self.assertIsNone(self.store.poll())
+        self.assertIs(self.store.schedule, schedule)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# VOICEVOXクライアント (voicevox_client.py) のテスト: スタブサーバー (voicevox_stub_server.py) を相手に
+# リトライ・別のエンジンへの切り替え・ローテーションから外す時間・遅いエンジンの判定を確認する
+# 実行: python -m pytest -q tests
+
+import time
+import socket
+import threading
+import unittest
+
+import voicevox_stub_server
+from voicevox_client import VoicevoxClient, EngineUnavailableError
+
+
+def start_stub(handler=voicevox_stub_server.StubHandler, **kwargs):
+    """空いているポートでスタブサーバーを起動し、(サーバー, URL) を返す"""
+    server = voicevox_stub_server.make_server(port=0, handler=handler, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def unused_url():
+    """接続を拒否されるURL (閉じたポート)"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+class SlowVersionHandler(voicevox_stub_server.StubHandler):
+    """/version の応答が遅いエンジン"""
+    delay = 0.4
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        super().do_GET()
+
+
+class VoicevoxClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def stub(self, **kwargs):
+        server, url = start_stub(**kwargs)
+        self.servers.append(server)
+        return server, url
+
+    def assertNothingInFlight(self, client):
+        self.assertEqual([ep.in_flight for ep in client.endpoints], [0] * len(client.endpoints))
+
+    def test_fails_over_to_working_engine(self):
+        _, url = self.stub()
+        client = VoicevoxClient([unused_url(), url], strategy="round_robin", backoff=0)
+        for _ in range(3):
+            self.assertTrue(client.synthesize("テスト", 10006).startswith(b"RIFF"))
+        dead, alive = client.endpoints
+        self.assertGreaterEqual(dead.failures, 1)
+        self.assertFalse(dead.available(time.monotonic()))
+        self.assertTrue(alive.available(time.monotonic()))
+        self.assertNothingInFlight(client)
+
+    def test_retries_after_server_error(self):
+        failing, failing_url = self.stub(failure_rate=1.0)
+        _, url = self.stub()
+        client = VoicevoxClient([failing_url, url], backoff=0)
+        client.speakers() # 失敗しないリクエストで両方のエンジンの応答時間を揃える
+        self.assertTrue(client.synthesize("テスト", 10006))
+        self.assertNothingInFlight(client)
+
+    def test_raises_when_every_engine_fails(self):
+        _, url = self.stub(failure_rate=1.0)
+        client = VoicevoxClient([url], max_retries=2, backoff=0)
+        with self.assertRaises(EngineUnavailableError):
+            client.synthesize("テスト", 10006)
+        self.assertNothingInFlight(client)
+
+    def test_failed_engine_returns_after_cooldown(self):
+        failing, failing_url = self.stub(failure_rate=1.0)
+        _, url = self.stub()
+        client = VoicevoxClient([failing_url, url], strategy="round_robin", backoff=0, cooldown=0.3)
+        client.synthesize("テスト", 10006)
+        requests_while_down = failing.stats["requests"]
+        for _ in range(3):
+            client.synthesize("テスト", 10006)
+        self.assertEqual(failing.stats["requests"], requests_while_down) # 外している間は送らない
+        time.sleep(0.35)
+        self.assertTrue(client.endpoints[0].available(time.monotonic()))
+
+    def test_health_check_takes_slow_engine_out(self):
+        _, slow_url = self.stub(handler=SlowVersionHandler)
+        _, url = self.stub()
+        client = VoicevoxClient([slow_url, url], slow_threshold=0.2)
+        client.check_health()
+        slow, fast = client.endpoints
+        self.assertFalse(slow.available(time.monotonic()))
+        self.assertTrue(fast.available(time.monotonic()))
+
+    def test_unexpected_error_releases_engine(self):
+        _, url = self.stub()
+        client = VoicevoxClient([url])
+
+        def broken(endpoint):
+            raise ValueError("応答の形式が正しくありません")
+
+        with self.assertRaises(ValueError):
+            client._with_retry(broken)
+        self.assertNothingInFlight(client)
+
+
+if __name__ == "__main__":
+    unittest.main()
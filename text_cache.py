@@ -0,0 +1,39 @@
+# text_cache.py
+# 描画済みテキストSurfaceのキャッシュ (毎フレームの font.render を避ける)
+
+from collections import OrderedDict
+
+
+class TextSurfaceCache:
+    """(フォント, 文字列, 色) をキーに描画済みSurfaceを保持するLRUキャッシュ"""
+
+    def __init__(self, max_items=128):
+        self.max_items = max_items
+        self._surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0 # = 新しく作成したSurfaceの数
+
+    def render(self, font, text, color, antialias=True):
+        """キャッシュ済みならそれを返し、なければ描画して登録する"""
+        key = (font, text, tuple(color), antialias)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_items:
+            self._surfaces.popitem(last=False) # 一番古いものを捨てる
+        return surface
+
+    def clear(self):
+        """キャッシュを空にする"""
+        self._surfaces.clear()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "items": len(self._surfaces)}
@@ -0,0 +1,238 @@
+# timetable_store.py
+# 日付で切り替わる複数の時刻表 (平日・土曜・試験期間・休日など) の管理と自動再読み込み
+
+import csv
+import os
+import json
+import threading
+from datetime import datetime, date
+
+import service_clock
+from schedule_index import ScheduleIndex
+
+# calendars.json の例 (上から順に判定し、最初に当てはまったものを使う):
+# {
+#     "default": "timetable.csv",
+#     "calendars": [
+#         {"name": "休日", "file": "timetable_holiday.csv", "dates": ["2026-11-03"]},
+#         {"name": "試験期間", "file": "timetable_exam.csv", "from": "2026-07-27", "to": "2026-08-07"},
+#         {"name": "土曜", "file": "timetable_saturday.csv", "weekdays": [5]}
+#     ]
+# }
+# weekdays は月曜=0 〜 日曜=6。ファイルのパスは calendars.json からの相対パス。
+
+
+class TimetableError(Exception):
+    """時刻表ファイルを読み込めない"""
+
+
+def read_timetable(filepath):
+    """時刻表CSVを読み込み、ETDでソートした行のリストを返す (不正な行は警告してスキップ)"""
+    timetable = []
+    try:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            reader = csv.DictReader(file, skipinitialspace=True)
+            for row in reader:
+                try:
+                    # ETDをtimeオブジェクトに変換して追加
+                    row['ETD_time'] = datetime.strptime(row['ETD'], '%H:%M').time()
+                    timetable.append(row)
+                except ValueError:
+                    print(f"警告: 行 {row} の ETD フォーマット '{row.get('ETD', '')}' が無効です。スキップします。")
+                except (KeyError, TypeError):
+                    print(f"警告: 行 {row} に ETD キーがありません。スキップします。")
+    except OSError as e:
+        raise TimetableError(f"ファイル '{filepath}' を読み込めません: {e}") from e
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise TimetableError(f"ファイル '{filepath}' の読み込み中にエラーが発生しました: {e}") from e
+
+    # ETD時刻でソート
+    timetable.sort(key=lambda x: x['ETD_time'])
+    return timetable
+
+
+def _fingerprint(row):
+    """便の内容の比較用 (ETD_time など派生した値は除く)"""
+    return tuple(sorted((k, v) for k, v in row.items() if k != 'ETD_time' and isinstance(v, str)))
+
+
+class ScheduleDiff:
+    """新旧の時刻表の差分 (便のキーの集合)"""
+
+    def __init__(self, old_schedule, new_schedule):
+        old = {trip.key: trip.row for trip in old_schedule.trips} if old_schedule else {}
+        new = {trip.key: trip.row for trip in new_schedule.trips}
+        self.added = new.keys() - old.keys()
+        self.removed = old.keys() - new.keys()
+        self.changed = {key for key in old.keys() & new.keys()
+                        if _fingerprint(old[key]) != _fingerprint(new[key])}
+        self.old_rows = old # 無効化する音声・描画を特定するために旧い行も保持する
+        self.new_rows = new
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def stale_rows(self):
+        """内容が変わった・なくなった便の旧い行を返す"""
+        return [self.old_rows[key] for key in self.removed | self.changed]
+
+    def __repr__(self):
+        return f"ScheduleDiff(追加 {len(self.added)}, 削除 {len(self.removed)}, 変更 {len(self.changed)})"
+
+
+class Calendar:
+    """時刻表ファイルと、それを使う日の条件"""
+
+    def __init__(self, name, path, dates=(), date_from=None, date_to=None, weekdays=None):
+        self.name = name
+        self.path = path
+        self.dates = {date.fromisoformat(d) for d in dates}
+        self.date_from = date.fromisoformat(date_from) if date_from else None
+        self.date_to = date.fromisoformat(date_to) if date_to else None
+        self.weekdays = set(weekdays) if weekdays is not None else None
+
+    def matches(self, day):
+        if self.dates and day not in self.dates:
+            return False
+        if self.date_from and day < self.date_from:
+            return False
+        if self.date_to and day > self.date_to:
+            return False
+        if self.weekdays is not None and day.weekday() not in self.weekdays:
+            return False
+        return True
+
+
+def load_calendars(config_path, default_path):
+    """calendars.json を読み込む。なければ default_path だけを使う"""
+    if not os.path.exists(config_path):
+        return [Calendar("標準", default_path)]
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    calendars = []
+    for entry in config.get("calendars", []):
+        calendars.append(Calendar(
+            entry.get("name", entry["file"]),
+            os.path.join(base_dir, entry["file"]),
+            dates=entry.get("dates", ()),
+            date_from=entry.get("from"),
+            date_to=entry.get("to"),
+            weekdays=entry.get("weekdays"),
+        ))
+    calendars.append(Calendar("標準", os.path.join(base_dir, config.get("default", "timetable.csv"))))
+    return calendars
+
+
+class TimetableStore:
+    """その日のカレンダーの時刻表を提供し、ファイルの変更を監視して再読み込みする
+
+    監視は os.stat の比較だけで行い、更新日時かサイズが変わったファイルだけを読み直す。
+    新しい ScheduleIndex は差分と一緒に add_listener() で登録した関数へ通知する。
+    時刻表が同じでも日付が変われば、空の差分で通知する。
+    route (route_model.RouteModel) を渡すと、読み込み時に各行の停車パターンを作っておく。
+    connections (connections.ConnectionEngine) も渡すと、各行の乗り継ぎ列車も探しておく。
+    """
+
+    def __init__(self, calendars, poll_interval=3.0, route=None, connections=None):
+        self.calendars = calendars
+        self.poll_interval = poll_interval
+        self.route = route
+        self.connections = connections
+        self._files = {} # path -> (statの値, ScheduleIndex)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.calendar = None
+        self.schedule = None
+        self.day = None # 時刻表を選んだ日付
+        self.reload_count = 0
+        self._last_error = None
+
+    def add_listener(self, callback):
+        """時刻表が変わったときに callback(schedule, diff) を呼ぶ"""
+        self._listeners.append(callback)
+
+    def calendar_for(self, day):
+        for calendar in self.calendars:
+            if calendar.matches(day):
+                return calendar
+        return self.calendars[-1]
+
+    @staticmethod
+    def _stat_signature(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _index_for(self, path):
+        """ファイルのインデックスを返す (変更がなければ前回のものを使う)"""
+        signature = self._stat_signature(path)
+        cached = self._files.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        timetable = read_timetable(path)
+        if self.route is not None:
+            self.route.compile_timetable(timetable)
+            if self.connections is not None:
+                self.connections.compile_timetable(timetable, self.route)
+        schedule = ScheduleIndex(timetable)
+        self._files[path] = (signature, schedule)
+        return schedule
+
+    def load(self, day=None):
+        """その日の時刻表を読み込み、変わっていれば差し替えて通知する。差分を返す"""
+        if day is None:
+            day = service_clock.now().date()
+        with self._lock:
+            calendar = self.calendar_for(day)
+            new_schedule = self._index_for(calendar.path)
+            if new_schedule is self.schedule:
+                if day == self.day:
+                    return None
+                # 同じ時刻表のまま日付が変わった場合も通知する (前日の運行情報を重ねている LiveOverlay など)
+                self.day = day
+                diff = ScheduleDiff(new_schedule, new_schedule)
+            else:
+                diff = ScheduleDiff(self.schedule, new_schedule)
+                if self.calendar is not calendar:
+                    print(f"時刻表を切り替えます: {calendar.name} ({os.path.basename(calendar.path)})")
+                elif diff:
+                    print(f"時刻表が更新されました: {diff}")
+                self.calendar = calendar
+                self.schedule = new_schedule
+                self.day = day
+                self.reload_count += 1
+        for callback in self._listeners:
+            try:
+                callback(new_schedule, diff)
+            except Exception as e:
+                print(f"時刻表の更新通知中にエラーが発生しました: {e}")
+        return diff
+
+    def poll(self):
+        """ファイルや日付の変化を確認し、必要なら再読み込みする (失敗時は現在の時刻表を維持)"""
+        try:
+            diff = self.load()
+        except (TimetableError, OSError, ValueError) as e:
+            if str(e) != self._last_error: # 同じエラーは繰り返し表示しない
+                print(f"警告: 時刻表の再読み込みに失敗しました。現在の時刻表を使い続けます: {e}")
+                self._last_error = str(e)
+            return None
+        self._last_error = None
+        return diff
+
+    def start(self):
+        """バックグラウンドでの監視を開始する"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.poll_interval):
+                self.poll()
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -1,20 +1,20 @@
 import requests
+from voicevox_client import get_default_client
+from speaker_catalog import SpeakerCatalog
 
-def get_speakers():
-    url = "http://localhost:50121/speakers"  # VOICEVOX APIのエンドポイント
-    response = requests.get(url)
+def get_speakers(refresh=False):
+    try:
+        speakers = SpeakerCatalog(get_default_client()).speakers(refresh=refresh)  # キャッシュが古ければ /speakers を取得
+    except requests.exceptions.RequestException as e:
+        print(f"Error: {e}")
+        return
 
-    if response.status_code == 200:
-        speakers = response.json()
-        for speaker in speakers:
-            name = speaker['name']
-            style_names = [style['name'] for style in speaker['styles']]
-            style_ids = [style['id'] for style in speaker['styles']]
-            for style_id, style_name in zip(style_ids, style_names):
-                print(f"Speaker: {name}, {style_name} id: {style_id}")
-            
-    else:
-        print(f"Error: {response.status_code}")
+    for speaker in speakers:
+        name = speaker['name']
+        style_names = [style['name'] for style in speaker['styles']]
+        style_ids = [style['id'] for style in speaker['styles']]
+        for style_id, style_name in zip(style_ids, style_names):
+            print(f"Speaker: {name}, {style_name} id: {style_id}")
 
 if __name__ == "__main__":
-    get_speakers()
\ No newline at end of file
+    get_speakers(refresh=True)
\ No newline at end of file
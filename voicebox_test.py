@@ -1,20 +1,17 @@
-import requests
-import urllib.parse
 import json
 from playsound import playsound
+from voicevox_client import get_default_client
+
+client = get_default_client()
 
 # 音素データ生成
-text = urllib.parse.quote("これはテスト出力です")
-response = requests.post("http://localhost:50121/audio_query?text=" + text + "&speaker=10006")
+audio_query = client.audio_query("これはテスト出力です", 10006)
 
 # responseの中身を表示
-# print(json.dumps(response.json(), indent=4))
+# print(json.dumps(audio_query, indent=4))
 
 # 音声合成
-resp_wav = requests.post("http://localhost:50121/synthesis?speaker=10006", json=response.json())
-
-# バイナリデータ取り出し
-data_binary = resp_wav.content
+data_binary = client.synthesis(audio_query, 10006)
 
 # wavとして書き込み
 path = "test.wav"
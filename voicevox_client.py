@@ -0,0 +1,247 @@
+# voicevox_client.py
+# VOICEVOXエンジン共通クライアント (接続プール・複数エンジンの負荷分散・ヘルスチェック・リトライ)
+
+import os
+import time
+import threading
+import requests # type: ignore
+from requests.adapters import HTTPAdapter # type: ignore
+
+import metrics
+import service_clock
+
+DEFAULT_ENDPOINT = "http://localhost:50121"
+# 複数エンジンを使う場合はカンマ区切りで指定する (例: http://localhost:50121,http://localhost:50122)
+ENDPOINTS_ENV = "VOICEVOX_ENDPOINTS"
+REQUEST_TIMEOUT = 10   # 通常のリクエストのタイムアウト (秒)
+SYNTHESIS_TIMEOUT = 30 # 音声合成・話者の初期化のタイムアウト (秒)
+HEALTH_TIMEOUT_MARGIN = 2.0 # ヘルスチェックのタイムアウトは slow_threshold よりこれだけ長くする (遅さを測れるように)
+
+
+class EngineUnavailableError(requests.exceptions.RequestException):
+    """利用できるエンジンがない、またはリトライしても失敗した"""
+
+
+class EngineEndpoint:
+    """1つのエンジンプロセスへの接続 (keep-aliveのセッションを保持する)"""
+
+    def __init__(self, url, pool_size=4):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.in_flight = 0       # 処理中のリクエスト数
+        self.latency = None      # 応答時間の移動平均 (秒)
+        self.failures = 0        # 連続失敗回数
+        self.down_until = 0.0    # この時刻 (service_clock.monotonic) までローテーションから外す
+
+    def available(self, now):
+        return now >= self.down_until
+
+    def __repr__(self):
+        return f"EngineEndpoint({self.url!r}, in_flight={self.in_flight}, failures={self.failures})"
+
+
+class VoicevoxClient:
+    """複数のVOICEVOXエンジンにリクエストを振り分けるクライアント
+
+    strategy は "least_busy" (処理中が少ないエンジン優先) か "round_robin"。
+    失敗したエンジンや応答が遅いエンジンは一定時間ローテーションから外し、
+    別のエンジンへバックオフ付きでリトライする。
+    """
+
+    def __init__(self, endpoints=None, strategy="least_busy", max_retries=3, backoff=0.5,
+                 cooldown=30.0, slow_threshold=8.0, pool_size=4):
+        if not endpoints:
+            endpoints = [DEFAULT_ENDPOINT]
+        if strategy not in ("least_busy", "round_robin"):
+            raise ValueError(f"不明な振り分け方式です: {strategy}")
+        self.endpoints = [EngineEndpoint(url, pool_size) for url in endpoints]
+        self.strategy = strategy
+        self.max_retries = max_retries
+        self.backoff = backoff               # リトライ間隔の初期値 (秒、毎回2倍)
+        self.cooldown = cooldown             # 外したエンジンを戻すまでの時間 (秒)
+        self.slow_threshold = slow_threshold # これより遅いエンジンは外す (秒)
+        self._lock = threading.Lock()
+        self._rr_index = 0
+        self._health_thread = None
+
+    # --- エンジンの選択と状態管理 ---
+
+    def _acquire(self, exclude=()):
+        """リクエストを送るエンジンを選び、処理中の数を増やす"""
+        now = service_clock.monotonic()
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if ep.available(now) and ep not in exclude]
+            if not candidates:
+                # 全滅している場合は、最も早く復帰予定のエンジンを試す
+                candidates = sorted((ep for ep in self.endpoints if ep not in exclude),
+                                    key=lambda ep: ep.down_until)[:1]
+            if not candidates:
+                return None
+            if self.strategy == "round_robin":
+                endpoint = candidates[self._rr_index % len(candidates)]
+                self._rr_index += 1
+            else:
+                endpoint = min(candidates, key=lambda ep: (ep.in_flight, ep.latency or 0.0))
+            endpoint.in_flight += 1
+            return endpoint
+
+    def _release(self, endpoint, elapsed=None, failed=False):
+        """リクエスト完了時にエンジンの状態を更新する"""
+        with self._lock:
+            endpoint.in_flight -= 1
+            if failed:
+                endpoint.failures += 1
+                endpoint.down_until = service_clock.monotonic() + self.cooldown
+                print(f"VOICEVOXエンジンをローテーションから外しました: {endpoint.url}")
+                return
+            endpoint.failures = 0
+            if elapsed is not None:
+                endpoint.latency = elapsed if endpoint.latency is None else endpoint.latency * 0.8 + elapsed * 0.2
+
+    def _mark_slow_or_ok(self, endpoint, elapsed, ok):
+        """ヘルスチェックの結果を反映する"""
+        with self._lock:
+            if not ok or elapsed > self.slow_threshold:
+                if endpoint.available(service_clock.monotonic()):
+                    print(f"VOICEVOXエンジンが応答しないか遅いため外します: {endpoint.url} ({elapsed:.1f}秒)")
+                endpoint.down_until = service_clock.monotonic() + self.cooldown
+            else:
+                endpoint.down_until = 0.0
+                endpoint.failures = 0
+
+    # --- リクエスト ---
+
+    def _with_retry(self, func):
+        """func(endpoint) をエンジンを変えながらバックオフ付きで再試行する"""
+        tried = []
+        last_error = None
+        for attempt in range(self.max_retries):
+            endpoint = self._acquire(exclude=tried if len(tried) < len(self.endpoints) else ())
+            if endpoint is None:
+                break
+            start = time.monotonic()
+            failed = False
+            try:
+                result = func(endpoint)
+            except requests.exceptions.RequestException as e:
+                response = getattr(e, "response", None)
+                if response is not None and response.status_code < 500:
+                    raise # 4xxはリクエスト側の誤りなので、エンジンは外さずにそのまま返す
+                failed = True
+                last_error = e
+            finally:
+                # 想定外の例外 (応答の形式の誤りなど) で抜ける場合も処理中の数を必ず戻す
+                self._release(endpoint, None if failed else time.monotonic() - start, failed=failed)
+            if not failed:
+                return result
+            metrics.increment("voicevox_failures_total")
+            tried.append(endpoint)
+            if attempt + 1 < self.max_retries:
+                service_clock.sleep(self.backoff * (2 ** attempt))
+        raise EngineUnavailableError(f"VOICEVOXエンジンへのリクエストに失敗しました: {last_error}")
+
+    def request(self, method, path, timeout=REQUEST_TIMEOUT, **kwargs):
+        """任意のエンドポイントにリクエストを送り、成功したレスポンスを返す"""
+        def call(endpoint):
+            start = time.perf_counter()
+            response = endpoint.session.request(method, endpoint.url + path, timeout=timeout, **kwargs)
+            metrics.observe("voicevox_request_seconds", time.perf_counter() - start, path=path)
+            response.raise_for_status()
+            return response
+        return self._with_retry(call)
+
+    def audio_query(self, text, speaker, timeout=REQUEST_TIMEOUT):
+        """/audio_query を呼び出して音声合成用クエリを返す"""
+        return self.request("POST", "/audio_query", params={"text": text, "speaker": speaker},
+                            timeout=timeout).json()
+
+    def synthesis(self, audio_query, speaker, params=None, timeout=SYNTHESIS_TIMEOUT):
+        """/synthesis を呼び出してWAVデータを返す"""
+        query_params = {"speaker": speaker}
+        query_params.update(params or {})
+        return self.request("POST", "/synthesis", params=query_params, json=audio_query,
+                            timeout=timeout).content
+
+    def synthesize(self, text, speaker, params=None, query_timeout=REQUEST_TIMEOUT,
+                   synthesis_timeout=SYNTHESIS_TIMEOUT):
+        """テキストからWAVデータを得る (audio_queryとsynthesisは同じエンジンで行う)"""
+        query_params = {"speaker": speaker}
+        query_params.update(params or {})
+
+        def call(endpoint):
+            # audio_query と synthesis のどちらが遅いかを見分けられるよう、別々に計測する
+            start = time.perf_counter()
+            response = endpoint.session.post(endpoint.url + "/audio_query",
+                                             params={"text": text, "speaker": speaker},
+                                             timeout=query_timeout)
+            queried = time.perf_counter()
+            metrics.observe("voicevox_request_seconds", queried - start, path="/audio_query")
+            response.raise_for_status()
+            response = endpoint.session.post(endpoint.url + "/synthesis", params=query_params,
+                                             json=response.json(), timeout=synthesis_timeout)
+            metrics.observe("voicevox_request_seconds", time.perf_counter() - queried, path="/synthesis")
+            response.raise_for_status()
+            return response.content
+        return self._with_retry(call)
+
+    def speakers(self, timeout=REQUEST_TIMEOUT):
+        """/speakers の結果 (話者一覧) を返す"""
+        return self.request("GET", "/speakers", timeout=timeout).json()
+
+    # --- ヘルスチェック ---
+
+    def check_health(self, timeout=None):
+        """全エンジンに /version を問い合わせ、応答しない・遅いエンジンを外す
+
+        timeout の既定は slow_threshold より少し長くする (短いと遅いエンジンを「応答しない」としか判定できない)。
+        """
+        if timeout is None:
+            timeout = self.slow_threshold + HEALTH_TIMEOUT_MARGIN
+        for endpoint in self.endpoints:
+            start = time.monotonic()
+            try:
+                response = endpoint.session.get(endpoint.url + "/version", timeout=timeout)
+                ok = response.status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            self._mark_slow_or_ok(endpoint, time.monotonic() - start, ok)
+
+    def start_health_checks(self, interval=15):
+        """バックグラウンドで定期的にヘルスチェックを行う"""
+        if self._health_thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.check_health()
+                except Exception as e:
+                    print(f"VOICEVOXエンジンのヘルスチェック中にエラーが発生しました: {e}")
+                service_clock.sleep(interval)
+
+        self._health_thread = threading.Thread(target=loop, daemon=True)
+        self._health_thread.start()
+
+    def status(self):
+        """各エンジンの状態を返す (デバッグ用)"""
+        now = service_clock.monotonic()
+        with self._lock:
+            return [{"url": ep.url, "available": ep.available(now), "in_flight": ep.in_flight,
+                     "latency": ep.latency, "failures": ep.failures} for ep in self.endpoints]
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """環境変数 VOICEVOX_ENDPOINTS (なければlocalhost:50121) を使う共有クライアントを返す"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            urls = [u.strip() for u in os.environ.get(ENDPOINTS_ENV, "").split(",") if u.strip()]
+            _default_client = VoicevoxClient(urls or [DEFAULT_ENDPOINT])
+        return _default_client
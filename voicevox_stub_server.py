@@ -0,0 +1,156 @@
+# voicevox_stub_server.py
+# 動作確認用のVOICEVOXエンジン代替サーバー (無音のWAVを返す)
+#
+# 使い方: python voicevox_stub_server.py --port 50121 [--latency-ms 800 --jitter-ms 400 --failure-rate 0.05]
+# 遅延・ばらつき・失敗率を指定すると、本番のエンジンの遅さや不調を再現できる (負荷試験用)。
+
+import io
+import json
+import time
+import wave
+import random
+import threading
+import argparse
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_RATE = 24000      # VOICEVOXの既定の出力サンプリングレート
+SECONDS_PER_CHAR = 0.12  # 1文字あたりの発話時間 (目安)
+
+STUB_SPEAKERS = [
+    {
+        "name": "スタブ話者",
+        "speaker_uuid": "00000000-0000-0000-0000-000000000000",
+        "styles": [{"name": "ノーマル", "id": 10006}, {"name": "あまあま", "id": 10007}],
+        "version": "0.0.0",
+    }
+]
+
+
+def make_silent_wav(seconds, sample_rate=SAMPLE_RATE):
+    """指定秒数の無音WAV (モノラル16bit) を作る"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """VOICEVOX APIの一部 (/version, /speakers, /audio_query, /synthesis, /initialize_speaker) を真似る"""
+    protocol_version = "HTTP/1.1" # keep-aliveを有効にする
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, obj, status=200):
+        self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        if path == "/version":
+            self._send_json("0.0.0-stub")
+        elif path == "/speakers":
+            self._send_json(STUB_SPEAKERS)
+        else:
+            self._send_json({"detail": "Not Found"}, status=404)
+
+    def _simulate_engine(self, latency_scale):
+        """設定された遅延を待ち、失敗させる場合はTrueを返す"""
+        server = self.server
+        latency = getattr(server, "latency", 0.0) * latency_scale
+        jitter = getattr(server, "jitter", 0.0) * latency_scale
+        with server.stats_lock:
+            server.stats["requests"] += 1
+            failed = server.random.random() < getattr(server, "failure_rate", 0.0)
+            delay = max(0.0, latency + server.random.uniform(-jitter, jitter)) if latency or jitter else 0.0
+            if failed:
+                server.stats["failures"] += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            self._send_json({"detail": "stub failure"}, status=503)
+        return failed
+
+    def do_POST(self):
+        parsed = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        body = self._read_body()
+        if parsed.path in ("/audio_query", "/synthesis"):
+            # audio_query は軽い処理なので、遅延は synthesis の1割にする
+            if self._simulate_engine(0.1 if parsed.path == "/audio_query" else 1.0):
+                return
+        if parsed.path == "/audio_query":
+            text = query.get("text", [""])[0]
+            self._send_json({"kana": text, "speedScale": 1.0, "outputSamplingRate": SAMPLE_RATE,
+                             "outputStereo": False, "accent_phrases": []})
+        elif parsed.path == "/synthesis":
+            try:
+                audio_query = json.loads(body or b"{}")
+            except ValueError:
+                self._send_json({"detail": "invalid json"}, status=422)
+                return
+            seconds_per_char = getattr(self.server, "seconds_per_char", SECONDS_PER_CHAR)
+            seconds = max(0.2 * seconds_per_char / SECONDS_PER_CHAR, len(audio_query.get("kana", "")) * seconds_per_char)
+            self._send(200, make_silent_wav(seconds), content_type="audio/wav")
+        elif parsed.path == "/initialize_speaker":
+            self._send(204)
+        else:
+            self._send_json({"detail": "Not Found"}, status=404)
+
+    def log_message(self, format, *args):
+        pass # アクセスログは出さない
+
+
+def make_server(host="127.0.0.1", port=50121, handler=StubHandler, latency=0.0, jitter=0.0,
+                failure_rate=0.0, seconds_per_char=SECONDS_PER_CHAR, seed=None):
+    """スタブサーバーを作成する (port=0で空いているポートを使う)
+
+    latency と jitter (秒) は synthesis の応答にかかる時間の平均とばらつき (一様分布の幅)、
+    failure_rate は 503 を返す割合。seconds_per_char は返す無音WAVの1文字あたりの長さ。
+    """
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.failure_rate = failure_rate
+    server.seconds_per_char = seconds_per_char
+    server.random = random.Random(seed)
+    server.stats = {"requests": 0, "failures": 0}
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VOICEVOXエンジンの代替サーバー (動作確認用)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50121)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="synthesis の応答にかかる時間 (ミリ秒)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="応答時間のばらつき (±ミリ秒)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="503 を返す割合 (0〜1)")
+    parser.add_argument("--seconds-per-char", type=float, default=SECONDS_PER_CHAR, help="返す無音WAVの1文字あたりの秒数")
+    parser.add_argument("--seed", type=int, help="遅延と失敗の乱数の種 (再現用)")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                         failure_rate=args.failure_rate, seconds_per_char=args.seconds_per_char, seed=args.seed)
+    print(f"VOICEVOXスタブサーバーを起動しました: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()